@@ -0,0 +1,303 @@
+"""Benchmark reconcile passes against synthetic local repos.
+
+The tests check that a pass does the right thing; this measures how long it takes, and how that scales
+with the number of groups, apps and config files and with the length of the monitoring history. It
+builds, under a scratch directory, N deployment-config bare repos ("groups") with M apps each (every
+app with its own code repo and K config files), and times real GitOpsAgent passes over them:
+
+  * cold            -- first pass on an empty GITOPS_AGENT_HOME (clones everything, first push),
+  * warm_noop       -- the next pass, with nothing changed,
+  * single_change   -- a pass after one app's code_commit_hash moved,
+  * trim            -- trim_monitoring_history on a monitoring branch of H commits spread over 60 days
+    (half of them past the 30-day window).
+
+Every scenario runs --repeat times with tracing off, so the timings carry no span overhead. One more
+run of the pass scenarios, with tracing on and not counted in the timings, gives the per-phase seconds
+of each (see gitops_agent.tracing), so a regression can be pinned to update_git_repo, evaluate_app,
+flush_status and so on. With --baseline, a scenario whose median is more than --tolerance slower than
+in the baseline file fails the run (exit status 1).
+
+Run from the repository root, e.g.:
+
+    python benchmarks/bench_reconcile.py --groups 4 --apps 5 --config-files 3 --history 5000 \\
+        --output bench.json [--baseline previous.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess as sp
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import toml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gitops_agent import execution  # noqa: E402
+from gitops_agent import git_operations as gops  # noqa: E402
+from gitops_agent import tracing  # noqa: E402
+from gitops_agent.agent import GitOpsAgent, trim_monitoring_history  # noqa: E402
+
+INFRA_NAME = "bench"
+DAY = 86400
+
+# Size of each synthetic config file, in bytes.
+CONFIG_FILE_BYTES = 4096
+
+
+def _git_env():
+    env = dict(os.environ)
+    for role in ("AUTHOR", "COMMITTER"):
+        env[f"GIT_{role}_NAME"] = "bench"
+        env[f"GIT_{role}_EMAIL"] = "bench@example.com"
+    return env
+
+
+def _git(cwd, *args, stdin=None):
+    return sp.run(
+        ["git", *args], cwd=str(cwd), env=_git_env(), input=stdin, check=True, capture_output=True
+    ).stdout.decode("utf-8", "replace").strip()
+
+
+def _bare(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _git(path.parent, "init", "-q", "--bare", "-b", "main", str(path))
+    return f"file://{path}"
+
+
+def _commit_and_push(worktree, message):
+    _git(worktree, "add", "-A")
+    _git(worktree, "commit", "-q", "-m", message)
+    _git(worktree, "push", "-q", "origin", "HEAD:main")
+    return _git(worktree, "rev-parse", "HEAD")
+
+
+def make_fleet(root, groups, apps, config_files):
+    """Create the synthetic repos. Returns (applications, deploy metas, deploy worktrees, code commits)."""
+    applications, metas, worktrees, commits = {}, {}, {}, {}
+    for g in range(groups):
+        deploy_url = _bare(root / "remotes" / f"deploy{g}.git")
+        worktree = root / "work" / f"deploy{g}"
+        _git(root, "clone", "-q", deploy_url, str(worktree))
+        meta = {}
+        for a in range(apps):
+            name = f"g{g}app{a}"
+            code_url = _bare(root / "remotes" / f"{name}.git")
+            code = root / "work" / name
+            _git(root, "clone", "-q", code_url, str(code))
+            (code / "README.md").write_text(f"# {name}\n")
+            first = _commit_and_push(code, "first")
+            (code / "README.md").write_text(f"# {name}, second\n")
+            commits[name] = (first, _commit_and_push(code, "second"))
+
+            pairs = []
+            for k in range(config_files):
+                src = Path(INFRA_NAME) / name / f"file{k}.conf"
+                (worktree / src).parent.mkdir(parents=True, exist_ok=True)
+                (worktree / src).write_text((f"{name} {k}\n" * CONFIG_FILE_BYTES)[:CONFIG_FILE_BYTES])
+                pairs.append({"src": str(src), "dst": str(root / "deployed" / name / "conf" / f"file{k}.conf")})
+            meta[name] = {
+                "code_url": code_url,
+                "code_commit_hash": commits[name][0],
+                "code_local_path": str(root / "deployed" / name / "code"),
+                "config_files": pairs,
+            }
+            applications[name] = f"{deploy_url}@main"
+        (worktree / INFRA_NAME).mkdir(parents=True, exist_ok=True)
+        (worktree / INFRA_NAME / "infra_meta.toml").write_text(toml.dumps(meta))
+        _commit_and_push(worktree, "init")
+        metas[g], worktrees[g] = meta, worktree
+    return applications, metas, worktrees, commits
+
+
+def make_monitoring_history(root, commits):
+    """A bare repo whose main-monitoring branch has `commits` status commits over the last 60 days."""
+    url = _bare(root / "remotes" / "history.git")
+    now = int(time.time())
+    stream = io.StringIO()
+    for i in range(commits):
+        date = now - 60 * DAY + i * (60 * DAY // max(commits, 1))
+        content = f'[app]\nstatus = "update {i}"\n'
+        message = f"status {i}"
+        stream.write(f"commit refs/heads/main-monitoring\nmark :{i + 1}\n")
+        stream.write(f"committer bench <bench@example.com> {date} +0000\n")
+        stream.write(f"data {len(message)}\n{message}\n")
+        if i:
+            stream.write(f"from :{i}\n")
+        stream.write(f"M 644 inline {INFRA_NAME}.toml\ndata {len(content)}\n{content}\n")
+    _git(root / "remotes" / "history.git", "fast-import", "--quiet", stdin=stream.getvalue().encode("utf-8"))
+    return url
+
+
+@contextlib.contextmanager
+def _environ(**values):
+    """Set environment variables for the duration of the block, then restore them."""
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextlib.contextmanager
+def _agent(root, home, applications, trace_file=None):
+    """A GitOpsAgent on its own scratch home. gops.APP_CONFIGS_DIR is restored when the block exits."""
+    app_configs_dir = gops.APP_CONFIGS_DIR
+    gops.APP_CONFIGS_DIR = home / "app-configs"
+    try:
+        gops.APP_CONFIGS_DIR.mkdir(parents=True, exist_ok=True)
+        config = root / "config.toml"
+        config.write_text(toml.dumps({"infra_name": INFRA_NAME, "interval": 300, "applications": applications}))
+        with _environ(GITOPS_AGENT_CONFIG=str(config)):
+            agent = GitOpsAgent(config_mode=False)
+        agent.tracer = tracing.Tracer(trace_file, home=home)
+        yield agent
+    finally:
+        gops.APP_CONFIGS_DIR = app_configs_dir
+
+
+def _timed_pass(agent):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.run_once()
+    return time.perf_counter() - started
+
+
+def _pass_scenarios(root, home, applications, metas, worktrees, commits, run_index, trace_file=None):
+    """Run the cold, warm_noop and single_change passes on a fresh home; yield (scenario, seconds)."""
+    changed_app = next(iter(metas[0]))
+    with _agent(root, home, applications, trace_file) as agent:
+        for scenario in ("cold", "warm_noop", "single_change"):
+            if scenario == "single_change":
+                metas[0][changed_app]["code_commit_hash"] = commits[changed_app][(run_index + 1) % 2]
+                (worktrees[0] / INFRA_NAME / "infra_meta.toml").write_text(toml.dumps(metas[0]))
+                _commit_and_push(worktrees[0], f"move {changed_app}")
+            yield scenario, _timed_pass(agent)
+    gops.close_all_repo_sessions()
+    shutil.rmtree(home)
+    shutil.rmtree(root / "deployed", ignore_errors=True)
+
+
+def run(root, groups, apps, config_files, history, repeat):
+    applications, metas, worktrees, commits = make_fleet(root, groups, apps, config_files)
+    history_url = make_monitoring_history(root, history)
+    timings = {"cold": [], "warm_noop": [], "single_change": [], "trim": []}
+
+    for r in range(repeat):
+        for scenario, seconds in _pass_scenarios(root, root / f"home{r}", applications, metas, worktrees, commits, r):
+            timings[scenario].append(seconds)
+
+        clone = root / "history-clone"
+        shutil.rmtree(clone, ignore_errors=True)
+        _git(root, "clone", "-q", "-b", "main-monitoring", history_url, str(clone))
+        _git(clone, "config", "user.name", "bench")
+        _git(clone, "config", "user.email", "bench@example.com")
+        repo = gops.repo_session(clone)
+        started = time.perf_counter()
+        if not trim_monitoring_history(repo, "main-monitoring", 30):
+            raise RuntimeError("The synthetic monitoring history was not trimmed")
+        timings["trim"].append(time.perf_counter() - started)
+        gops.close_repo_session(clone)
+
+    # The per-phase breakdown comes from one extra, traced run, so tracing never inflates the timings.
+    trace_file = root / "traces.jsonl"
+    scenarios = [
+        scenario
+        for scenario, _seconds in _pass_scenarios(
+            root, root / "home-traced", applications, metas, worktrees, commits, repeat, trace_file
+        )
+    ]
+    phases = dict(zip(scenarios, (json.loads(line)["phases"] for line in trace_file.read_text().splitlines())))
+
+    return {
+        scenario: {
+            "seconds": [round(s, 4) for s in values],
+            "median": round(statistics.median(values), 4),
+            **({"phases": _phase_seconds(phases[scenario])} if scenario in phases else {}),
+        }
+        for scenario, values in timings.items()
+    }
+
+
+def _phase_seconds(phases):
+    return {name: round(phase["seconds"], 4) for name, phase in sorted(phases.items())}
+
+
+def regressions(result, baseline, tolerance):
+    """Scenarios whose median is more than `tolerance` (a fraction) slower than in `baseline`. Pure."""
+    slower = []
+    for scenario, current in result["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous and current["median"] > previous["median"] * (1 + tolerance):
+            slower.append(f"{scenario}: {previous['median']}s -> {current['median']}s")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark gitops-agent reconcile passes on synthetic repos")
+    parser.add_argument("--groups", type=int, default=4, help="deployment-config repos (N)")
+    parser.add_argument("--apps", type=int, default=5, help="apps per group (M)")
+    parser.add_argument("--config-files", type=int, default=3, help="config files per app (K)")
+    parser.add_argument("--history", type=int, default=5000, help="commits on the trimmed monitoring branch (H)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every scenario")
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--baseline", help="a previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. the baseline")
+    parser.add_argument("--workdir", help="scratch directory to keep (default: a removed temp dir)")
+    args = parser.parse_args(argv)
+
+    root = Path(args.workdir or tempfile.mkdtemp(prefix="gitops-agent-bench-"))
+    root.mkdir(parents=True, exist_ok=True)
+    try:
+        with _environ(GITOPS_AGENT_HOME=str(root / "home")):
+            scenarios = run(root, args.groups, args.apps, args.config_files, args.history, args.repeat)
+    finally:
+        gops.close_all_repo_sessions()
+        execution.engine().close()
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    result = {
+        "parameters": {
+            "groups": args.groups,
+            "apps": args.apps,
+            "config_files": args.config_files,
+            "history": args.history,
+            "repeat": args.repeat,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "git": _git(".", "--version"),
+            "platform": platform.platform(),
+        },
+        "scenarios": scenarios,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        slower = regressions(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in slower:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,36 @@
 import argparse
 import ast
+import asyncio
+import io
 import json
 import os
-import re
 import shutil
 import subprocess as sp
+import sys
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
 import toml
-from git import Repo
-
+from git import GitCommandError
+from git import GitError
+from gitdb import IStream
+from gitdb.exc import BadName
+
+from gitops_agent import command_output as cmdout
+from gitops_agent import drift
+from gitops_agent import execution
+from gitops_agent import maintenance
+from gitops_agent import metrics
+from gitops_agent import plan as planning
+from gitops_agent import publishing
 from gitops_agent import git_operations as gops
+from gitops_agent import scheduler as sched
+from gitops_agent import state
+from gitops_agent import tracing
+from gitops_agent import triggers
 
 
 # How many days of monitoring-branch history to keep. Anything OLDER than (now - this many days)
@@ -21,6 +40,58 @@ from gitops_agent import git_operations as gops
 # behaviour explicit and unchanged when the key is absent.
 MONITORING_HISTORY_RETENTION_DAYS = 30
 
+# Trimming preserves the kept commits' dates, so on a busy branch some commit ages out of the window on
+# nearly every pass. To avoid a rewrite + force-push per pass, a trim only TRIGGERS once some commit is
+# older than the window by this fraction of its length (3 days for 30), and then trims back to the
+# window itself.
+MONITORING_HISTORY_TRIM_SLACK = 0.1
+
+# Upper bound on how many (url, branch) deployment-config groups run_once reconciles in parallel.
+# Groups are independent (separate shared clones, separate monitoring branches), so one slow remote
+# should only delay its own group. Overridable via config.toml ("max_concurrent_groups"); set it to 1
+# to get the old strictly-sequential behaviour.
+MAX_CONCURRENT_GROUPS = 4
+
+# Wall-clock budget for reconciling ONE group, measured from when a worker picks it up (not from the
+# start of the pass, so groups queued behind the pool limit are not penalised). A group that overruns
+# is abandoned for this pass: run_once stops waiting on it, and it is skipped by later passes until
+# the stuck worker finishes. Overridable via config.toml ("group_timeout_seconds"); 0 disables it.
+GROUP_TIMEOUT_SECONDS = 3600
+
+# Fraction by which every group's next poll time is randomly stretched or shortened (0.1 = +/-10%), so a
+# fleet of agents restarted together drifts apart instead of hitting the git host in lockstep.
+# Overridable via config.toml ("poll_jitter"). The other adaptive-polling knobs ("min_poll_interval",
+# "max_poll_interval", "max_failure_backoff") default to fractions/multiples of `interval`; see
+# GitOpsAgent.build_scheduler.
+POLL_JITTER = 0.1
+
+# Upper bound on how many app code repos of ONE group are fetched/cloned in parallel. Fetches are
+# network-bound and touch no working tree, so they overlap safely; everything order-sensitive (pre/post
+# commands, reset/checkout, config copies) still runs one app at a time. Overridable via config.toml
+# ("max_parallel_app_fetches"); 1 disables the parallel prefetch.
+MAX_PARALLEL_APP_FETCHES = 4
+
+# File (under GITOPS_AGENT_HOME) persisting the config_files digest manifest across restarts. Losing it
+# is harmless: every file is simply re-hashed once on the next pass.
+CONFIG_DIGEST_MANIFEST = "config-file-digests.json"
+
+# File (under GITOPS_AGENT_HOME) persisting the group/app state that makes a restart warm (see
+# gitops_agent.state). Losing it costs one first-run rewrite of every monitoring branch.
+AGENT_STATE_FILE = "agent-state.json"
+
+# How long flush_status trusts its in-memory record of what is already published on a group's
+# monitoring branch. Within this window an unchanged pass does no monitoring git work at all; after it,
+# one pass re-fetches the branch and re-reads the feedback file (catching e.g. a branch deleted or
+# edited by hand). Overridable via config.toml ("monitoring_revalidate_seconds").
+MONITORING_REVALIDATE_SECONDS = 3600
+
+# How much of each pre/post-update command's output is kept in the feedback file: the first and last
+# half of this many characters, with a marker for what was cut. The complete output is always spooled
+# to {GITOPS_AGENT_HOME}/<COMMAND_LOG_DIR>/<app>-<pre|post>.log. Overridable via config.toml
+# ("command_output_max_chars").
+COMMAND_OUTPUT_MAX_CHARS = 32 * 1024
+COMMAND_LOG_DIR = "command-logs"
+
 
 class GitOpsAgent:
     def __init__(self, config_mode):
@@ -31,34 +102,347 @@ class GitOpsAgent:
         self.infra_name = self.config.get("infra_name")
         self.config_mode = config_mode
         self.first_run = True
+        # (url, branch) groups whose reconcile is still running -- normally only during run_once, but a
+        # group abandoned on timeout stays here until its worker finishes, so no pass starts it twice.
+        self._inflight_groups = set()
+        self._inflight_lock = threading.Lock()
+        # Mailbox for event-driven reconciles (see gitops_agent.triggers); the periodic interval
+        # stays as the safety net. _stopping lets run() exit cleanly (e.g. from tests or a signal).
+        self.trigger = triggers.ReconcileTrigger()
+        self._stopping = threading.Event()
+        # (url, branch) -> deployment-config commit seen on that group's last pass, so reconcile_group
+        # can tell the scheduler whether the group moved.
+        self._last_config_commit = {}
+        # (url, branch) -> {"bodies": app_name -> feedback body as last published (or found already
+        # published) on the monitoring branch, "verified_at": monotonic time, "pushed_at": monotonic
+        # time of this process's last push or None, "held": distinct changes held back since,
+        # "held_bodies": the last of them}. Lets flush_status skip all monitoring git work on a pass
+        # where no app's body changed.
+        self._published_feedback = {}
+        # How often a group's changed status may be pushed (see gitops_agent.publishing.PublishPolicy).
+        self.publish_policy = publishing.PublishPolicy(
+            self.config.get("monitoring_min_push_interval", publishing.MIN_PUSH_INTERVAL_SECONDS),
+            self.config.get("monitoring_push_on_health_change", True),
+        )
+        # The running pass's queue of monitoring pushes, sent together once every group has flushed
+        # (see reconcile_groups / publish). None outside a pass.
+        self._push_batch = None
+        # Digests of every config_files src/dst, re-hashed only when a file's stat changes, so the
+        # per-pass drift check does not re-read unchanged files (see gitops_agent.drift).
+        self.file_digests = drift.FileDigestManifest(gops.APP_CONFIGS_DIR.parent / CONFIG_DIGEST_MANIFEST)
+        # Group tips, applied app commits and published-feedback digests of the previous process, so a
+        # restart neither re-publishes unchanged status nor polls every group as if it had moved.
+        self.state = state.AgentState(gops.APP_CONFIGS_DIR.parent / AGENT_STATE_FILE, self.infra_name)
+        # Health/latency series for Prometheus, served and/or written out when configured (see
+        # gitops_agent.metrics).
+        self.metrics = metrics.Metrics()
+        # Per-phase spans of every pass when trace_passes is on; a pass is profiled on request (see
+        # gitops_agent.tracing).
+        home = gops.APP_CONFIGS_DIR.parent
+        self.tracer = tracing.Tracer(
+            self.config.get("trace_file", home / tracing.TRACE_FILE) if self.config.get("trace_passes") else None,
+            home=home,
+        )
+        # Every git call and hook goes through the shared asyncio execution engine, which caps the
+        # number of concurrent child processes across all groups (see gitops_agent.execution).
+        execution.engine().configure(self.config.get("max_child_processes", execution.MAX_CHILD_PROCESSES))
+        # Idle-time gc/repack/commit-graph of every clone the agent manages (see gitops_agent.maintenance).
+        self.maintenance = maintenance.MaintenanceScheduler(
+            self.config.get("maintenance_interval_seconds", maintenance.MAINTENANCE_INTERVAL_SECONDS),
+            self.config.get("maintenance_budget_seconds", maintenance.MAINTENANCE_BUDGET_SECONDS),
+        )
+        # app_name -> code_local_path, as last seen by evaluate_app, for maintenance.
+        self._code_paths = {}
+        # Monitoring-history retention, validated here so a malformed value fails at startup rather
+        # than on the first status commit of every group (see trim_monitoring_history).
+        self.retention_days = self.config.get("monitoring_history_retention_days", MONITORING_HISTORY_RETENTION_DAYS)
+        if isinstance(self.retention_days, bool) or not isinstance(self.retention_days, (int, float)) or (
+            self.retention_days < 0
+        ):
+            raise ValueError(
+                f"monitoring_history_retention_days must be a non-negative number; got {self.retention_days!r}"
+            )
+        self.history_retention = history_retention_limits(self.config)
 
     def run(self):
         if self.config_mode is True:
             default_editor = os.environ.get("EDITOR", "/usr/bin/nano")
             sp.call([default_editor, self.config_file])
             return
-        while True:
-            self.run_once()
-            print(f"Sleeping for {self.interval} seconds...")
-            time.sleep(self.interval)
+        server = None
+        if self.config.get("trigger_port"):
+            server = triggers.start_trigger_server(
+                self.trigger, int(self.config["trigger_port"]), self.config.get("trigger_host", "127.0.0.1")
+            )
+        metrics_server = None
+        if self.config.get("metrics_port"):
+            metrics_server = metrics.start_metrics_server(
+                self.metrics, int(self.config["metrics_port"]), self.config.get("metrics_host", "127.0.0.1")
+            )
+        scheduler = self.build_scheduler()
+        try:
+            # Every group is polled on its own adaptive schedule (see gitops_agent.scheduler): sooner
+            # after a change, backing off while idle (never beyond max_poll_interval) and exponentially
+            # while failing. Triggers start an immediate pass over the requested apps/groups (None =
+            # everything) on top of whatever is due, without disturbing the other groups' schedules.
+            requested = None
+            while not self._stopping.is_set():
+                grouped = group_apps_by_repo(self.apps)
+                now = time.monotonic()
+                scheduler.sync(grouped, now)
+                if requested is None:
+                    selected = grouped
+                else:
+                    wanted = set(scheduler.due(now)) | set(select_groups(grouped, requested) if requested else ())
+                    selected = {key: apps for key, apps in grouped.items() if key in wanted}
+
+                if selected:
+                    outcomes, _errors = self.reconcile_groups(selected)
+                    now = time.monotonic()
+                    for key, outcome in outcomes.items():
+                        scheduler.record(key, outcome, now)
+                    if len(selected) == len(grouped):
+                        self.first_run = False
+
+                delay = scheduler.next_wakeup(time.monotonic())
+                if delay > maintenance.MAINTENANCE_SAFETY_SECONDS:
+                    self.maintain(delay)
+                    delay = scheduler.next_wakeup(time.monotonic())
+                print(f"Sleeping for up to {int(delay)} seconds...")
+                requested = self.trigger.wait(delay)
+        finally:
+            if server is not None:
+                server.shutdown()
+            if metrics_server is not None:
+                metrics_server.shutdown()
+            gops.close_all_repo_sessions()
+            execution.engine().close()
+
+    def build_scheduler(self):
+        """Return the GroupScheduler configured from config.toml (defaults derive from `interval`)."""
+        return sched.GroupScheduler(
+            min_interval=self.config.get("min_poll_interval", self.interval / 5),
+            max_interval=self.config.get("max_poll_interval", self.interval),
+            jitter=self.config.get("poll_jitter", POLL_JITTER),
+            max_backoff=self.config.get("max_failure_backoff", self.interval * 12),
+        )
+
+    def managed_clones(self):
+        """Every git clone the agent maintains: the deployment-config and monitoring clones under
+        APP_CONFIGS_DIR, and the apps' code_local_path repos."""
+        clones = []
+        if gops.APP_CONFIGS_DIR.is_dir():
+            clones = sorted(path for path in gops.APP_CONFIGS_DIR.iterdir() if (path / ".git").exists())
+        clones += [path for path in sorted(set(self._code_paths.values())) if (path / ".git").exists()]
+        return clones
 
-    def run_once(self):
+    def maintain(self, window):
+        """Spend up to `window` seconds (less the safety margin) of idle time maintaining due clones.
+
+        Skipped while a group abandoned on timeout is still running; interrupted as soon as a
+        reconcile is requested or the agent stops.
+        """
+        if not self.maintenance.budget:
+            return []
+        with self._inflight_lock:
+            if self._inflight_groups:
+                return []
+        done = self.maintenance.run(
+            self.managed_clones(), window, lambda: self.trigger.pending() or self._stopping.is_set()
+        )
+        if done:
+            print(f"Maintained {len(done)} git clone(s): {', '.join(path.name for path in done)}")
+        return done
+
+    def stop(self):
+        """Make run() return after the current pass (or immediately, if it is sleeping)."""
+        self._stopping.set()
+        self.trigger.request()
+
+    def run_once(self, only=None):
+        """Run one reconcile pass over every group, or only the groups named in `only`.
+
+        `only` is an iterable of app names and/or group labels (``<repo-slug>@<branch>``), as sent by
+        a trigger; a named app reconciles its whole group, since the group shares one config clone and
+        one monitoring commit.
+        """
         # All apps share a single deployment-config repo per (url, branch), so clone each unique
-        # (url, branch) exactly once into a shared dir, and let every app that references it read from there
+        # (url, branch) exactly once into a shared dir, and let every app that references it read from
+        # there. Groups are reconciled on a bounded worker pool; each worker's prints are buffered and
+        # emitted afterwards in group order, so the log of a pass reads the same as a sequential one.
         grouped = group_apps_by_repo(self.apps)
-        for (app_config_url, app_config_branch), app_names in grouped.items():
-            slug = gops.repo_slug(app_config_url)
-            dep_cfg_local_path = shared_clone_path(app_config_url, app_config_branch)
-
-            # Snapshot each app's config before the clone/fetch (empty dict if not yet cloned),
-            # so we can still detect a first-time clone the way the per-app flow used to
-            initial_configs = {
-                name: gops.check_deployment_config(dep_cfg_local_path, name, self.infra_name)
-                for name in app_names
-            }
+        if only is not None:
+            grouped = select_groups(grouped, only)
+        _outcomes, errors = self.reconcile_groups(grouped)
+
+        # first_run forces ONE full re-evaluation+rewrite on a fresh agent (it bypasses flush_status's
+        # in-memory "nothing changed" skip). That job is done once we've completed this reconcile pass
+        # -- whether or not git ultimately produced a commit -- so clear it here, once, after EVERY
+        # group has flushed. Clearing it inside flush_status would let the first group to finish
+        # silently cancel the forced rewrite for the groups still running in parallel. A triggered
+        # pass over a subset of groups leaves it set, so the groups it skipped still get their rewrite.
+        if only is None:
+            self.first_run = False
+
+        if errors:
+            # Every other group has already been reconciled and logged; surface the first failure (in
+            # group order) so the caller still sees a refusal/corruption guard fire.
+            raise errors[0]
+
+    def reconcile_groups(self, grouped):
+        """Reconcile the given groups on the bounded worker pool. Returns (outcomes, errors).
+
+        outcomes maps each (url, branch) key to a gitops_agent.scheduler outcome: "changed" (an app was
+        updated or the deployment-config repo moved), "idle", "failed" (raised or timed out) or
+        "skipped" (still running from an earlier pass). errors lists the raised exceptions in group order.
+        """
+        max_workers = max(1, int(self.config.get("max_concurrent_groups", MAX_CONCURRENT_GROUPS)))
+        group_timeout = self.config.get("group_timeout_seconds", GROUP_TIMEOUT_SECONDS) or None
+
+        pass_started = time.monotonic()
+        # Every phase of the pass is traced when tracing is on (see gitops_agent.tracing).
+        with self.tracer.traced_pass(groups=len(grouped)):
+            batch = self._push_batch = publishing.PushBatch()
+            # Installed for the whole pass, and restored whatever happens, so an error can never leave
+            # the process's stdout routed through a dead pass's buffers.
+            router = _ThreadLocalStdout(sys.stdout)
+            sys.stdout = router
+            failures, push_logs = {}, []
+
+            def push_now(pushes):
+                # Pushes run on this thread; their log is emitted after the groups' logs.
+                if not pushes:
+                    return
+                buffer = router.capture()
+                try:
+                    with self.tracer.span("push"):
+                        failures.update(self.push_batch(pushes))
+                finally:
+                    router.release()
+                    push_logs.append(buffer.getvalue())
+
+            try:
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+                futures, started, outcomes = {}, {}, {}
+                for key, app_names in grouped.items():
+                    with self._inflight_lock:
+                        if key in self._inflight_groups:
+                            print(f"Skipping {key[0]}@{key[1]}: its previous reconcile is still running")
+                            outcomes[key] = sched.SKIPPED
+                            continue
+                        self._inflight_groups.add(key)
+                    batch.expect(key)
+                    # in_current_span: the worker's phases are traced (and profiled) as part of this pass.
+                    futures[key] = executor.submit(
+                        tracing.in_current_span(self._reconcile_group_captured), router, key, app_names, started
+                    )
+                # Don't block on shutdown: an abandoned (timed-out) worker must not hold up the pass.
+                executor.shutdown(wait=False)
+                # A remote's queued status pushes go out as soon as the last group feeding it is done (or
+                # abandoned), coalesced into one push (see gitops_agent.publishing); a slow group only
+                # delays its own remote.
+                abandoned = _wait_for_groups(
+                    futures, started, group_timeout, on_settled=lambda key: push_now(batch.settle(key))
+                )
+                push_now(batch.take())
+
+                errors = []
+                for key, future in futures.items():
+                    label = group_label(key)
+                    if key in abandoned:
+                        print(
+                            f"Reconcile of {label} exceeded {group_timeout}s and was abandoned for this pass; "
+                            f"it will be skipped until the running worker finishes"
+                        )
+                        future.add_done_callback(
+                            lambda f, label=label: print(
+                                f"Late log of abandoned reconcile {label}:\n{f.result()[0]}", end=""
+                            )
+                        )
+                        outcomes[key] = sched.FAILED
+                        continue
+                    log, changed, err = future.result()
+                    print(log, end="")
+                    if err is not None:
+                        errors.append(err)
+                        outcomes[key] = sched.FAILED
+                    else:
+                        outcomes[key] = sched.CHANGED if changed else sched.IDLE
+                print("".join(push_logs), end="")
+                # A group whose push failed is reported as failed for this pass.
+                for key, error in failures.items():
+                    errors.append(error)
+                    outcomes[key] = sched.FAILED
+                self.file_digests.save()
+                self.state.save()
+            finally:
+                sys.stdout = router.stream
+        self.record_pass_metrics(outcomes, time.monotonic() - pass_started)
+        return outcomes, errors
+
+    def record_pass_metrics(self, outcomes, seconds):
+        """Count the pass's group outcomes and duration, and refresh the metrics textfile if configured."""
+        now = time.time()
+        for key, outcome in outcomes.items():
+            self.metrics.inc("gitops_agent_group_passes_total", group=group_label(key), outcome=outcome)
+            if outcome in (sched.CHANGED, sched.IDLE):
+                self.metrics.set("gitops_agent_last_success_timestamp_seconds", now, group=group_label(key))
+        self.metrics.observe("gitops_agent_pass_duration_seconds", seconds)
+        if self.config.get("metrics_textfile"):
+            metrics.write_textfile(self.metrics, self.config["metrics_textfile"])
+
+    def record_app_statuses(self, key, bodies):
+        """Export each app's compute_app_status, from its finalized feedback body."""
+        for app_name, body in bodies.items():
+            ok, label = compute_app_status(body)
+            self.metrics.set(
+                "gitops_agent_app_healthy",
+                int(ok),
+                replace=("group", "app"),
+                group=group_label(key),
+                app=app_name,
+                status=label,
+            )
 
-            # Clone/fetch the shared deployment-config repo ONCE for this (url, branch) group
-            cfg_git_stats = gops.update_git_repo(
+    def _reconcile_group_captured(self, router, key, app_names, started):
+        """Worker entry point: reconcile one group with its prints captured. Returns (log, changed, error)."""
+        started[key] = time.monotonic()
+        buffer = router.capture()
+        changed, err = False, None
+        try:
+            with self.tracer.span("group", group=group_label(key)):
+                changed = self.reconcile_group(key[0], key[1], app_names)
+        except Exception as exc:  # surfaced by run_once after every group's log is emitted
+            print(f"Error while reconciling {group_label(key)}: {exc!r}")
+            err = exc
+        finally:
+            router.release()
+            with self._inflight_lock:
+                self._inflight_groups.discard(key)
+        return buffer.getvalue(), changed, err
+
+    def reconcile_group(self, app_config_url, app_config_branch, app_names):
+        """Reconcile every app of one (url, branch) group and flush the group's merged status once.
+
+        Returns True if anything moved: an app needed updating, or the deployment-config repo is at a
+        different commit than on this group's previous pass (the adaptive scheduler polls such groups
+        sooner).
+        """
+        slug = gops.repo_slug(app_config_url)
+        dep_cfg_local_path = shared_clone_path(app_config_url, app_config_branch)
+
+        # Snapshot each app's config before the clone/fetch (empty dict if not yet cloned),
+        # so we can still detect a first-time clone the way the per-app flow used to
+        initial_configs = {
+            name: gops.check_deployment_config(dep_cfg_local_path, name, self.infra_name)
+            for name in app_names
+        }
+
+        # Clone/fetch the shared deployment-config repo ONCE for this (url, branch) group
+        fetch_started = time.monotonic()
+        with self.tracer.span("config-fetch", repo=dep_cfg_local_path):
+            cfg_git_stats = _offload(
+                gops.update_git_repo,
                 f"{slug}@{app_config_branch}-config",
                 app_config_url,
                 app_config_branch,
@@ -66,63 +450,229 @@ class GitOpsAgent:
                 dep_cfg_local_path,
             )
 
-            # Then process every app that resolves to this shared clone, collecting each app's
-            # feedback. The merged feedback is committed+pushed to the monitoring branch EXACTLY
-            # ONCE for this (url, branch) group (see flush_status), instead of once per app.
-            per_app_feedback = {}
-            for app_name in app_names:
-                to_update, updated_cfg = self.evaluate_app(
-                    app_name, dep_cfg_local_path, initial_configs[app_name]
-                )
-                if to_update:
-                    app_git_stats, cmd_stats = self.pull_app(app_name, updated_cfg)
-                else:
+        self.metrics.observe(
+            "gitops_agent_config_fetch_seconds",
+            time.monotonic() - fetch_started,
+            group=group_label((app_config_url, app_config_branch)),
+        )
+
+        decisions = {}
+        for app_name in app_names:
+            with self.tracer.span("evaluate", app=app_name):
+                decisions[app_name] = self.evaluate_app(app_name, dep_cfg_local_path, initial_configs[app_name])
+
+        # Fetch every app that needs updating concurrently up front, then apply the updates one app at
+        # a time in dependency order (see order_apps_by_dependencies), so pre/post commands never
+        # overlap and a `depends_on` app is always fully updated before its dependants' hooks run.
+        to_fetch = {app_name: cfg for app_name, (to_update, cfg) in decisions.items() if to_update}
+        with self.tracer.span("prefetch", repo=[cfg["code_local_path"] for cfg in to_fetch.values()]):
+            prefetched = self.prefetch_apps(to_fetch)
+
+        # Then process every app that resolves to this shared clone, collecting each app's
+        # feedback. The merged feedback is committed+pushed to the monitoring branch EXACTLY
+        # ONCE for this (url, branch) group (see flush_status), instead of once per app.
+        per_app_feedback = {}
+        ordered = order_apps_by_dependencies({app_name: cfg for app_name, (_, cfg) in decisions.items()})
+        for app_name in ordered:
+            to_update, updated_cfg = decisions[app_name]
+            if to_update:
+                with self.tracer.span("pull", app=app_name, repo=updated_cfg["code_local_path"]):
+                    app_git_stats, cmd_stats = self.pull_app(app_name, updated_cfg, prefetched.get(app_name))
+            else:
+                with self.tracer.span("check", app=app_name):
                     app_git_stats, cmd_stats = self.check_app(updated_cfg)
-                per_app_feedback[app_name] = build_app_feedback(
-                    cfg_git_stats, app_git_stats, cmd_stats
-                )
+            if app_git_stats[0]:
+                self.state.record_applied(app_name, updated_cfg["code_commit_hash"])
+            per_app_feedback[app_name] = build_app_feedback(
+                cfg_git_stats, app_git_stats, cmd_stats
+            )
+        # Hand flush_status every app, in config order, regardless of the order they were applied in.
+        per_app_feedback = {app_name: per_app_feedback[app_name] for app_name in app_names}
 
+        with self.tracer.span("flush"):
             self.flush_status(app_config_url, app_config_branch, per_app_feedback)
 
+        key = (app_config_url, app_config_branch)
+        previous_commit = self._last_config_commit.get(key, self.state.group(key).get("config_commit"))
+        config_moved = previous_commit != cfg_git_stats[2]
+        self._last_config_commit[key] = cfg_git_stats[2]
+        self.state.record_group(key, config_commit=cfg_git_stats[2])
+        return config_moved or any(to_update for to_update, _cfg in decisions.values())
+
     def evaluate_app(self, app_name, dep_cfg_local_path, initial_config):
         final_config = gops.check_deployment_config(dep_cfg_local_path, app_name, self.infra_name)
         gops.claim_ownership(final_config["code_local_path"])
+        self._code_paths[app_name] = Path(final_config["code_local_path"])
 
         config_changed_at_repo = set(initial_config) - set(final_config)
-        code_not_cloned = not final_config["code_local_path"].exists()
-        code_not_at_desired_hash = not compare_git_hashes(
-            final_config["code_local_path"], final_config["code_commit_hash"]
-        )
+        app_to_be_updated = bool(config_changed_at_repo) or self.app_plan(app_name, final_config)["update"]
+        return app_to_be_updated, final_config
+
+    def app_plan(self, app_name, final_config):
+        """Return what updating the app to `final_config` would involve. No side effects.
+
+        A dict: ``update`` (whether pull_app would run), ``clone`` (the code is not cloned yet),
+        ``current``/``desired`` commit, ``config_files`` (dst paths whose content differs from their
+        source), ``interrupted`` and ``hooks`` (phase -> the pre/post command that would run).
+        """
+        desired = final_config["code_commit_hash"]
+        clone = not final_config["code_local_path"].exists()
+        current = None if clone else str(gops.repo_session(final_config["code_local_path"]).head.commit)
+        # The checkout is at the desired commit, but the update that put it there never completed (the
+        # agent stopped mid-update), so its config copies / post-command may not have run.
+        applied = self.state.applied_commit(app_name)
+        interrupted = applied is not None and applied != desired
         # Only consider pairs whose source exists. A missing source is skipped at copy time
         # (see pull_app), so flagging it as drift here would cause a perpetual update loop.
-        config_contents_dont_match = any(
-            not compare_file_contents(pair["dst_abs"], pair["src_abs"])
+        config_files = [
+            str(pair["dst_abs"])
             for pair in final_config["config_file_pairs"]
             if pair["src_abs"].exists()
-        )
-        app_to_be_updated = any(
-            (config_changed_at_repo, code_not_cloned, config_contents_dont_match, code_not_at_desired_hash)
-        )
-        return app_to_be_updated, final_config
-
-    def pull_app(self, app_name, app_config):
+            and not compare_file_contents(
+                pair["dst_abs"],
+                pair["src_abs"],
+                manifest=self.file_digests,
+                ignore_whitespace=pair.get("ignore_whitespace", False),
+            )
+        ]
+        update = clone or current != desired or bool(config_files) or interrupted
+        hooks = {}
+        if update:
+            # pull_app runs the pre-command only against an existing checkout.
+            if final_config["pre_updation_command"] and not clone:
+                hooks["pre"] = final_config["pre_updation_command"]
+            if final_config["post_updation_command"]:
+                hooks["post"] = final_config["post_updation_command"]
+        return {
+            "update": update,
+            "clone": clone,
+            "current": current,
+            "desired": desired,
+            "config_files": config_files,
+            "interrupted": interrupted,
+            "hooks": hooks,
+        }
+
+    def plan(self, only=None, fetch=False):
+        """Return what the next pass would do to every group, or the groups named in `only`.
+
+        Nothing is reset, copied, run or pushed (see gitops_agent.plan). Each group's desired state is
+        its deployment-config clone's ``origin/<branch>`` as of the last pass, or, with `fetch`, after
+        fetching that one ref. Returns one dict per group, in config order, for plan.format_plan.
+        """
+        grouped = group_apps_by_repo(self.apps)
+        if only is not None:
+            grouped = select_groups(grouped, only)
+        return [self.plan_group(url, branch, app_names, fetch) for (url, branch), app_names in grouped.items()]
+
+    def plan_group(self, url, branch, app_names, fetch=False):
+        group = {"group": group_label((url, branch)), "url": url, "branch": branch, "config_commit": None, "apps": {}}
+        local_path = shared_clone_path(url, branch)
+        if not Path(local_path).exists():
+            group["error"] = "deployment-config repo not cloned yet; the next pass clones it and updates every app"
+            return group
+        repo = gops.repo_session(local_path)
+        try:
+            if fetch:
+                # Only the remote-tracking ref moves; the checkout stays where the last pass left it.
+                repo.git.fetch("origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}")
+            commit = repo.commit(f"refs/remotes/origin/{branch}")
+        except (GitCommandError, BadName, ValueError) as err:
+            group["error"] = f"cannot read origin/{branch}: {err}"
+            return group
+        group["config_commit"] = commit.hexsha
+
+        with tempfile.TemporaryDirectory(prefix="gitops-agent-plan-") as snapshot:
+            planning.export_paths(commit, [f"{self.infra_name}/infra_meta.toml"], snapshot)
+            for app_name in app_names:
+                try:
+                    final_config = gops.check_deployment_config(snapshot, app_name, self.infra_name)
+                    planning.export_paths(
+                        commit, [pair["src_abs"] for pair in final_config["config_file_pairs"]], snapshot
+                    )
+                    group["apps"][app_name] = self.app_plan(app_name, final_config)
+                # GitError covers a checkout that is no longer a repository (InvalidGitRepositoryError,
+                # NoSuchPathError), not only a failed git command: it is that app's error, not the group's.
+                except (KeyError, ValueError, FileNotFoundError, GitError) as err:
+                    group["apps"][app_name] = {"error": f"{type(err).__name__}: {err}"}
+        return group
+
+    def prefetch_apps(self, app_configs):
+        """Fetch (or first-clone) several apps' code repos concurrently. Returns app_name -> outcome.
+
+        The outcome is fetch_git_repo's "cloned"/"fetched", or None when the prefetch failed -- pull_app
+        then falls back to its own full fetch, so a prefetch problem (including the origin guard firing)
+        surfaces exactly as it would have without the prefetch. Each fetch's log is printed afterwards
+        in app order, keeping the group's log readable.
+        """
+        if not app_configs:
+            return {}
+        max_workers = max(1, int(self.config.get("max_parallel_app_fetches", MAX_PARALLEL_APP_FETCHES)))
+        if max_workers == 1:
+            return {}
+
+        router = sys.stdout if isinstance(sys.stdout, _ThreadLocalStdout) else None
+        engine = execution.engine()
+
+        async def fetch_all():
+            # The engine's semaphore caps child processes agent-wide; this one keeps a single group
+            # from taking more than max_parallel_app_fetches of them.
+            group_limit = asyncio.Semaphore(max_workers)
+
+            async def fetch(app_name, cfg):
+                async with group_limit:
+                    return await engine.call(
+                        _call_captured,
+                        router,
+                        gops.fetch_git_repo,
+                        app_name,
+                        cfg["code_url"],
+                        cfg["code_local_path"],
+                        clone_strategy=cfg["clone_strategy"],
+                        clone_depth=cfg["clone_depth"],
+                        checkout_hash=cfg["code_commit_hash"],
+                    )
+
+            return await asyncio.gather(*(fetch(name, cfg) for name, cfg in app_configs.items()))
+
+        prefetched = {}
+        for app_name, (log, outcome, err) in zip(app_configs, engine.run_sync(fetch_all())):
+            print(log, end="")
+            if err is not None:
+                print(f"Prefetch of {app_name} failed ({err}); it will be fetched again during its update")
+            prefetched[app_name] = outcome
+        return prefetched
+
+    def pull_app(self, app_name, app_config, prefetched=None):
+        """Bring one app to its desired state: pre-command, code checkout, config copies, post-command.
+
+        prefetched is this app's prefetch_apps outcome, if any: "fetched"/"cloned" skip the redundant
+        network fetch, and "cloned" also skips the pre-command, which only ever runs against a checkout
+        that existed before this update (exactly as when the clone happens inside update_git_repo).
+        """
         pre_updation_command = app_config["pre_updation_command"]
         post_updation_command = app_config["post_updation_command"]
         target_path = Path(app_config["code_local_path"])
 
         cmd_ret, cmd_logs = {}, {}
 
-        if pre_updation_command and target_path.exists():
+        if pre_updation_command and target_path.exists() and prefetched != "cloned":
             print(f"Executing pre-update command for {app_name}: {pre_updation_command}...")
-            cmd_ret["pre"], cmd_logs["pre"] = run_command_with_tee(pre_updation_command, target_path)
+            cmd_ret["pre"], cmd_logs["pre"] = self.run_app_command(
+                app_name, "pre", pre_updation_command, target_path, app_config["command_limits"]
+            )
 
-        ret, status, commit = gops.update_git_repo(
+        ret, status, commit = _offload(
+            gops.update_git_repo,
             app_name,
             app_config["code_url"],
             "",
             self.infra_name,
             target_path,
             checkout_hash=app_config["code_commit_hash"],
+            fetch=prefetched is None,
+            clone_strategy=app_config["clone_strategy"],
+            clone_depth=app_config["clone_depth"],
         )
         # copy each config file to its destination
         for pair in app_config["config_file_pairs"]:
@@ -135,12 +685,28 @@ class GitOpsAgent:
 
         if post_updation_command:
             print(f"Executing post-update command for {app_name}: {post_updation_command}...")
-            cmd_ret["post"], cmd_logs["post"] = run_command_with_tee(post_updation_command, target_path)
+            cmd_ret["post"], cmd_logs["post"] = self.run_app_command(
+                app_name, "post", post_updation_command, target_path, app_config["command_limits"]
+            )
         return (ret, status, commit), (cmd_ret, cmd_logs)
 
+    def run_app_command(self, app_name, phase, command, target_path, limits):
+        """Run one app's pre/post-update command with its limits, the output cap and log spooling."""
+        max_chars = self.config.get("command_output_max_chars", COMMAND_OUTPUT_MAX_CHARS)
+        with self.tracer.span(f"{phase}-command", app=app_name):
+            return run_command_with_tee(
+                command,
+                target_path,
+                log_name=f"{app_name}-{phase}",
+                max_chars=max_chars,
+                timeout=limits["timeout"],
+                limits=limits,
+            )
+
     def check_app(self, app_config):
         target_path = Path(app_config["code_local_path"])
-        status, commit = gops.check_git_status(target_path)
+        engine = execution.engine()
+        status, commit = engine.run_sync(engine.check_git_status(target_path))
         cmd_stats = (True, "Nothing was run")
         return (True, status, commit), cmd_stats
 
@@ -154,7 +720,8 @@ class GitOpsAgent:
         when nothing was run, derives a per-app `status` and a top-level `overall_status` from the
         merged content, writes the file, and commits with a health-reflecting message (see
         summarize_group_health) + pushes at most once -- only when the merged content actually
-        changed (no empty commits / no spurious pushes).
+        changed (no empty commits / no spurious pushes). During a pass the push is queued and sent
+        with the other groups' (see publish).
 
         Apps not seen in this pass are intentionally PRESERVED (carry-forward), so overall_status
         summarises the whole persisted group, not just the apps reconciled this pass. In practice
@@ -166,18 +733,59 @@ class GitOpsAgent:
 
         slug = gops.repo_slug(app_config_url)
         monitoring_branch = f"{app_config_branch}-monitoring"
+
+        # Fast path: if every app's finalised body equals what this process last published (or found
+        # already published) for this group, there is nothing to write -- skip the monitoring fetch,
+        # the TOML load and the comparisons below entirely. The cache is only trusted for
+        # MONITORING_REVALIDATE_SECONDS, after which one full pass re-checks the branch itself.
+        key = (app_config_url, app_config_branch)
         # Shared monitoring clone per (url, branch); the feedback file merges every app keyed by app_name
         dep_feedback_local_path = shared_clone_path(app_config_url, app_config_branch) + "-monitoring"
+        published = self._published_feedback.get(key)
+        if published is None and self.first_run:
+            # A restarted agent: trust what the previous process published, if the clone still proves it.
+            published = self._restore_published(key, dep_feedback_local_path, monitoring_branch)
+        if published is not None and (not self.first_run or published.get("restored")):
+            bodies = published["bodies"]
+            current = {
+                app_name: finalize_app_feedback(app_body, bodies.get(app_name))
+                for app_name, app_body in per_app_feedback.items()
+            }
+            self.record_app_statuses(key, current)
+            now = time.monotonic()
+            unchanged = all(body == bodies.get(app_name) for app_name, body in current.items())
+            if unchanged:
+                # Back at the published state: whatever was held no longer needs publishing.
+                published.pop("held", None)
+                published.pop("held_bodies", None)
+            revalidate = self.config.get("monitoring_revalidate_seconds", MONITORING_REVALIDATE_SECONDS)
+            if unchanged and now - published["verified_at"] < revalidate:
+                print(f"Nothing to update for {monitoring_branch}...")
+                return
+            # A change that doesn't alter any app's health may wait for the next digest (see
+            # publishing.PublishPolicy); it is published with whatever else changed by then.
+            if not unchanged and self.publish_policy.should_hold(
+                published, current, now, healthy=lambda body: compute_app_status(body)[0]
+            ):
+                # Count distinct held states, not held passes: one change pending for many passes is one.
+                if current != published.get("held_bodies"):
+                    published["held"] = published.get("held", 0) + 1
+                    published["held_bodies"] = current
+                wait = published["pushed_at"] + self.publish_policy.min_interval - now
+                print(f"Holding back the status update for {monitoring_branch} for up to {wait:.0f}s (no health change)")
+                return
         repo_label = f"{slug}@{app_config_branch}-monitoring"
 
-        gops.update_git_repo(
-            repo_label,
-            app_config_url,
-            monitoring_branch,
-            self.infra_name,
-            dep_feedback_local_path,
-            create_branch=True,
-        )
+        with self.tracer.span("monitoring-fetch", repo=dep_feedback_local_path):
+            _offload(
+                gops.update_git_repo,
+                repo_label,
+                app_config_url,
+                monitoring_branch,
+                self.infra_name,
+                dep_feedback_local_path,
+                create_branch=True,
+            )
 
         feedback_file = Path(f"{dep_feedback_local_path}/{self.infra_name}.toml")
         if feedback_file.exists():
@@ -187,55 +795,42 @@ class GitOpsAgent:
             feedback = {}
 
         # Build the merged feedback for THIS run: every app in per_app_feedback gets its fresh body,
-        # with the extra-command-output carry-forward applied per app when nothing was run.
+        # with the extra-command-output carry-forward and per-app status applied (finalize_app_feedback).
         current_feedback = {}
         anything_changed = False
         for app_name, app_body in per_app_feedback.items():
-            app_body = dict(app_body)  # copy: don't mutate the caller's dict
-            cmd_logs = app_body.pop("_cmd_logs")
-
-            # app_name will not be in feedback if it's the 1st time running for this app (while it has
-            # run for other apps). Carry forward the previous extra-command-output when nothing was run.
-            # Guard the lookup: the feedback file lives on a (remote) monitoring branch and may have
-            # been hand-edited or written by an older schema, so a present app entry is not guaranteed
-            # to carry extra-command-output. Skipping the carry-forward for one malformed entry must
-            # not abort status reporting for every other app in this group.
-            prior = feedback.get(app_name)
-            if cmd_logs == "Nothing was run" and isinstance(prior, dict) and "extra-command-output" in prior:
-                app_body["extra-command-output"] = prior["extra-command-output"]
-
-            # Per-app health is a DETERMINISTIC function of the (already-finalised) feedback body, so
-            # adding it here cannot break the no-op optimisation: an identical body yields an identical
-            # status. Compute it AFTER carry-forward so the status reflects the body that gets written,
-            # and BEFORE the unchanged comparison so the new status field participates in that compare.
-            _ok, app_body["status"] = compute_app_status(app_body)
-
+            app_body = finalize_app_feedback(app_body, feedback.get(app_name))
             current_feedback[app_name] = app_body
 
             previously = feedback.get(app_name)
-            if (
-                previously is not None
-                and json.dumps(previously, sort_keys=True) == json.dumps(app_body, sort_keys=True)
-                and not self.first_run
-            ):
+            if previously is not None and previously == app_body and not self.first_run:
                 print(f"Nothing to update for {app_name}...")
             else:
                 anything_changed = True
 
+        self.record_app_statuses(key, current_feedback)
+        repo = gops.repo_session(dep_feedback_local_path)
         if not anything_changed:
             print(f"Nothing to update for {monitoring_branch}...")
+            self._remember_published(
+                key, current_feedback, published and published.get("pushed_at"), repo.head.commit.hexsha
+            )
             return
-
         feedback.update(current_feedback)
         feedback["last-updated"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
         # Top-of-file overall status summarising the WHOLE merged group (every app currently in the
-        # feedback file, not just the ones reconciled this pass), so the health of the site is visible
-        # at a glance. overall_status / commit message are derived deterministically from the same per-app
-        # statuses; the unchanged-detection above already gated on the per-app bodies, so they only ever
-        # change when at least one body did.
+        # feedback file, not just the ones reconciled this pass), so the health of the site is
+        # visible at a glance. overall_status / commit message are derived deterministically from
+        # the same per-app statuses; the unchanged-detection above already gated on the per-app
+        # bodies, so they only ever change when at least one body did.
         overall_status, commit_message = summarize_group_health(feedback)
         feedback["overall_status"] = overall_status
+        updates = published.get("held", 0) if published else 0
+        if not published or current_feedback != published.get("held_bodies"):
+            updates += 1  # this pass's state is a further change on top of the held ones
+        if updates > 1:
+            commit_message += f" (digest of {updates} updates)"
 
         # Dump `feedback` as a toml file at feedback_file path
         with open(feedback_file, "w") as f:
@@ -243,7 +838,6 @@ class GitOpsAgent:
             f.write("\n# You can render the escaped text with https://onlinetexttools.com/unescape-text\n")
 
         # Add, commit and push the changes ONCE for this group
-        repo = Repo(dep_feedback_local_path)
         if repo.is_dirty() or repo.untracked_files:
             repo.git.add(all=True)
             repo.git.config("user.name", self.infra_name)
@@ -254,43 +848,160 @@ class GitOpsAgent:
         # but BEFORE the push, so the push reflects the trimmed branch. A rewrite makes the local
         # branch diverge from origin (non-fast-forward), so the push below must be a force-push when a
         # rewrite happened; an ordinary status append stays a normal push.
-        retention_days = self.config.get("monitoring_history_retention_days", MONITORING_HISTORY_RETENTION_DAYS)
-        rewrote_history = trim_monitoring_history(repo, monitoring_branch, retention_days)
+        with self.tracer.span("trim"):
+            rewrote_history = trim_monitoring_history(
+                repo, monitoring_branch, self.retention_days, **self.history_retention
+            )
+        if rewrote_history:
+            self.metrics.inc("gitops_agent_monitoring_trims_total", group=group_label(key))
+
+        if _unpushed(repo, monitoring_branch):
+            # The trim rewrote/squashed older history, so the local branch is NOT a fast-forward of
+            # origin -- a normal push would be rejected, so the trimmed branch is force-pushed. Plain
+            # force (not --force-with-lease): this is a machine-generated, single-writer branch (only
+            # this agent ever pushes the {branch}-monitoring branch), so there is no concurrent human
+            # writer to clobber. The push also leaves the local branch tracking origin, so the NEXT
+            # normal run pushes cleanly.
+            push = publishing.pending_push(
+                key,
+                app_config_url,
+                dep_feedback_local_path,
+                monitoring_branch,
+                str(repo.commit(monitoring_branch)),
+                force=rewrote_history,
+            )
+            description = (
+                f"status for {sorted(per_app_feedback)} to file {feedback_file.stem} at branch {monitoring_branch}"
+                + (" (history trimmed)" if rewrote_history else "")
+            )
+
+            def on_pushed():
+                print(f"Pushed {description}")
+                self._remember_published(key, current_feedback, time.monotonic(), push["sha"])
 
-        # Compare local-vs-remote using the EXPLICIT monitoring_branch ref, not repo.active_branch:
-        # active_branch raises TypeError on a detached HEAD, which the IndexError guard would not
-        # catch. monitoring_branch is the branch we just committed/trimmed and are about to push, so it
-        # is the correct, always-resolvable ref to gate the push on.
+            push["on_pushed"] = on_pushed
+            self.publish(push)
+            return
+        self._remember_published(
+            key, current_feedback, published and published.get("pushed_at"), repo.head.commit.hexsha
+        )
+
+    def _remember_published(self, key, bodies, pushed_at, monitoring_commit):
+        """Record `bodies` as what the group's monitoring branch holds at `monitoring_commit`."""
+        self._published_feedback[key] = {"bodies": bodies, "verified_at": time.monotonic(), "pushed_at": pushed_at}
+        self.state.record_published(key, bodies, monitoring_commit)
+
+    def _restore_published(self, key, local_path, monitoring_branch):
+        """Rebuild the group's published-feedback cache entry from the state store, or return None.
+
+        Only when the local monitoring clone is clean and both its HEAD and ``origin/<branch>`` are
+        still the commit the previous process published, and the feedback file there matches the
+        recorded digest -- read from disk, with no fetch. A restored entry counts as verified now.
+        """
+        saved = self.state.group(key)
+        if not saved.get("monitoring_commit") or not Path(local_path).exists():
+            return None
         try:
-            repo_remote_commit = str(repo.remotes.origin.refs[monitoring_branch].commit)
-        except IndexError:
-            repo_remote_commit = None  # branch not on origin yet (brand-new monitoring branch)
-        repo_commit_mismatching = str(repo.commit(monitoring_branch)) != repo_remote_commit
-        if repo_commit_mismatching:
-            if rewrote_history:
-                # The rewrite rebased/squashed older history, so the local branch is NOT a
-                # fast-forward of origin -- a normal push would be rejected. Force-push the trimmed
-                # branch. We use plain --force (not --force-with-lease): this is a machine-generated,
-                # single-writer branch (only this agent ever pushes the {branch}-monitoring branch),
-                # so there is no concurrent human writer to clobber, and --force-with-lease would
-                # otherwise need an explicit fetched-ref expectation we don't track here. --set-upstream
-                # keeps the local branch tracking origin so the NEXT normal run pushes cleanly.
-                repo.git.push("--force", "--set-upstream", "origin", monitoring_branch)
-            else:
-                repo.git.push("--set-upstream", "origin", monitoring_branch)
-            print(
-                f"Pushed status for {sorted(per_app_feedback)} to file {feedback_file.stem} "
-                f"at branch {monitoring_branch}" + (" (history trimmed)" if rewrote_history else "")
+            repo = gops.repo_session(local_path)
+            tips = {repo.head.commit.hexsha, repo.commit(f"refs/remotes/origin/{monitoring_branch}").hexsha}
+            feedback = toml.load(Path(local_path) / f"{self.infra_name}.toml")
+        except (BadName, ValueError, OSError):
+            return None
+        if tips != {saved["monitoring_commit"]} or repo.is_dirty():
+            return None
+        bodies = {app_name: feedback[app_name] for app_name in saved.get("apps", []) if app_name in feedback}
+        if state.feedback_digest(bodies) != saved.get("feedback_digest"):
+            return None
+        published = self._published_feedback[key] = {
+            "bodies": bodies,
+            "verified_at": time.monotonic(),
+            "pushed_at": None,
+            "restored": True,
+        }
+        return published
+
+    def publish(self, push):
+        """Queue a monitoring push on the running pass's PushBatch, or push it right away.
+
+        reconcile_groups pushes a remote's queue once every group feeding it has finished (see
+        push_batch). Outside a pass, or for a group that outlived its (abandoned) pass, the push happens
+        here and a failure raises.
+        """
+        batch = self._push_batch
+        if batch is not None and batch.add(push):
+            print(f"Queued push of {push['branch']}")
+            return
+        error = publishing.push_pending([push], self.ssh_env)[push["key"]]
+        self.metrics.inc(
+            "gitops_agent_monitoring_pushes_total", group=group_label(push["key"]), result="failed" if error else "ok"
+        )
+        if error is not None:
+            raise error
+        push["on_pushed"]()
+
+    def push_batch(self, pending):
+        """Send the queued pushes `pending`, one ``git push`` per remote. Returns {key: error} of failures."""
+        results = publishing.push_pending(pending, self.ssh_env)
+        failures = {}
+        for push in pending:
+            error = results[push["key"]]
+            self.metrics.inc(
+                "gitops_agent_monitoring_pushes_total", group=group_label(push["key"]), result="failed" if error else "ok"
             )
+            if error is None:
+                push["on_pushed"]()
+            else:
+                print(f"Error while pushing {push['branch']} of {gops.repo_slug(push['url'])}: {error!r}")
+                failures[push["key"]] = error
+        return failures
+
+    def ssh_env(self, local_path):
+        """Environment for monitoring pushes: a shared SSH ControlMaster connection per host, if enabled."""
+        return publishing.ssh_env(
+            gops.APP_CONFIGS_DIR.parent / publishing.SSH_CONTROL_DIR,
+            self.config.get("ssh_control_persist", publishing.SSH_CONTROL_PERSIST_SECONDS),
+            repo=gops.repo_session(local_path),
+        )
 
-        # first_run forces ONE full re-evaluation+rewrite on a fresh agent (it bypasses the in-memory
-        # "nothing changed" skip above). That job is done once we've completed this reconcile pass --
-        # whether or not git ultimately produced a commit. Clearing it only inside the push branch left
-        # a latent bug: when a first_run rewrite was byte-identical (e.g. same-second last-updated), no
-        # commit was made AND first_run stayed True, so the NEXT pass would bypass the skip again and
-        # could push a spurious commit if the timestamp then advanced. Clear it here so subsequent
-        # unchanged passes correctly no-op.
-        self.first_run = False
+
+def _unpushed(repo, branch):
+    """True if the local `branch` of a monitoring clone is not what origin has (or origin lacks it).
+
+    Uses the EXPLICIT branch ref, not repo.active_branch: active_branch raises TypeError on a detached
+    HEAD. `branch` is the branch flush_status commits/trims and pushes, so it is the correct,
+    always-resolvable ref to gate the push on.
+    """
+    try:
+        local_commit = repo.commit(branch)
+    except (BadName, ValueError):
+        return False  # nothing committed locally, nothing to push
+    try:
+        return local_commit != repo.remotes.origin.refs[branch].commit
+    except IndexError:
+        return True  # branch not on origin yet (brand-new monitoring branch)
+
+
+def finalize_app_feedback(app_body, prior):
+    """Return the body to publish for one app, given its fresh body and its published one. Pure.
+
+    Drops the private "_cmd_logs" key, carries the previous extra-command-output forward when nothing
+    was run this pass, and adds the per-app `status`. Deterministic, so an identical input always
+    yields an identical body -- which is what lets flush_status compare bodies to skip no-op writes.
+
+    Args:
+        app_body (dict): the per-app body from build_app_feedback (not mutated).
+        prior (dict or None): the app's entry as last published, if any. It lives on a (remote)
+            monitoring branch and may have been hand-edited or written by an older schema, so it is
+            only used when it actually carries an extra-command-output.
+    """
+    app_body = dict(app_body)
+    cmd_logs = app_body.pop("_cmd_logs")
+    if cmd_logs == "Nothing was run" and isinstance(prior, dict) and "extra-command-output" in prior:
+        app_body["extra-command-output"] = prior["extra-command-output"]
+    # Status is computed AFTER carry-forward so it reflects the body that gets written, and is part of
+    # the body so it participates in the unchanged comparison.
+    _ok, app_body["status"] = compute_app_status(app_body)
+    return app_body
 
 
 def build_app_feedback(cfg_git_stats, app_git_stats, cmd_stats):
@@ -328,7 +1039,8 @@ def compute_app_status(app_feedback):
     truthy AND every return code in its extra-command-output "command-return-val" is 0 or None
     (a check-only pass / empty / unparseable command-return-val is treated as no command failure).
     Otherwise it is an ISSUE; the label names the failing aspect in priority order: app update, then
-    config update, then post-command (so when both updates fail the label is "app update failed").
+    config update, then a command timeout, then post-command (so when both updates fail the label is
+    "app update failed").
     A malformed/legacy entry (missing keys, wrong shape) must NOT raise -- it is reported as an
     unknown issue so one bad app never aborts the whole group's status reporting.
 
@@ -352,12 +1064,31 @@ def compute_app_status(app_feedback):
     if not cfg.get("updation-return-value"):
         return False, "❌ config update failed"
 
+    if _command_timed_out(app_feedback.get("extra-command-output")):
+        return False, "❌ command timed out"
     if _post_command_failed(app_feedback.get("extra-command-output")):
         return False, "❌ post-command exited non-zero"
 
     return True, "✅ healthy"
 
 
+def _command_timed_out(extra_command_output):
+    """Return True if a pre/post command was killed for exceeding its command_timeout.
+
+    run_command_with_tee reports such a command with the command_output.COMMAND_TIMED_OUT sentinel in
+    place of its return code, so "{'post': 'timeout'}" is a timeout rather than a generic failure.
+    Anything unparseable is left to _post_command_failed.
+    """
+    if not isinstance(extra_command_output, dict):
+        return False
+    raw = extra_command_output.get("command-return-val")
+    try:
+        parsed = ast.literal_eval(raw) if isinstance(raw, str) else None
+    except (ValueError, SyntaxError):
+        return False
+    return isinstance(parsed, dict) and cmdout.COMMAND_TIMED_OUT in parsed.values()
+
+
 def _post_command_failed(extra_command_output):
     """Return True only if a parsed post/pre command return code is a non-zero, non-None failure.
 
@@ -441,31 +1172,175 @@ def _has_git_identity(repo):
         return False
 
 
-def _commits_to_trim(commit_dates, cutoff_ts):
+def _commits_to_trim(
+    commit_dates, cutoff_ts, trigger_ts=None, max_commits=None, commit_sizes=None, max_bytes=None, slack=0
+):
     """Pure boundary logic: given commit committer-timestamps, decide the trim boundary.
 
     Args:
         commit_dates (list[int]): committer epoch-seconds for every commit on the branch, ordered
             OLDEST first ... NEWEST last (i.e. parent-before-child).
         cutoff_ts (int/float): epoch-seconds cutoff; a commit is KEPT iff its committer-date >= cutoff.
+        trigger_ts (int/float): a trim is only warranted once some commit is older than this (see
+            MONITORING_HISTORY_TRIM_SLACK); defaults to cutoff_ts.
+        max_commits (int): optional cap on the branch length, synthetic base included.
+        commit_sizes (list[int]) / max_bytes (int): optional cap on the total size of the kept window,
+            commit_sizes giving each commit's size in the same order as commit_dates.
+        slack (float): a count/size cap only triggers a trim once it is exceeded by this fraction.
 
     Returns:
         (needs_trim, boundary_index): needs_trim is True only when at least one commit is OLDER than
-        the cutoff (so a rewrite is warranted). boundary_index is the index (into commit_dates) of the
-        NEWEST commit that is older than the cutoff -- that commit's tree becomes the synthetic base and
-        every commit AFTER it (the kept window, all >= cutoff) is replayed on top. When no commit is
-        older than the cutoff, needs_trim is False and boundary_index is None (do nothing). When EVERY
-        commit is older than the cutoff, boundary_index is the last (newest/HEAD) index, so the latest
-        state is preserved as the single base commit and the kept window is empty.
+        the trigger, or a cap is exceeded by more than the slack (so a rewrite is warranted).
+        boundary_index is the index (into commit_dates) of the boundary commit -- the NEWEST commit
+        that is older than the cutoff, or that the kept window has no room for under a cap, whichever
+        is newer. Its tree becomes the synthetic base and every commit AFTER it (the kept window) is
+        replayed on top. When no trim is needed, needs_trim is False and boundary_index is None (do
+        nothing). When EVERY commit is older than the cutoff, boundary_index is the last (newest/HEAD)
+        index, so the latest state is preserved as the single base commit and the kept window is empty.
     """
+    trigger_ts = cutoff_ts if trigger_ts is None else trigger_ts
+    triggered = any(ts < trigger_ts for ts in commit_dates)
+    boundaries = []
     boundary_index = None
     for i, ts in enumerate(commit_dates):
         if ts < cutoff_ts:
             boundary_index = i  # keep advancing to the NEWEST old commit
-    return (boundary_index is not None), boundary_index
+    if boundary_index is not None:
+        boundaries.append(boundary_index)
+
+    count = len(commit_dates)
+    if max_commits:
+        triggered = triggered or count > max_commits * (1 + slack)
+        if count > max_commits:
+            boundaries.append(count - max_commits)  # leaves max_commits - 1 kept commits + the base
+
+    if max_bytes:
+        triggered = triggered or sum(commit_sizes) > max_bytes * (1 + slack)
+        kept_bytes = 0
+        for i in range(count - 1, -1, -1):
+            kept_bytes += commit_sizes[i]
+            if kept_bytes > max_bytes:
+                boundaries.append(i)  # the newest commit that no longer fits
+                break
+
+    if not triggered:
+        return False, None
+    return True, max(boundaries)
+
+
+def _downsample(commit_dates, now, rules):
+    """Pure: return the indices (into the oldest-first commit_dates) of the commits downsampling keeps.
+
+    rules is a list of (min_age_seconds, every_seconds) sorted by min_age. A commit at least min_age old
+    falls under the oldest-age rule it qualifies for, and of all commits in the same every_seconds
+    bucket of that rule only the NEWEST is kept (e.g. hourly after a day, daily after a week). Younger
+    commits are all kept -- and so is the newest commit overall, which is always the newest of its bucket.
+    """
+    keep = {}
+    for i, ts in enumerate(commit_dates):
+        rule = None
+        for index, (min_age, _every) in enumerate(rules):
+            if now - ts >= min_age:
+                rule = index
+        bucket = ("young", i) if rule is None else (rule, int(ts // rules[rule][1]))
+        keep[bucket] = i  # oldest first, so the newest commit of a bucket wins
+    return sorted(keep.values())
+
+
+def _walk_history(repo, branch, with_sizes=False):
+    """Yield (sha, committer_ts, size) for every commit of `branch`, NEWEST first, streamed.
+
+    Uses ``git rev-list --first-parent --timestamp`` (or, with_sizes, ``git log --raw``), read line by
+    line, so a caller that stops early never makes git walk -- or Python materialise -- the rest of the
+    branch. size is the total size of the blobs the commit introduced (0 unless with_sizes), looked up
+    through the repo's object database.
+    """
+    if with_sizes:
+        process = repo.git.log(
+            "--first-parent", "--root", "--raw", "--no-abbrev", "--no-renames", "--format=%x01%H %ct", branch,
+            as_process=True,
+        )
+    else:
+        process = repo.git.rev_list("--first-parent", "--timestamp", branch, as_process=True)
+    try:
+        if not with_sizes:
+            for line in process.proc.stdout:
+                timestamp, sha = line.split()
+                yield sha.decode("ascii"), int(timestamp), 0
+            return
+        current = None
+        for line in process.proc.stdout:
+            if line.startswith(b"\x01"):
+                if current is not None:
+                    yield tuple(current)
+                sha, timestamp = line[1:].split()
+                current = [sha.decode("ascii"), int(timestamp), 0]
+            elif line.startswith(b":") and current is not None:
+                _old_mode, new_mode, _old_sha, new_sha = line.split(b"\t", 1)[0].split()[:4]
+                if new_mode in (b"100644", b"100755") and new_sha.strip(b"0"):
+                    current[2] += repo.odb.info(bytes.fromhex(new_sha.decode("ascii"))).size
+        if current is not None:
+            yield tuple(current)
+    finally:
+        process.proc.stdout.close()
+        process.proc.kill()  # no-op if git already finished; stops it if the caller stopped early
+        process.proc.wait()
+
+
+def _reparent_commit(repo, sha, parent_sha):
+    """Write a copy of commit `sha` whose only parent is `parent_sha` (None: a root); return its sha.
+
+    The raw commit object is copied byte-for-byte -- same tree, author, committer (names AND dates),
+    encoding and message -- with just its parent line replaced; a signature would no longer match,
+    so it is dropped. Read and written in-process through the repo's object database, so replaying
+    thousands of snapshots costs no subprocess per commit.
+    """
+    raw = repo.odb.stream(bytes.fromhex(sha)).read()
+    header, separator, message = raw.partition(b"\n\n")
+    lines, in_signature = [], False
+    for line in header.split(b"\n"):
+        if in_signature and line.startswith(b" "):
+            continue  # continuation of a dropped gpgsig header
+        in_signature = line.startswith((b"gpgsig ", b"gpgsig-sha256 "))
+        if in_signature or line.startswith(b"parent "):
+            continue
+        lines.append(line)
+    if parent_sha is not None:
+        lines.insert(1, b"parent " + parent_sha.encode("ascii"))  # right after the "tree" line
+    data = b"\n".join(lines) + separator + message
+    return repo.odb.store(IStream(b"commit", len(data), io.BytesIO(data))).hexsha.decode("ascii")
+
 
+def history_retention_limits(config):
+    """Return the optional count/size/downsampling retention settings from config.toml.
+
+    Keys (all optional, off when absent): ``monitoring_history_max_commits`` (positive int),
+    ``monitoring_history_max_size_mb`` (positive number) and ``monitoring_history_downsample`` (a list
+    of ``[after_days, keep_one_per_seconds]`` pairs). Raises ValueError on a malformed value.
+    """
+    max_commits = config.get("monitoring_history_max_commits")
+    if max_commits is not None and (isinstance(max_commits, bool) or not isinstance(max_commits, int) or max_commits < 1):
+        raise ValueError("monitoring_history_max_commits must be a positive integer")
+    max_size_mb = config.get("monitoring_history_max_size_mb")
+    if max_size_mb is not None and (
+        isinstance(max_size_mb, bool) or not isinstance(max_size_mb, (int, float)) or max_size_mb <= 0
+    ):
+        raise ValueError("monitoring_history_max_size_mb must be a positive number")
+    downsample = config.get("monitoring_history_downsample") or []
+    for rule in downsample:
+        if (
+            not isinstance(rule, list)
+            or len(rule) != 2
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool) and v > 0 for v in rule)
+        ):
+            raise ValueError(
+                "monitoring_history_downsample must be a list of [after_days, keep_one_per_seconds] pairs "
+                f"of positive numbers, got {rule!r}"
+            )
+    return {"max_commits": max_commits, "max_size_mb": max_size_mb, "downsample": downsample}
 
-def trim_monitoring_history(repo, branch, retention_days):
+
+def trim_monitoring_history(repo, branch, retention_days, max_commits=None, max_size_mb=None, downsample=None):
     """Squash monitoring-branch commits older than (now - retention_days) into one synthetic base.
 
     The monitoring branch is a machine-generated orphan branch of linear, full-snapshot commits, so
@@ -473,99 +1348,147 @@ def trim_monitoring_history(repo, branch, retention_days):
     growing forever we periodically rewrite it to: [one synthetic base commit holding the tree at the
     cutoff boundary] + [the commits within the retention window, replayed in order]. Returns True iff
     it rewrote history (so the caller knows the subsequent push must be a force-push); returns False
-    (and touches nothing) when no commit is older than the cutoff.
-
-    Mechanism (git plumbing, no working-tree churn):
-      1. List the branch's commits oldest-first with committer dates; pick the boundary = newest commit
-         older than the cutoff (see _commits_to_trim). If none, return False.
+    (and touches nothing) when no commit is older than the cutoff -- or none yet older than the cutoff
+    minus MONITORING_HISTORY_TRIM_SLACK of the window, so a busy branch is rewritten every few days
+    rather than on every pass.
+
+    Besides age, the kept window can be capped (see history_retention_limits / _commits_to_trim):
+      * max_commits -- the branch never grows past this many commits (plus the slack),
+      * max_size_mb -- nor past this many MB of snapshot blobs (uncompressed, so an upper bound on
+        what they take in a pack),
+      * downsample  -- [after_days, keep_one_per_seconds] rules thin the kept window: only the newest
+        snapshot per bucket survives once it is that old (see _downsample). A rewrite for downsampling
+        alone only happens once it would drop more than the slack fraction of the branch.
+    Whichever boundary is newest wins.
+
+    Mechanism (git plumbing only -- no rebase, no checkout, the working tree is never touched):
+      1. Walk the branch back from HEAD (see _walk_history) only until some limit is exceeded by more
+         than its slack -- e.g. the first commit older than the cutoff minus the slack -- and let
+         _commits_to_trim pick the boundary among the commits read. If no limit triggered, return
+         False: the common case costs a walk of the retention window, not of the whole branch.
       2. Build the synthetic base via ``git commit-tree <boundary-tree>`` with NO parent -> an orphan
          commit whose tree is byte-for-byte the boundary commit's tree.
-      3. ``git rebase --onto <synthetic-base> <boundary> <branch>`` replays exactly the kept window
-         (commits strictly after the boundary) onto the synthetic base. When the boundary IS HEAD
-         (every commit was old), the window is empty and HEAD simply moves to the synthetic base --
-         whose tree equals the old HEAD's tree, so the current status content is unchanged.
+      3. Replay the kept window (commits strictly after the boundary, minus those downsampled away),
+         oldest first, as copies of the original commit objects re-parented onto the new chain (see
+         _reparent_commit). Every commit is a full snapshot, so its existing tree is reused as is;
+         authors, committers and dates are preserved. When the boundary IS HEAD (every commit was
+         old), the window is empty and the synthetic base itself -- whose tree equals the old HEAD's
+         -- becomes the tip.
+      4. Move the branch with ONE ``git update-ref <branch> <new-tip> <old-tip>``: atomic, and refused
+         if the branch moved in the meantime. The new tip's tree is the old one's, so the checked-out
+         working tree and index stay valid as they are.
 
     Replaying changes commit hashes (expected for a rewrite); the INVARIANT we guarantee is that the
     resulting HEAD tree is identical to the pre-trim HEAD tree -- trimming never alters current status.
+    A failure before step 4 leaves the branch untouched (only unreferenced objects are written).
     """
-    # Oldest-first commit list with committer timestamps. iter_commits yields newest-first, so reverse.
-    commits = list(repo.iter_commits(branch))[::-1]
-    if not commits:
+    try:
+        head_before = repo.commit(branch)
+    except (BadName, ValueError):
         return False  # brand-new / empty branch -- nothing to trim
 
-    commit_dates = [c.committed_date for c in commits]
-    cutoff = time.time() - retention_days * 86400
-    needs_trim, boundary_index = _commits_to_trim(commit_dates, cutoff)
-    if not needs_trim:
-        return False
-
-    boundary = commits[boundary_index]
-    # Record the pre-trim branch tip + tree so we can (a) verify nothing was lost afterwards and
-    # (b) restore the branch if the rewrite fails partway, so a failed trim never leaves the shared
-    # clone wedged mid-rebase and never lets the caller force-push a half-rewritten branch.
-    head_sha_before = repo.git.rev_parse(branch)
-    head_tree_before = repo.git.rev_parse(f"{branch}^{{tree}}")
-    kept_count = len(commits) - 1 - boundary_index  # commits strictly after the boundary
-
-    # Synthetic base: an orphan commit (no -p) whose tree == the boundary commit's tree.
-    cutoff_date = time.strftime("%Y-%m-%d", time.localtime(cutoff))
-    base_message = f"📉 History trimmed: commits before {cutoff_date} squashed"
-    # commit-tree needs a committer identity; the monitoring repo already has user.name/email
-    # configured (set whenever a status commit is made / the orphan branch is created), but be
-    # defensive in case the helper is called on a freshly-created repo: ensure an identity exists.
-    if not _has_git_identity(repo):
-        repo.git.config("user.name", "gitops-agent")
-        repo.git.config("user.email", "<>")
-    synthetic_base = repo.git.commit_tree(f"{boundary.hexsha}^{{tree}}", "-m", base_message).strip()
+    now = time.time()
+    slack = MONITORING_HISTORY_TRIM_SLACK
+    cutoff = now - retention_days * 86400
+    trigger = cutoff - retention_days * 86400 * slack
+    max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+    rules = sorted((after_days * 86400, every) for after_days, every in downsample or ())
 
+    entries, total_bytes = [], 0  # newest first, until a limit is exceeded by more than its slack
+    walk = _walk_history(repo, branch, with_sizes=max_bytes is not None)
     try:
-        if boundary_index == len(commits) - 1:
-            # Every commit is older than the cutoff: the kept window is empty. Just point the branch
-            # at the synthetic base (its tree == old HEAD tree, so the latest state is preserved).
-            repo.git.checkout(branch)
-            repo.git.reset("--hard", synthetic_base)
-        else:
-            # Replay the kept window (commits strictly AFTER the boundary) onto the synthetic base.
-            # --empty=keep so a git-version-dependent "drop empty commits" default can NEVER silently
-            # shorten the kept window (status snapshots can legitimately be no-op diffs vs. their
-            # parent). --committer-date-is-author-date keeps replayed dates stable.
-            repo.git.rebase("--onto", synthetic_base, boundary.hexsha, branch, empty="keep")
-    except Exception as err:
-        # The rewrite failed partway (conflict, hook, disk, ...). Abort any in-progress rebase and put
-        # the branch back exactly where it was, so the next run starts from a clean, correct branch and
-        # the caller never force-pushes a partial rewrite over the good remote.
-        print(f"trim_monitoring_history failed ({err}); aborting rewrite and restoring {branch}")
-        if "rebas" in repo.git.status():
-            repo.git.rebase("--abort")
-        repo.git.checkout(branch)
-        repo.git.reset("--hard", head_sha_before)
-        raise
-
-    # Hard safety guards (a raise, not an assert -- must survive python -O). The rewrite must NEVER
-    # alter the current status content, and must NEVER silently drop a kept-window commit. If either
-    # check fails, restore the branch and fail loud so the caller does not force-push corrupted state.
-    head_tree_after = repo.git.rev_parse(f"{branch}^{{tree}}")
-    commits_after = len(list(repo.iter_commits(branch)))
-    expected_after = kept_count + 1  # kept window + the single synthetic base
-    if head_tree_after != head_tree_before or commits_after != expected_after:
-        repo.git.checkout(branch)
-        repo.git.reset("--hard", head_sha_before)
+        for sha, timestamp, size in walk:
+            entries.append((sha, timestamp, size))
+            total_bytes += size
+            if (
+                timestamp < trigger
+                or (max_commits and len(entries) > max_commits * (1 + slack))
+                or (max_bytes and total_bytes > max_bytes * (1 + slack))
+            ):
+                break
+    finally:
+        walk.close()
+    entries.reverse()  # oldest first, as _commits_to_trim expects
+    dates = [timestamp for _sha, timestamp, _size in entries]
+
+    needs_trim, boundary_index = _commits_to_trim(
+        dates,
+        cutoff,
+        trigger,
+        max_commits=max_commits,
+        commit_sizes=[size for _sha, _timestamp, size in entries],
+        max_bytes=max_bytes,
+        slack=slack,
+    )
+    first_kept = boundary_index + 1 if needs_trim else 0
+    kept = [first_kept + i for i in _downsample(dates[first_kept:], now, rules)]
+    if not needs_trim:
+        # Only downsampling can still apply (the walk above read the whole branch); rewrite for it
+        # alone once it would thin the branch by more than the slack.
+        dropped = len(entries) - len(kept)
+        if not dropped or dropped < len(entries) * slack:
+            return False
+
+    head_tree_before = head_before.tree.hexsha
+
+    if needs_trim:
+        # Synthetic base: an orphan commit (no -p) whose tree == the boundary commit's tree.
+        squashed_before = time.strftime("%Y-%m-%d", time.localtime(dates[kept[0]] if kept else now))
+        base_message = f"📉 History trimmed: commits before {squashed_before} squashed"
+        # commit-tree needs a committer identity; the monitoring repo already has user.name/email
+        # configured (set whenever a status commit is made / the orphan branch is created), but be
+        # defensive in case the helper is called on a freshly-created repo: ensure an identity exists.
+        if not _has_git_identity(repo):
+            repo.git.config("user.name", "gitops-agent")
+            repo.git.config("user.email", "<>")
+        boundary_sha = entries[boundary_index][0]
+        new_tip = chain_root = repo.git.commit_tree(f"{boundary_sha}^{{tree}}", "-m", base_message).strip()
+        replay = kept
+    else:
+        new_tip = chain_root = _reparent_commit(repo, entries[kept[0]][0], None)
+        replay = kept[1:]
+    for index in replay:
+        new_tip = _reparent_commit(repo, entries[index][0], new_tip)
+
+    # Hard safety guards (a raise, not an assert -- must survive python -O), checked BEFORE the branch
+    # moves, so a bad rewrite is simply never published. The rewrite must NEVER alter the current
+    # status content, and must NEVER drop a commit it meant to keep: exactly len(replay) first-parent
+    # steps back from the new tip must land on the new chain's root (an orphan, so the new chain is
+    # then exactly the root + the replayed commits).
+    new_tree = repo.commit(new_tip).tree.hexsha
+    try:
+        root_after = repo.git.rev_parse("--verify", f"{new_tip}~{len(replay)}")
+    except GitCommandError:
+        root_after = None  # fewer than len(replay) commits in the new chain
+    if new_tree != head_tree_before or root_after != chain_root:
         raise RuntimeError(
-            "trim_monitoring_history produced an unexpected result and was rolled back: "
-            f"HEAD tree {head_tree_before} -> {head_tree_after}, "
-            f"commit count {commits_after} (expected {expected_after}); refusing to force-push"
+            "trim_monitoring_history produced an unexpected result and was discarded: "
+            f"HEAD tree {head_tree_before} -> {new_tree}, "
+            f"{new_tip}~{len(replay)} is {root_after} (expected the new root {chain_root}); "
+            f"{branch} was left untouched"
         )
+
+    repo.git.update_ref(
+        "-m", "gitops-agent: trim monitoring history", f"refs/heads/{branch}", new_tip, head_before.hexsha
+    )
     return True
 
 
 def compare_git_hashes(repo_path, git_hash):
     if Path(repo_path).exists():
-        repo = Repo(repo_path)
+        repo = gops.repo_session(repo_path)
         return str(repo.head.commit) == git_hash
     return False
 
 
-def compare_file_contents(f1, f2):
+def compare_file_contents(f1, f2, manifest=None, ignore_whitespace=False):
+    """Return True if f1 and f2 have the same content (or neither is defined).
+
+    Compares SHA-256 digests of the raw bytes, streamed in chunks, so binary and very large files are
+    handled without reading them into memory. With ignore_whitespace, spaces and newlines are dropped
+    before hashing (the agent's historical comparison). Given a drift.FileDigestManifest, a file's
+    digest is only recomputed when its size/mtime/inode changed since it was last hashed.
+    """
     if f1 is None or f2 is None:
         # If they aren't supposed to exist (Ex because user hasn't defined them)
         return True
@@ -573,11 +1496,12 @@ def compare_file_contents(f1, f2):
         # If they are supposed to exist, but either of them doesn't
         return False
 
-    def strip_and_compare(file1, file2):
-        with open(file1, "r") as f1, open(file2, "r") as f2:
-            return f1.read().replace(" ", "").replace("\n", "") == f2.read().replace(" ", "").replace("\n", "")
-
-    return strip_and_compare(f1, f2)
+    mode = drift.IGNORE_WHITESPACE if ignore_whitespace else drift.EXACT
+    if manifest is None:
+        if not ignore_whitespace and f1.stat().st_size != f2.stat().st_size:
+            return False
+        return drift.file_digest(f1, mode) == drift.file_digest(f2, mode)
+    return manifest.digest(f1, mode) == manifest.digest(f2, mode)
 
 
 def shared_clone_path(url, branch):
@@ -609,6 +1533,179 @@ def group_apps_by_repo(apps):
     return grouped
 
 
+def order_apps_by_dependencies(app_configs):
+    """Return the group's app names ordered so every app comes after the apps it ``depends_on``.
+
+    Pure, no I/O. Apps keep their config order wherever no dependency says otherwise (a stable
+    topological sort), so a group without any ``depends_on`` key is processed exactly as listed.
+    A dependency on an app outside this group cannot be ordered against (groups reconcile
+    independently) and is ignored with a warning.
+
+    Args:
+        app_configs (dict): app_name -> parsed app config (see check_deployment_config), in config order.
+
+    Returns:
+        list[str]: the app names in processing order.
+
+    Raises:
+        ValueError: If the ``depends_on`` keys form a cycle.
+    """
+    remaining = {}
+    for app_name, cfg in app_configs.items():
+        deps = []
+        for dep in cfg.get("depends_on", []):
+            if dep in app_configs:
+                deps.append(dep)
+            else:
+                print(f"WARNING: {app_name} depends_on {dep!r}, which is not in the same deployment-config repo; ignoring")
+        remaining[app_name] = deps
+
+    ordered = []
+    while remaining:
+        ready = [name for name, deps in remaining.items() if all(dep in ordered for dep in deps)]
+        if not ready:
+            raise ValueError(
+                "The depends_on keys of " + ", ".join(sorted(remaining)) + " form a cycle; "
+                "remove one of the dependencies so the apps can be updated in some order"
+            )
+        ordered.append(ready[0])
+        del remaining[ready[0]]
+    return ordered
+
+
+def _call_captured(router, fn, *args, **kwargs):
+    """Run fn with this thread's prints captured by router. Returns (log, result, error).
+
+    Used for helper threads spawned inside a group worker, so their output is collected and printed
+    by the worker in a deterministic order instead of racing straight to the journal. With no router
+    (e.g. reconcile_group called outside run_once) output is not captured and log is "".
+    """
+    buffer = router.capture() if router is not None else None
+    result, err = None, None
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as exc:
+        err = exc
+    finally:
+        if router is not None:
+            router.release()
+    return (buffer.getvalue() if buffer is not None else ""), result, err
+
+
+def _offload(fn, *args, **kwargs):
+    """Run a blocking git_operations call on the execution engine and return its result.
+
+    The call holds one of the engine's max_child_processes slots while it runs. Its prints are
+    captured on the engine's worker thread and replayed here, so they land in the calling group's log;
+    an exception it raised is re-raised here.
+    """
+    router = sys.stdout if isinstance(sys.stdout, _ThreadLocalStdout) else None
+    engine = execution.engine()
+    log, result, err = engine.run_sync(engine.call(_call_captured, router, fn, *args, **kwargs))
+    print(log, end="")
+    if err is not None:
+        raise err
+    return result
+
+
+def _wait_for_groups(futures, started, group_timeout, on_settled=None, poll_interval=0.5):
+    """Block until every group future is done or has overrun its per-group budget.
+
+    Args:
+        futures (dict): (url, branch) -> Future of a running/queued group reconcile.
+        started (dict): (url, branch) -> time.monotonic() at which a worker picked the group up.
+            Filled in by the workers themselves; a group still queued behind the pool limit has no
+            entry yet and so cannot time out.
+        group_timeout (float|None): per-group budget in seconds, or None for no limit.
+        on_settled (callable|None): called on this thread with the key of each group as soon as it has
+            finished or been abandoned.
+
+    Returns:
+        set: the (url, branch) keys that were abandoned because they exceeded group_timeout.
+    """
+    pending = set(futures.values())
+    key_of = {future: key for key, future in futures.items()}
+    abandoned = set()
+    while pending:
+        done, pending = wait(pending, timeout=poll_interval if group_timeout else None, return_when=FIRST_COMPLETED)
+        settled = [key_of[future] for future in done]
+        if group_timeout:
+            now = time.monotonic()
+            for future in list(pending):
+                key = key_of[future]
+                if key in started and now - started[key] > group_timeout:
+                    abandoned.add(key)
+                    pending.discard(future)
+                    settled.append(key)
+        if on_settled is not None:
+            for key in settled:
+                on_settled(key)
+    return abandoned
+
+
+class _ThreadLocalStdout:
+    """sys.stdout stand-in that diverts prints from capturing threads into per-thread buffers.
+
+    run_once installs one of these for the duration of a pass. Each group worker calls capture() so
+    everything it (and the git_operations helpers it calls) prints lands in its own StringIO, which
+    run_once then emits in group order -- keeping the log deterministic and never interleaving two
+    groups' lines. Threads that never called capture() (the main thread) write straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+        return self._local.buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def target(self):
+        """Return the stream this thread's prints currently go to (its buffer, or the real stream)."""
+        buffer = getattr(self._local, "buffer", None)
+        return buffer if buffer is not None else self.stream
+
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def group_label(key):
+    """Return the ``<repo-slug>@<branch>`` label of the (url, branch) group `key`, as used in logs. Pure."""
+    url, branch = key
+    return f"{gops.repo_slug(url)}@{branch}"
+
+
+def select_groups(grouped, names):
+    """Return the subset of group_apps_by_repo's mapping that a trigger for `names` refers to. Pure.
+
+    A name matches a group if it is one of the group's app names, or the group's label
+    ``<repo-slug>@<branch>`` (as printed in the logs). Names that match nothing are reported, not fatal:
+    a typo in a trigger must never stop the agent.
+    """
+    names = set(names)
+    selected, matched = {}, set()
+    for (url, branch), app_names in grouped.items():
+        hits = names.intersection(app_names) | names.intersection({f"{gops.repo_slug(url)}@{branch}"})
+        if hits:
+            selected[(url, branch)] = app_names
+            matched |= hits
+    for name in sorted(names - matched):
+        print(f"WARNING: reconcile trigger for {name!r} matches no configured app or group; ignoring")
+    return selected
+
+
 def parse_config(git_url):
     # The only "@" that is NOT a branch separator is the scp-style userinfo prefix, which appears
     # at the very start of the url (git@host:path). Strip just that leading prefix before scanning
@@ -626,37 +1723,83 @@ def parse_config(git_url):
     return git_url, git_branch
 
 
-def run_command_with_tee(command, target_path):
-    process = sp.Popen(command, stdout=sp.PIPE, stderr=sp.STDOUT, text=True, shell=True, cwd=target_path)
-    output = ""
+def run_command_with_tee(
+    command, target_path, log_name=None, max_chars=COMMAND_OUTPUT_MAX_CHARS, timeout=None, limits=None
+):
+    """Run a shell command, echoing its output live. Returns (returncode, captured_output).
 
-    while True:
-        line = process.stdout.readline()
-        if not line:
-            break
-        print("\t" + line, end="")
-        output += line
+    The command runs on the execution engine (see gitops_agent.execution): in its own process group,
+    with the nice/ionice/memory `limits` applied, counted against max_child_processes. If it is still
+    running after `timeout` seconds, the whole group is sent SIGTERM, then SIGKILL, and the returncode
+    is command_output.COMMAND_TIMED_OUT instead of an exit status.
 
-    process.wait()
-    output = remove_ansi_escape_sequences(output)
-    return process.returncode, output
+    The output is ANSI-stripped line by line as it arrives. captured_output (what ends up in the
+    feedback file) keeps only the first and last max_chars/2 characters; with a log_name, every line
+    is also spooled to {GITOPS_AGENT_HOME}/command-logs/<log_name>.log (rotated per run), whose path
+    is named in the truncation marker. See gitops_agent.command_output.
+    """
+    capture = cmdout.BoundedCapture(max_chars)
+    spool_path, spool = None, None
+    if log_name:
+        spool_path, spool = cmdout.open_spool(gops.APP_CONFIGS_DIR.parent / COMMAND_LOG_DIR, log_name)
+    # Lines arrive on the engine's loop thread, so echo to THIS thread's stream (its group buffer).
+    echo = sys.stdout.target() if isinstance(sys.stdout, _ThreadLocalStdout) else sys.stdout
+
+    def on_line(line):
+        echo.write("\t" + line)
+        line = cmdout.strip_ansi(line)
+        capture.append(line)
+        if spool is not None:
+            spool.write(line)
+
+    engine = execution.engine()
+    try:
+        returncode = engine.run_sync(engine.run_command(command, target_path, on_line, timeout, limits))
+    finally:
+        if spool is not None:
+            spool.close()
+    return returncode, capture.getvalue(spool_path)
 
 
 def remove_ansi_escape_sequences(text):
-    # Define the regular expression pattern for ANSI escape sequences
-    ansi_escape_pattern = re.compile(r"\x1b\[([0-9;]*[mGKF])")
-    # Use sub() method to replace all occurrences of the pattern with an empty string
-    cleaned_text = ansi_escape_pattern.sub("", text)
-    return cleaned_text
+    return cmdout.strip_ansi(text)
 
 
 def main():
     # Use argparse to check if the user wants to set configuration
     parser = argparse.ArgumentParser()
     parser.add_argument("--configure", action="store_true", help="Configure the gitops agent")
+    parser.add_argument(
+        "--trigger",
+        nargs="?",
+        const="",
+        metavar="APP_OR_GROUP",
+        help="Ask the running agent to reconcile now: everything, or one app / <repo-slug>@<branch> group",
+    )
+    parser.add_argument(
+        "--plan",
+        nargs="?",
+        const="",
+        metavar="APP_OR_GROUP",
+        help="Print what the next pass would update (everything, or one app / group) without changing anything",
+    )
+    parser.add_argument(
+        "--fetch", action="store_true", help="With --plan: fetch the deployment-config repos' origin/<branch> first"
+    )
+    parser.add_argument("--json", action="store_true", help="With --plan: print the plan as JSON")
     args = parser.parse_args()
 
     agent = GitOpsAgent(args.configure)
+    if args.trigger is not None:
+        port = agent.config.get("trigger_port")
+        if not port:
+            raise SystemExit("trigger_port is not set in the agent config, so the agent accepts no triggers")
+        print(triggers.send_trigger(int(port), args.trigger or None), end="")
+        return
+    if args.plan is not None:
+        groups = agent.plan([args.plan] if args.plan else None, fetch=args.fetch)
+        print(json.dumps(groups, indent=2) if args.json else planning.format_plan(groups))
+        return
     agent.run()
 
 
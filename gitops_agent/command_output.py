@@ -0,0 +1,158 @@
+"""Streaming, bounded-memory capture of pre/post-update command output.
+
+Post-update commands such as ``docker compose pull`` or ``npm ci`` can print megabytes. The agent
+used to accumulate all of it in one string (quadratic ``+=``), strip ANSI codes over the whole thing,
+and paste the lot into the feedback TOML. Instead, run_command_with_tee now feeds the output through:
+
+  * LineSplitter -- turns raw chunks read from the pipe into complete lines (an endless line with no
+    newline, e.g. a progress bar, is cut every MAX_LINE_BYTES so it cannot grow without bound),
+  * strip_ansi  -- a precompiled regex applied per line as it arrives,
+  * BoundedCapture -- keeps only the first and last ``max_bytes / 2`` of the output for the feedback
+    file, with a marker saying how much was omitted and where the full log is,
+  * a spool file under {GITOPS_AGENT_HOME}/command-logs/ that receives every line, rotated per run
+    (the previous COMMAND_LOG_BACKUPS runs are kept as ``.1``, ``.2``, ...).
+
+Memory stays flat however much the command prints.
+
+The same module holds the rest of the command sandboxing: wrap_with_limits applies an app's
+nice/ionice/memory limits inside the command's own shell, and KILL_GRACE_SECONDS / COMMAND_TIMED_OUT
+govern how a command that overran its timeout is stopped (see gitops_agent.execution.run_command).
+"""
+
+import codecs
+import os
+import re
+from collections import deque
+from pathlib import Path
+
+ANSI_ESCAPE_PATTERN = re.compile(r"\x1b\[([0-9;]*[mGKF])")
+
+READ_CHUNK_BYTES = 64 * 1024
+MAX_LINE_BYTES = 64 * 1024
+COMMAND_LOG_BACKUPS = 3
+
+# Seconds a timed-out command's process group gets between SIGTERM and SIGKILL.
+KILL_GRACE_SECONDS = 10
+
+# Stored instead of a return code (in the feedback's command-return-val) for a command that timed out.
+COMMAND_TIMED_OUT = "timeout"
+
+IONICE_CLASS_NUMBERS = {"best-effort": 2, "idle": 3}
+
+
+def strip_ansi(text):
+    return ANSI_ESCAPE_PATTERN.sub("", text)
+
+
+class LineSplitter:
+    """Incrementally split decoded chunks into lines ending in "\n" ("\r\n" and "\r" are normalised,
+    as with universal newlines)."""
+
+    def __init__(self, max_line=MAX_LINE_BYTES):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial = ""
+        self._max_line = max_line
+
+    def feed(self, chunk):
+        """Return the complete lines contained in `chunk` (plus any pending partial line)."""
+        text = self._partial + self._decoder.decode(chunk)
+        # A trailing "\r" may be the first half of a "\r\n" split across reads: hold it back until the
+        # next chunk shows whether a "\n" follows.
+        held_cr = text.endswith("\r")
+        if held_cr:
+            text = text[:-1]
+        lines = text.splitlines(keepends=True)
+        self._partial = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        while len(self._partial) > self._max_line:
+            lines.append(self._partial[: self._max_line])
+            self._partial = self._partial[self._max_line:]
+        if held_cr:
+            self._partial += "\r"
+        return [_normalise_newline(line) for line in lines]
+
+    def close(self):
+        """Return whatever is left once the stream ended (a last line without newline)."""
+        rest = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        return [_normalise_newline(line) for line in rest.splitlines(keepends=True)]
+
+
+def _normalise_newline(line):
+    if line.endswith("\r\n"):
+        return line[:-2] + "\n"
+    if line.endswith("\r"):
+        return line[:-1] + "\n"
+    return line
+
+
+class BoundedCapture:
+    """Keep the first and last max_bytes/2 characters of a stream of lines, and count the rest."""
+
+    def __init__(self, max_bytes):
+        self.head_limit = max(0, int(max_bytes)) // 2
+        self.tail_limit = max(0, int(max_bytes)) - self.head_limit
+        self._head = []
+        self._head_size = 0
+        self._tail = deque()
+        self._tail_size = 0
+        self.omitted = 0
+
+    def append(self, line):
+        if self._head_size < self.head_limit:
+            take = line[: self.head_limit - self._head_size]
+            self._head.append(take)
+            self._head_size += len(take)
+            line = line[len(take):]
+            if not line:
+                return
+        if len(line) > self.tail_limit:
+            self.omitted += len(line) - self.tail_limit
+            line = line[len(line) - self.tail_limit:] if self.tail_limit else ""
+        self._tail.append(line)
+        self._tail_size += len(line)
+        while self._tail_size > self.tail_limit:
+            dropped = self._tail.popleft()
+            self._tail_size -= len(dropped)
+            self.omitted += len(dropped)
+
+    def getvalue(self, spool_path=None):
+        head, tail = "".join(self._head), "".join(self._tail)
+        if not self.omitted:
+            return head + tail
+        where = f"; full log: {spool_path}" if spool_path else ""
+        if head and not head.endswith("\n"):
+            head += "\n"
+        return f"{head}... [{self.omitted} characters omitted{where}] ...\n{tail}"
+
+
+def open_spool(log_dir, name, backups=COMMAND_LOG_BACKUPS):
+    """Rotate <log_dir>/<name>.log (keeping `backups` older runs) and open a fresh one for writing."""
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    path = log_dir / f"{name}.log"
+    for index in range(backups, 0, -1):
+        older = path.with_name(f"{path.name}.{index - 1}") if index > 1 else path
+        if older.exists():
+            os.replace(older, path.with_name(f"{path.name}.{index}"))
+    return path, open(path, "w", encoding="utf-8")
+
+
+def wrap_with_limits(command, nice=None, ionice=None, memory_limit_mb=None, **_ignored):
+    """Return a shell script that applies the limits to itself, then runs `command`.
+
+    The limits are set on the command's own shell (``ulimit -d``, ``renice``/``ionice`` on ``$$``) so
+    every child inherits them, and a limit that cannot be applied fails the command (exit 126) rather
+    than silently running it unlimited. With no limits, `command` is returned unchanged.
+    """
+    setup = []
+    if memory_limit_mb:
+        # RLIMIT_DATA (heap and private mappings), not RLIMIT_AS: V8, the JVM and Go reserve far more
+        # address space than they ever use, so an address-space cap breaks them at startup.
+        setup.append(f"ulimit -d {int(memory_limit_mb) * 1024}")
+    if nice is not None:
+        setup.append(f"renice -n {int(nice)} -p $$ >/dev/null")
+    if ionice:
+        setup.append(f"ionice -c {IONICE_CLASS_NUMBERS[ionice]} -p $$")
+    if not setup:
+        return command
+    return "".join(f"{line} || exit 126\n" for line in setup) + command
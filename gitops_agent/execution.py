@@ -0,0 +1,211 @@
+"""Asyncio execution layer for the agent's child processes (git and pre/post-update commands).
+
+Every git call and shell command used to be a blocking subprocess on whichever thread happened to need
+it, so N groups x M parallel fetches x hooks could put an unbounded number of children on the box at
+once, and a hook tied up a thread for as long as it ran. The ExecutionEngine runs one asyncio event
+loop in a background thread and funnels child processes through it:
+
+  * run_command, git, check_git_status and push are native coroutines: the loop spawns and reads the
+    child itself (asyncio subprocesses), so a running hook or ``git status`` ties up no worker thread,
+  * call() runs the multi-step, GitPython-based operations (update_git_repo, fetch_git_repo) on a
+    bounded executor,
+  * ALL of them hold a slot of one shared semaphore (``max_child_processes`` in config.toml) while
+    they run, which caps the total number of concurrent children across every group and app.
+
+Coroutines can be awaited on the engine's loop, or driven from ordinary threads (the agent's group
+workers) with run_sync(). engine() returns the process-wide instance.
+"""
+
+import asyncio
+import functools
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from git import GitCommandError
+
+from gitops_agent import command_output as cmdout
+from gitops_agent import git_operations as gops
+from gitops_agent import tracing
+
+# Upper bound on child processes (git, hooks) running at once across the whole agent. Overridable via
+# config.toml ("max_child_processes").
+MAX_CHILD_PROCESSES = 8
+
+
+class ExecutionEngine:
+    def __init__(self, max_child_processes=MAX_CHILD_PROCESSES):
+        self.max_child_processes = max(1, int(max_child_processes))
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._executor_size = None
+        self._semaphore = None
+        self._semaphore_limit = None
+
+    # ------------------------------------------------------------------ loop management
+
+    def configure(self, max_child_processes):
+        """Change the child-process cap; operations started from now on use the new limit."""
+        self.max_child_processes = max(1, int(max_child_processes))
+
+    def run_sync(self, coro):
+        """Run `coro` on the engine's loop from a non-loop thread and return its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def close(self):
+        """Stop the loop thread and the executor (the engine restarts lazily if used again)."""
+        with self._lock:
+            loop, thread, executor = self._loop, self._thread, self._executor
+            self._loop = self._thread = self._executor = self._semaphore = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="gitops-agent-exec", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def _slot(self):
+        """The shared semaphore (created on the loop, and re-created when the limit changed)."""
+        if self._semaphore is None or self._semaphore_limit != self.max_child_processes:
+            self._semaphore = asyncio.Semaphore(self.max_child_processes)
+            self._semaphore_limit = self.max_child_processes
+        return self._semaphore
+
+    def _get_executor(self):
+        """The bounded executor, replaced (and the old one shut down) when the limit changed."""
+        with self._lock:
+            if self._executor is None or self._executor_size != self.max_child_processes:
+                if self._executor is not None:
+                    # Work already queued on the old pool still finishes; its threads then exit.
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_child_processes, thread_name_prefix="gitops-agent-blocking"
+                )
+                self._executor_size = self.max_child_processes
+            return self._executor
+
+    # ------------------------------------------------------------------ awaitables
+
+    async def call(self, fn, *args, **kwargs):
+        """Run a blocking (GitPython-based) fn on the bounded executor while holding a slot.
+
+        This is how the multi-step operations become awaitables, e.g.
+        ``await engine.call(git_operations.update_git_repo, app_name, url, branch, ...)``.
+        """
+        async with self._slot():
+            # The executor thread stays in the caller's trace span (see gitops_agent.tracing).
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), functools.partial(tracing.in_current_span(fn), *args, **kwargs)
+            )
+
+    async def git(self, cwd, *args, env=None):
+        """Run ``git <args>`` in cwd, with `env` added to the environment.
+
+        Returns stdout; raises GitCommandError on a non-zero exit.
+        """
+        async with self._slot():
+            tracing.count_subprocess()
+            process = await asyncio.create_subprocess_exec(
+                "git",
+                *args,
+                cwd=str(cwd),
+                env={**os.environ, **env} if env else None,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise GitCommandError(["git", *args], process.returncode, stderr.decode("utf-8", "replace"))
+        return stdout.decode("utf-8", "replace").rstrip("\n")
+
+    async def check_git_status(self, local_path):
+        """Awaitable git_operations.check_git_status: (porcelain status, latest-commit line)."""
+        status = await self.git(local_path, "status", "--porcelain", "--branch")
+        # Reading HEAD through GitPython blocks, so it runs on the executor, not on the loop thread.
+        return status, await self.call(lambda: gops.describe_commit(gops.repo_session(local_path).head.commit))
+
+    async def push(self, local_path, *args, env=None):
+        """``git push <args>`` for a monitoring clone. Raises GitCommandError if the push fails."""
+        return await self.git(local_path, "push", *args, env=env)
+
+    async def run_command(self, command, cwd, on_line, timeout=None, limits=None):
+        """Run a pre/post-update shell command, feeding every output line to on_line as it arrives.
+
+        The command runs in its own process group with `limits` applied (see
+        command_output.wrap_with_limits). If it is still running after `timeout` seconds, the group is
+        sent SIGTERM, then SIGKILL after command_output.KILL_GRACE_SECONDS. Returns the exit status,
+        or command_output.COMMAND_TIMED_OUT.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        splitter = cmdout.LineSplitter()
+        async with self._slot():
+            tracing.count_subprocess()
+            process = await asyncio.create_subprocess_shell(
+                cmdout.wrap_with_limits(command, **(limits or {})),
+                cwd=str(cwd),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True,  # own process group, so a timeout can stop everything it started
+            )
+            try:
+                while True:
+                    remaining = None if deadline is None else deadline - loop.time()
+                    chunk = await asyncio.wait_for(process.stdout.read(cmdout.READ_CHUNK_BYTES), remaining)
+                    if not chunk:
+                        break
+                    for line in splitter.feed(chunk):
+                        on_line(line)
+                for line in splitter.close():
+                    on_line(line)
+                remaining = None if deadline is None else deadline - loop.time()
+                await asyncio.wait_for(process.wait(), remaining)
+                return process.returncode
+            except asyncio.TimeoutError:
+                for line in splitter.close():
+                    on_line(line)
+                on_line(f"[gitops-agent] Command timed out after {timeout}s; terminating its process group\n")
+                await _terminate_process_group(process)
+                return cmdout.COMMAND_TIMED_OUT
+
+
+async def _terminate_process_group(process):
+    """SIGTERM the command's process group, SIGKILL it if anything survives the grace period."""
+    if _signal_group(process.pid, signal.SIGTERM):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + cmdout.KILL_GRACE_SECONDS
+        while _signal_group(process.pid, 0):
+            if loop.time() >= deadline:
+                _signal_group(process.pid, signal.SIGKILL)
+                break
+            await asyncio.sleep(0.1)
+    await process.wait()
+
+
+def _signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+_ENGINE = ExecutionEngine()
+
+
+def engine():
+    """Return the process-wide ExecutionEngine."""
+    return _ENGINE
@@ -1,9 +1,12 @@
 import hashlib
 import os
-import subprocess as sp
+import pwd
+import shutil
+import threading
 import toml
 from pathlib import Path
 from git import Repo, GitCommandError
+from gitdb.exc import BadName
 
 # Root under which all per-app config checkouts live. Resolved from the
 # GITOPS_AGENT_HOME env var so tests can point it at a tmp dir; defaults to the
@@ -15,6 +18,49 @@ APP_CONFIGS_DIR = Path(os.environ.get("GITOPS_AGENT_HOME", "/opt/gitops-agent"))
 # in an app's section, the agent refuses to run and asks the user to migrate to ``config_files``.
 LEGACY_CONFIG_KEYS = ("config_src_path_rel_in_this_repo", "config_dst_path_abs")
 
+# Parsed infra_meta.toml files, keyed by path and validated against the file's stat signature (see
+# load_infra_meta). Every app of a group reads the same file, before and after the config fetch, so
+# without this a 20-app group re-parses one file 40 times per pass.
+_INFRA_META_CACHE = {}
+_INFRA_META_LOCK = threading.Lock()
+
+# How an app's code repo may be cloned/fetched, picked per app via ``clone_strategy`` in
+# infra_meta.toml. The agent only ever checks out the pinned ``code_commit_hash``, so everything but
+# "full" trades history/branches/blobs it never reads for a faster first deploy and a smaller clone:
+#   full          -- every branch and tag, full history (the default, and the fallback for all others)
+#   single-branch -- only the remote's default branch, full history
+#   shallow       -- only the default branch, truncated to ``clone_depth`` commits
+#   blobless      -- full history, file contents fetched lazily on checkout (``--filter=blob:none``)
+#   exact-hash    -- nothing but the pinned commit itself (``fetch --depth 1 origin <hash>``)
+# When the server refuses a mode (or the pinned commit is outside what the mode fetched and cannot be
+# fetched directly), the agent falls back to a full clone/fetch rather than failing the update.
+CLONE_STRATEGIES = ("full", "single-branch", "shallow", "blobless", "exact-hash")
+
+# Limits applied to an app's pre/post-update commands, set per app in infra_meta.toml:
+#   command_timeout         -- seconds before the command's whole process group gets SIGTERM, then
+#                              SIGKILL if it is still alive after a grace period (0 = no timeout)
+#   command_nice            -- CPU niceness for the command (-20..19)
+#   command_ionice          -- I/O scheduling class: "best-effort" or "idle"
+#   command_memory_limit_mb -- data-segment cap (ulimit -d, RLIMIT_DATA) for the command and its children
+# No limit applies unless the app sets it: existing commands (a long migration, a build) keep running
+# as they always have. A hung command without a timeout blocks its group until group_timeout_seconds.
+COMMAND_TIMEOUT_SECONDS = 0
+IONICE_CLASSES = ("best-effort", "idle")
+
+# claim_ownership runs for every app on every pass, so it must not fork. The effective user is
+# resolved once (_CURRENT_USER), so checking an already-owned path costs one lstat. There is no
+# per-path cache of verified paths: it could not save more than that lstat, and would miss a directory
+# re-created by another user. A tree whose owner is wrong is repaired in-process; the walk does not
+# descend below OWNERSHIP_REPAIR_MAX_DEPTH directory levels, and logs the subtrees it left alone.
+OWNERSHIP_REPAIR_MAX_DEPTH = 64
+_CURRENT_USER = None
+
+# One long-lived Repo object per clone path (see repo_session). GitPython keeps a persistent
+# ``git cat-file --batch`` process per Repo, so reading HEAD, commits and refs through a reused Repo
+# costs no new process -- a fresh Repo(path) every call threw that away and re-spawned it each time.
+_REPO_SESSIONS = {}
+_REPO_SESSIONS_LOCK = threading.Lock()
+
 
 def resolve_config_file_pairs(app_meta, repo_root):
     """Normalize an app's config-file definitions into a list of resolved src/dst path pairs.
@@ -37,10 +83,12 @@ def resolve_config_file_pairs(app_meta, repo_root):
             (hence the leading infra-name segment in ``src`` examples).
 
     Returns:
-        list[dict]: Each dict has ``src_abs`` (Path) and ``dst_abs`` (Path).
+        list[dict]: Each dict has ``src_abs`` (Path) and ``dst_abs`` (Path), plus
+            ``ignore_whitespace: True`` when the entry opts into whitespace-insensitive drift checks.
 
     Raises:
-        ValueError: If any of the removed legacy single-file keys are present.
+        ValueError: If any of the removed legacy single-file keys are present, or an entry's
+            ``ignore_whitespace`` is not a boolean.
     """
     offending = [key for key in LEGACY_CONFIG_KEYS if key in app_meta]
     if offending:
@@ -54,16 +102,43 @@ def resolve_config_file_pairs(app_meta, repo_root):
     repo_root = Path(repo_root)
     pairs = []
     for entry in app_meta.get("config_files", []):
-        pairs.append(
-            {
-                "src_abs": Path(repo_root, entry["src"]),
-                "dst_abs": Path(entry["dst"]),
-            }
-        )
+        pair = {
+            "src_abs": Path(repo_root, entry["src"]),
+            "dst_abs": Path(entry["dst"]),
+        }
+        ignore_whitespace = entry.get("ignore_whitespace", False)
+        if not isinstance(ignore_whitespace, bool):
+            raise ValueError(f"config_files entry for {entry['src']}: ignore_whitespace must be true or false")
+        if ignore_whitespace:
+            pair["ignore_whitespace"] = True
+        pairs.append(pair)
 
     return pairs
 
 
+def parse_command_limits(app_meta, app_name):
+    """Read and validate an app's pre/post-command limits from its infra_meta.toml section.
+
+    Returns a dict with ``timeout`` (seconds, None = unlimited), ``nice`` (int or None), ``ionice``
+    (one of IONICE_CLASSES or None) and ``memory_limit_mb`` (int or None). See COMMAND_TIMEOUT_SECONDS.
+    """
+    timeout = app_meta.get("command_timeout", COMMAND_TIMEOUT_SECONDS)
+    nice = app_meta.get("command_nice")
+    ionice = app_meta.get("command_ionice")
+    memory_limit_mb = app_meta.get("command_memory_limit_mb")
+    if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout < 0:
+        raise ValueError(f"command_timeout for {app_name} must be a number of seconds (0 = no timeout)")
+    if nice is not None and (not isinstance(nice, int) or isinstance(nice, bool) or not -20 <= nice <= 19):
+        raise ValueError(f"command_nice for {app_name} must be an integer from -20 to 19")
+    if ionice is not None and ionice not in IONICE_CLASSES:
+        raise ValueError(f"command_ionice for {app_name} must be one of {', '.join(IONICE_CLASSES)}")
+    if memory_limit_mb is not None and (
+        not isinstance(memory_limit_mb, int) or isinstance(memory_limit_mb, bool) or memory_limit_mb <= 0
+    ):
+        raise ValueError(f"command_memory_limit_mb for {app_name} must be a positive integer")
+    return {"timeout": timeout or None, "nice": nice, "ionice": ionice, "memory_limit_mb": memory_limit_mb}
+
+
 def normalize_url(git_url):
     """Return a canonical form of a git url for equality/identity comparisons.
 
@@ -133,9 +208,7 @@ def check_deployment_config(dep_cfg_local_path, app_name, infra_name):
     elif not infra_meta_file.exists():
         raise FileNotFoundError(f"Infra meta file not found: {infra_meta_file}")
 
-    with open(infra_meta_file) as f:
-        infra_meta = toml.load(f)
-        app_meta = infra_meta[app_name]
+    app_meta = load_infra_meta(infra_meta_file)[app_name]
 
     curr_app_config = {}
     curr_app_config["code_url"] = app_meta["code_url"]
@@ -143,6 +216,26 @@ def check_deployment_config(dep_cfg_local_path, app_name, infra_name):
     curr_app_config["code_local_path"] = Path(app_meta["code_local_path"])
     curr_app_config["pre_updation_command"] = app_meta.get("pre_updation_command", None)
     curr_app_config["post_updation_command"] = app_meta.get("post_updation_command", None)
+    # Other apps (of the same deployment-config repo) that must finish updating before this one's
+    # pre/post commands run, e.g. a database app before the service that migrates it.
+    depends_on = app_meta.get("depends_on", [])
+    if not isinstance(depends_on, list) or not all(isinstance(name, str) for name in depends_on):
+        raise ValueError(
+            f"depends_on for {app_name} must be a list of app names, e.g. [\"db\"]; got {depends_on!r}"
+        )
+    curr_app_config["depends_on"] = list(depends_on)
+    curr_app_config["clone_strategy"] = app_meta.get("clone_strategy", "full")
+    if curr_app_config["clone_strategy"] not in CLONE_STRATEGIES:
+        raise ValueError(
+            f"Unknown clone_strategy {curr_app_config['clone_strategy']!r} for {app_name}; "
+            f"expected one of {', '.join(CLONE_STRATEGIES)}"
+        )
+    clone_depth = app_meta.get("clone_depth", 1)
+    if isinstance(clone_depth, bool) or not isinstance(clone_depth, int) or clone_depth < 1:
+        raise ValueError(f"clone_depth for {app_name} must be a positive integer; got {clone_depth!r}")
+    curr_app_config["clone_depth"] = clone_depth
+
+    curr_app_config["command_limits"] = parse_command_limits(app_meta, app_name)
 
     # Relative ``src`` paths are resolved against the shared deployment-config clone for this
     # (url, branch), i.e. dep_cfg_local_path -- not a per-app dir, since the dedup change clones
@@ -152,8 +245,39 @@ def check_deployment_config(dep_cfg_local_path, app_name, infra_name):
     return curr_app_config
 
 
+def load_infra_meta(infra_meta_file):
+    """Return the parsed infra_meta.toml, re-parsing only when the file on disk has changed.
+
+    The cache is keyed on the path and validated against (mtime_ns, size, inode): a fetch that moves
+    the deployment-config clone rewrites the file through git (new inode, new mtime), so the next call
+    re-parses; every other call in the pass gets the already-parsed dict. Callers must treat the
+    returned dict as read-only -- it is shared by every app (and thread) of the group.
+    """
+    path = str(infra_meta_file)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _INFRA_META_LOCK:
+        cached = _INFRA_META_CACHE.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    with open(path) as f:
+        infra_meta = toml.load(f)
+    with _INFRA_META_LOCK:
+        _INFRA_META_CACHE[path] = (signature, infra_meta)
+    return infra_meta
+
+
 def update_git_repo(
-    app_name, git_url, git_branch, committer_name, local_path, checkout_hash=None, create_branch=False
+    app_name,
+    git_url,
+    git_branch,
+    committer_name,
+    local_path,
+    checkout_hash=None,
+    create_branch=False,
+    fetch=True,
+    clone_strategy="full",
+    clone_depth=1,
 ):
     if git_url.endswith(f"@{git_branch}"):
         git_url = git_url[: -len(f"@{git_branch}")]
@@ -169,26 +293,38 @@ def update_git_repo(
                 f"not match the expected url {git_url!r}. This indicates a path collision between two "
                 f"distinct repos. Remove or relocate the stale clone and retry."
             )
-        repo = Repo(local_path)
+        repo = repo_session(local_path)
         claim_ownership(local_path)
         # Find if any partial rebase is in progress in dep_feedback repo, and abort it if so
         # Partial rebases can occur in case of force-quitting the process mid-execution in a previous run, or
         # e.g. there being a merge conflict when updating in a previous run
-        if "rebas" in repo.git.status():  # Pick up both "rebase" and  "rebasing" in git status
+        if rebase_in_progress(repo):
             repo.git.rebase("--abort")
+        elif git_branch and fetch and remote_unchanged(repo, git_branch):
+            # Cheap pre-check: the remote tip of the tracked branch is what we already have checked out,
+            # so the fetch/reset/checkout below would be a no-op costing a full fetch plus disk work.
+            print(f"Remote branch {git_branch} of {app_name} is unchanged; skipping fetch")
+            git_status, latest_commit = check_git_status(local_path)
+            return True, git_status, latest_commit
     else:
-        repo = Repo.clone_from(git_url, local_path)
+        repo = clone_repo(git_url, local_path, clone_strategy, clone_depth, checkout_hash)
+        fetch = False  # a fresh clone is already as current as the fetch below would make it
 
-    # Update the local with changes from remote
-    repo.git.fetch("--all", "--prune")
-    repo.git.reset("--hard", "HEAD")
+    # Update the local with changes from remote. fetch=False is for callers that already brought the
+    # object store up to date via fetch_git_repo (e.g. the parallel per-app prefetch in run_once).
+    if fetch:
+        fetch_repo(repo, clone_strategy, clone_depth, checkout_hash)
+    ensure_commit_present(repo, checkout_hash, clone_strategy, clone_depth)
+    if repo.head.is_valid():  # an exact-hash clone has no HEAD until the checkout below
+        repo.git.reset("--hard", "HEAD")
 
     try:
-        # Check if the branch exists, create an empty branch if not
-        all_branches = repo.refs
-        branch_present = [e for e in all_branches if git_branch in str(e)]
-
-        if git_branch and create_branch and not branch_present:
+        if git_branch and create_branch and not _on_origin(repo, git_branch):
+            # Not on origin yet -- new, or its first push failed. (Re)start it empty, so a commit that
+            # never reached origin is rebuilt and pushed again rather than taken as published.
+            if git_branch in repo.heads:
+                repo.git.checkout("--detach")
+                repo.git.branch("-D", git_branch)
             repo.git.checkout("--orphan", git_branch)
             files = repo.git.ls_files()
             if files:
@@ -211,6 +347,123 @@ def update_git_repo(
     return update_status, git_status, latest_commit
 
 
+def _on_origin(repo, branch):
+    return any(ref.path == f"refs/remotes/origin/{branch}" for ref in repo.refs)
+
+
+def fetch_git_repo(app_name, git_url, local_path, clone_strategy="full", clone_depth=1, checkout_hash=None):
+    """Bring a clone's object store up to date WITHOUT touching its working tree.
+
+    This is the network-bound half of update_git_repo, split out so several apps' code repos can be
+    fetched concurrently while the order-sensitive half (pre-command, reset/checkout, config copy,
+    post-command) stays serialized per app. A missing clone is cloned outright; an existing one gets
+    the same origin guard as update_git_repo before ``fetch --all --prune``.
+
+    Returns:
+        str: "cloned" if local_path did not exist and was freshly cloned, else "fetched".
+    """
+    print(f"Fetching repository {app_name}...")
+    if not Path(local_path).exists():
+        repo = clone_repo(git_url, local_path, clone_strategy, clone_depth, checkout_hash)
+        ensure_commit_present(repo, checkout_hash, clone_strategy, clone_depth)
+        return "cloned"
+    if not is_repo_with_origin(local_path, git_url):
+        raise RuntimeError(
+            f"Refusing to fetch {app_name}: existing clone at {local_path} has an origin that does "
+            f"not match the expected url {git_url!r}. This indicates a path collision between two "
+            f"distinct repos. Remove or relocate the stale clone and retry."
+        )
+    repo = repo_session(local_path)
+    fetch_repo(repo, clone_strategy, clone_depth, checkout_hash)
+    ensure_commit_present(repo, checkout_hash, clone_strategy, clone_depth)
+    return "fetched"
+
+
+def clone_repo(git_url, local_path, strategy="full", depth=1, checkout_hash=None):
+    """Clone git_url into local_path with the given CLONE_STRATEGIES mode; fall back to a full clone.
+
+    "exact-hash" needs the pinned hash (there is no branch to clone), so without one it is treated as
+    "full". A mode the server refuses (e.g. no ``uploadpack.allowReachableSHA1InWant`` for
+    exact-hash) leaves a half-made directory behind, which is removed before the full clone.
+    """
+    if strategy != "full" and not (strategy == "exact-hash" and not checkout_hash):
+        try:
+            if strategy == "exact-hash":
+                repo = Repo.init(local_path)
+                repo.create_remote("origin", git_url)
+                repo.git.fetch("--depth", "1", "origin", checkout_hash)
+                return repo
+            options = {
+                "single-branch": {"single_branch": True},
+                "shallow": {"depth": depth},  # --depth implies --single-branch
+                "blobless": {"filter": "blob:none"},
+            }[strategy]
+            return Repo.clone_from(git_url, local_path, **options)
+        except GitCommandError as err:
+            print(f"Clone strategy {strategy!r} failed for {git_url} ({err}); falling back to a full clone")
+            close_repo_session(local_path)
+            shutil.rmtree(local_path, ignore_errors=True)
+    return Repo.clone_from(git_url, local_path)
+
+
+def fetch_repo(repo, strategy="full", depth=1, checkout_hash=None):
+    """Fetch updates into an existing clone, fetching no more than its CLONE_STRATEGIES mode needs."""
+    if strategy == "exact-hash" and checkout_hash:
+        if has_commit(repo, checkout_hash):
+            return
+        args = ("--depth", "1", "origin", checkout_hash)
+    elif strategy == "shallow":
+        args = ("--prune", "--depth", str(depth), "origin")
+    elif strategy == "single-branch":
+        args = ("--prune", "origin")  # the clone's refspec already limits this to one branch
+    else:
+        args = ("--all", "--prune")
+    try:
+        repo.git.fetch(*args)
+    except GitCommandError as err:
+        if strategy == "full":
+            raise
+        print(f"Fetch strategy {strategy!r} failed in {repo.working_tree_dir} ({err}); falling back to a full fetch")
+        _fetch_everything(repo)
+
+
+def ensure_commit_present(repo, checkout_hash, strategy="full", depth=1):
+    """Make sure the pinned commit exists locally after a reduced clone/fetch.
+
+    A single-branch or shallow clone may not contain a pinned hash that lives on another branch or
+    deeper in history. Try fetching exactly that commit first; if the server refuses, widen the clone
+    to everything (unshallowing it) so the checkout can still succeed. "full" clones are left alone:
+    a hash missing there is a genuine error that the checkout reports as before.
+    """
+    if not checkout_hash or strategy == "full" or has_commit(repo, checkout_hash):
+        return
+    try:
+        if strategy in ("shallow", "exact-hash"):
+            repo.git.fetch("--depth", str(depth), "origin", checkout_hash)
+        else:
+            repo.git.fetch("origin", checkout_hash)
+    except GitCommandError as err:
+        print(f"Could not fetch {checkout_hash} directly ({err}); falling back to a full fetch")
+        _fetch_everything(repo)
+
+
+def has_commit(repo, sha):
+    """Return True if the commit `sha` is present in repo's object store."""
+    try:
+        repo.git.cat_file("-e", f"{sha}^{{commit}}")
+        return True
+    except GitCommandError:
+        return False
+
+
+def _fetch_everything(repo):
+    """Widen a reduced clone back to a full one: every branch and tag, and no shallow boundary."""
+    args = ["--prune", "origin", "+refs/heads/*:refs/remotes/origin/*", "+refs/tags/*:refs/tags/*"]
+    if Path(repo.git_dir, "shallow").exists():
+        args.insert(0, "--unshallow")
+    repo.git.fetch(*args)
+
+
 def is_repo_with_origin(local_path, expected_url):
     """Return True only if local_path is a git repo whose origin remote matches expected_url.
 
@@ -221,7 +474,7 @@ def is_repo_with_origin(local_path, expected_url):
     """
 
     try:
-        repo = Repo(local_path)
+        repo = repo_session(local_path)
         origins = [r for r in repo.remotes if r.name == "origin"]
         if not origins:
             return False
@@ -232,18 +485,161 @@ def is_repo_with_origin(local_path, expected_url):
     return any(normalize_url(u) == normalize_url(expected_url) for u in actual_urls)
 
 
+def remote_unchanged(repo, git_branch):
+    """Return True if origin's ``git_branch`` tip is exactly what this clone already has checked out.
+
+    Asks the remote for just that one ref (``git ls-remote``, no object transfer) and compares it to
+    the locally cached ``refs/remotes/origin/<branch>`` AND to HEAD, and finally checks the tracked
+    files are unmodified -- only then is the full fetch + reset --hard + checkout in update_git_repo
+    a guaranteed no-op. Any doubt (remote branch missing, probe failing, local ref absent, HEAD
+    elsewhere, dirty tree) returns False so the caller falls back to the full update.
+    """
+    try:
+        out = repo.git.ls_remote("origin", f"refs/heads/{git_branch}")
+        remote_sha = out.split()[0] if out.strip() else None
+        if remote_sha is None:
+            return False
+    except GitCommandError:
+        return False
+    # Resolved in-process (loose ref / packed-refs), no rev-parse subprocess.
+    try:
+        local_sha = repo.commit(f"refs/remotes/origin/{git_branch}").hexsha
+        head_sha = repo.head.commit.hexsha
+    except (BadName, ValueError):
+        return False
+    return remote_sha == local_sha == head_sha and not repo.is_dirty()
+
+
 def check_git_status(local_path):
-    repo = Repo(local_path)
-    git_status = repo.git.status()
-    latest_commit = repo.git.log("-1", "--pretty=format:'%h - %s (%an, %ad)'")
-    return git_status, latest_commit
+    """Return (status, latest_commit) for the clone at local_path, as reported in the feedback file.
+
+    status is ``git status --porcelain --branch`` (stable, machine-readable, and the only subprocess
+    here); latest_commit is rendered in-process from the HEAD commit object, read through the repo
+    session's persistent cat-file process, in the shape ``'<short> - <subject> (<author>, <date>)'``.
+    """
+    repo = repo_session(local_path)
+    git_status = repo.git.status("--porcelain", "--branch")
+    return git_status, describe_commit(repo.head.commit)
+
+
+def describe_commit(commit):
+    """Render commit like ``git log -1 --pretty=format:"'%h - %s (%an, %ad)'"``, without running git."""
+    when = commit.authored_datetime
+    date = f"{when:%a %b} {when.day} {when:%H:%M:%S %Y %z}"
+    subject = commit.message.split("\n", 1)[0].strip()
+    return f"'{commit.hexsha[:7]} - {subject} ({commit.author.name}, {date})'"
+
+
+def repo_session(local_path):
+    """Return the shared Repo object for the clone at local_path, creating it on first use.
+
+    The session is keyed on the resolved path and checked against the identity of the clone (inode of
+    its git dir, inode + mtime of its config file -- inodes alone get reused), so a clone that was
+    deleted and re-created is picked up as a new session rather than served from a stale one.
+    """
+    key = str(Path(local_path).resolve())
+    with _REPO_SESSIONS_LOCK:
+        session = _REPO_SESSIONS.get(key)
+        if session is not None:
+            repo, identity = session
+            try:
+                if _clone_identity(repo.git_dir) == identity:
+                    return repo
+            except OSError:
+                pass
+            repo.close()
+        repo = Repo(key)
+        _REPO_SESSIONS[key] = (repo, _clone_identity(repo.git_dir))
+        return repo
+
+
+def _clone_identity(git_dir):
+    git_dir_stat, config_stat = os.stat(git_dir), os.stat(os.path.join(git_dir, "config"))
+    return git_dir_stat.st_dev, git_dir_stat.st_ino, config_stat.st_ino, config_stat.st_mtime_ns
+
+
+def close_repo_session(local_path):
+    """Drop the session for local_path, if any, stopping its persistent git processes."""
+    with _REPO_SESSIONS_LOCK:
+        session = _REPO_SESSIONS.pop(str(Path(local_path).resolve()), None)
+    if session is not None:
+        session[0].close()
+
+
+def close_all_repo_sessions():
+    """Drop every repo session (e.g. on shutdown), stopping their persistent git processes."""
+    with _REPO_SESSIONS_LOCK:
+        sessions = list(_REPO_SESSIONS.values())
+        _REPO_SESSIONS.clear()
+    for repo, _identity in sessions:
+        repo.close()
+
+
+def rebase_in_progress(repo):
+    """Return True if a rebase was left half-done in repo (checked on disk, no ``git status``)."""
+    return any(Path(repo.git_dir, name).exists() for name in ("rebase-merge", "rebase-apply"))
+
+
+def current_user():
+    """Return (uid, name) of the effective user, resolved once per process."""
+    global _CURRENT_USER
+    if _CURRENT_USER is None:
+        uid = os.geteuid()
+        try:
+            name = pwd.getpwuid(uid).pw_name
+        except KeyError:  # uid with no passwd entry (e.g. some containers)
+            name = str(uid)
+        _CURRENT_USER = (uid, name)
+    return _CURRENT_USER
 
 
 def claim_ownership(dir_path):
-    if Path(dir_path).exists():
-        curr_user = sp.run(["whoami"], capture_output=True, text=True).stdout.strip()
-        curr_owner = Path(dir_path).owner()
-        if curr_owner != curr_user:
-            print(f"Directory {dir_path} exists under {curr_owner}, claiming ownership of it to be under {curr_user}")
-            # Get the current user's username, and then claim ownership recursively of the repo to avoid dubious ownership
-            sp.run(["chown", "-R", curr_user, dir_path], check=True)
+    """Make sure dir_path (recursively) belongs to the agent's user, so git never sees dubious ownership.
+
+    Cheap on the hot path: the current user is resolved once per process, so a path we already own
+    costs a single lstat (no whoami fork, no passwd lookup). Only when the top-level owner differs is
+    the tree walked, in-process, and only the entries with the wrong owner are chowned (symlinks
+    themselves, never their targets). Subtrees deeper than OWNERSHIP_REPAIR_MAX_DEPTH are not walked
+    (and are logged).
+    """
+    dir_path = str(dir_path)
+    try:
+        st = os.lstat(dir_path)
+    except FileNotFoundError:
+        return
+    uid, user = current_user()
+    if st.st_uid == uid:
+        return
+
+    try:
+        curr_owner = pwd.getpwuid(st.st_uid).pw_name
+    except KeyError:
+        curr_owner = str(st.st_uid)
+    print(f"Directory {dir_path} exists under {curr_owner}, claiming ownership of it to be under {user}")
+    repaired = _repair_ownership(dir_path, uid)
+    print(f"Claimed ownership of {repaired} entries under {dir_path}")
+
+
+def _repair_ownership(root, uid):
+    """lchown every entry under root (root included) not owned by uid. Returns how many were changed."""
+    repaired = 0
+    if os.lstat(root).st_uid != uid:
+        os.lchown(root, uid, -1)
+        repaired += 1
+    stack = [(root, 0)]
+    while stack:
+        path, depth = stack.pop()
+        if depth >= OWNERSHIP_REPAIR_MAX_DEPTH:
+            print(
+                f"WARNING: not repairing ownership below {path}: it is nested deeper than "
+                f"{OWNERSHIP_REPAIR_MAX_DEPTH} levels"
+            )
+            continue
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.stat(follow_symlinks=False).st_uid != uid:
+                    os.lchown(entry.path, uid, -1)
+                    repaired += 1
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, depth + 1))
+    return repaired
@@ -0,0 +1,123 @@
+"""Idle-time git maintenance for the clones the agent manages.
+
+Nothing used to maintain the deployment-config clones, the ``-monitoring`` clones or the apps'
+code_local_path repos. Repeated fetches, hard resets and history trims pile up loose objects, small
+packs and unreachable commits, which slowly makes every ``status`` / ``log`` / ``fetch`` more
+expensive. The MaintenanceScheduler gives each clone, at most once per ``maintenance_interval_seconds``:
+
+  * ``git maintenance run`` with the loose-objects, incremental-repack (packs small packs together
+    and writes the multi-pack-index) and commit-graph tasks,
+  * ``git reflog expire --all`` and ``git prune``, so the commits a trim or a reset left behind are
+    eventually dropped (with git's usual expiry periods, so nothing recent is lost).
+
+It only runs between passes, in the idle time before the next group is due, and within a budget of
+``maintenance_budget_seconds`` per idle window. The running git process is polled every
+STOP_POLL_SECONDS and terminated as soon as the window or budget runs out or a reconcile is
+requested, so maintenance never delays a pass; an interrupted clone is simply retried next window.
+Git's own lock and temp-file handling make an interrupted run safe.
+"""
+
+import os
+import signal
+import subprocess as sp
+import time
+from pathlib import Path
+
+from git import GitCommandError
+
+from gitops_agent import execution
+
+# How often each clone is maintained. Overridable via config.toml ("maintenance_interval_seconds").
+MAINTENANCE_INTERVAL_SECONDS = 24 * 3600
+
+# Wall-clock maintenance allowed per idle window; 0 disables maintenance. Overridable via config.toml
+# ("maintenance_budget_seconds").
+MAINTENANCE_BUDGET_SECONDS = 120
+
+# Maintenance stops this long before the next pass is due, and is not started in a shorter window.
+MAINTENANCE_SAFETY_SECONDS = 5
+
+STOP_POLL_SECONDS = 0.5
+
+# One git invocation per task: run together, incremental-repack is attempted before loose-objects has
+# written the first pack of a clone whose objects are all loose, and fails.
+MAINTENANCE_STEPS = (
+    ("maintenance", "run", "--task=loose-objects"),
+    ("maintenance", "run", "--task=incremental-repack"),
+    ("maintenance", "run", "--task=commit-graph"),
+    ("reflog", "expire", "--all"),
+    ("prune", "--expire=2.weeks.ago"),
+)
+
+
+class MaintenanceScheduler:
+    def __init__(self, interval=MAINTENANCE_INTERVAL_SECONDS, budget=MAINTENANCE_BUDGET_SECONDS):
+        self.interval = float(interval)
+        self.budget = float(budget)
+        if self.interval < 0 or self.budget < 0:
+            raise ValueError("maintenance_interval_seconds and maintenance_budget_seconds must not be negative")
+        # str(clone path) -> epoch seconds of its last completed (or failed) maintenance
+        self.last_run = {}
+
+    def due(self, paths, now):
+        """Return the clones among `paths` not maintained within the interval, least recent first."""
+        due = [Path(p) for p in paths if now - self.last_run.get(str(p), 0) >= self.interval]
+        return sorted(due, key=lambda p: self.last_run.get(str(p), 0))
+
+    def run(self, paths, window, should_stop=lambda: False):
+        """Maintain due clones for at most min(budget, window - safety margin) seconds.
+
+        Stops early -- killing the git process it is running -- once should_stop() returns True.
+        Returns the clones whose maintenance completed.
+        """
+        seconds = min(self.budget, window - MAINTENANCE_SAFETY_SECONDS)
+        if seconds <= 0:
+            return []
+        deadline = time.monotonic() + seconds
+        engine = execution.engine()
+        done = []
+        for path in self.due(paths, time.time()):
+            if should_stop() or time.monotonic() >= deadline:
+                break
+            try:
+                completed = engine.run_sync(engine.call(maintain_clone, path, deadline, should_stop))
+            except GitCommandError as err:
+                # A broken clone is reported and left for the next interval, not retried every window.
+                print(f"Maintenance of {path} failed: {err}")
+                self.last_run[str(path)] = time.time()
+                continue
+            if not completed:
+                break
+            self.last_run[str(path)] = time.time()
+            done.append(path)
+        return done
+
+
+def maintain_clone(path, deadline, should_stop=lambda: False):
+    """Run MAINTENANCE_STEPS in the clone at `path`. Returns False if it had to be interrupted."""
+    for step in MAINTENANCE_STEPS:
+        if not _run_step(path, step, deadline, should_stop):
+            return False
+    return True
+
+
+def _run_step(path, args, deadline, should_stop):
+    # Own process group, so an interrupt also stops whatever git spawned (pack-objects, ...).
+    process = sp.Popen(
+        ["git", *args], cwd=str(path), stdout=sp.DEVNULL, stderr=sp.PIPE, start_new_session=True
+    )
+    while True:
+        try:
+            _out, stderr = process.communicate(timeout=STOP_POLL_SECONDS)
+            break
+        except sp.TimeoutExpired:
+            if should_stop() or time.monotonic() >= deadline:
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+                process.communicate()
+                return False
+    if process.returncode != 0:
+        raise GitCommandError(["git", *args], process.returncode, stderr.decode("utf-8", "replace"))
+    return True
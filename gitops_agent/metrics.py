@@ -0,0 +1,159 @@
+"""Prometheus metrics for the agent's health and latency, without cloning the monitoring branch.
+
+The monitoring branch is the agent's report to humans; alerting on it means cloning it and parsing
+TOML. The agent now also keeps a small in-process registry (Metrics) and exposes it in the Prometheus
+text format, either or both ways (both off by default):
+
+  * ``metrics_port`` -- an HTTP endpoint, ``GET /metrics``, bound to ``metrics_host`` (127.0.0.1),
+  * ``metrics_textfile`` -- a file rewritten atomically after every pass, for node_exporter's
+    textfile collector (the path should end in ``.prom``).
+
+Exposed series (see METRICS for the full list): pass duration and per-group deployment-config fetch
+latency histograms, each app's status as computed by compute_app_status, per-group pass outcomes and
+last successful reconcile time, and monitoring push and history trim counts.
+
+No client library is needed: the registry renders the exposition format itself.
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+METRICS_PATH = "/metrics"
+
+# Upper bounds (seconds) of the duration histograms' buckets.
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+# name -> (type, help). Every series the agent exports is declared here.
+METRICS = {
+    "gitops_agent_pass_duration_seconds": ("histogram", "Wall-clock duration of a reconcile pass."),
+    "gitops_agent_config_fetch_seconds": (
+        "histogram",
+        "Duration of a group's deployment-config repo update (ls-remote probe, fetch, reset).",
+    ),
+    "gitops_agent_group_passes_total": ("counter", "Group reconciles, by outcome (changed/idle/failed/skipped)."),
+    "gitops_agent_last_success_timestamp_seconds": (
+        "gauge",
+        "Unix time of the group's last reconcile that did not fail.",
+    ),
+    "gitops_agent_app_healthy": (
+        "gauge",
+        "1 if the app's last reconcile was healthy, else 0; the status label is compute_app_status's label.",
+    ),
+    "gitops_agent_monitoring_pushes_total": ("counter", "Pushes of a group's monitoring branch, by result."),
+    "gitops_agent_monitoring_trims_total": ("counter", "History rewrites of a group's monitoring branch."),
+}
+
+
+class Metrics:
+    """Thread-safe registry of the series in METRICS."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # (name, sorted label items) -> float, or [bucket counts..., sum, count]
+
+    def inc(self, name, amount=1, **labels):
+        key = _series(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, replace=(), **labels):
+        """Set a gauge. With `replace`, series of `name` that match `labels` on those label names are
+        dropped first, so a label that changes value (e.g. an app's status) leaves no stale series."""
+        with self._lock:
+            if replace:
+                match = {(label, str(labels[label])) for label in replace}
+                for key in [key for key in self._values if key[0] == name]:
+                    if match <= set(key[1]):
+                        del self._values[key]
+            self._values[_series(name, labels)] = float(value)
+
+    def observe(self, name, value, **labels):
+        """Add one observation to a histogram."""
+        key = _series(name, labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        """Return every series in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            values = {key: (list(value) if isinstance(value, list) else value) for key, value in self._values.items()}
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = sorted((key[1], value) for key, value in values.items() if key[0] == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                for bound, count in zip(self.buckets, value):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _series(name, labels):
+    if name not in METRICS:
+        raise ValueError(f"Unknown metric {name!r}")
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{label}="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for label, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if float(value) != int(value) else str(int(value))
+
+
+def write_textfile(metrics, path):
+    """Atomically replace `path` with the current metrics (for node_exporter's textfile collector)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(metrics.render())
+    os.replace(tmp_path, path)
+
+
+def start_metrics_server(metrics, port, host="127.0.0.1"):
+    """Serve ``GET /metrics`` on host:port in a daemon thread. Returns the HTTPServer."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != METRICS_PATH:
+                self.send_error(404, "Use GET /metrics")
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scraped every few seconds; not worth a log line each time
+
+    server = HTTPServer((host, port), _Handler)
+    thread = threading.Thread(target=server.serve_forever, name="gitops-agent-metrics", daemon=True)
+    thread.start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}{METRICS_PATH}")
+    return server
@@ -0,0 +1,72 @@
+"""Dry-run planning: what the next pass would do, computed without touching anything.
+
+evaluate_app decides whether an app is updated, but the only way to see that decision used to be to
+let pull_app act on it. ``gitops-agent --plan [APP_OR_GROUP]`` runs the same drift detection
+(GitOpsAgent.app_plan, which evaluate_app uses too) and prints, per group and app, whether it would
+be updated and to which commit, which config files differ, and which pre/post commands would run.
+
+It never resets, checks out, copies, runs a hook or pushes. The desired state is read from each shared
+deployment-config clone's ``origin/<branch>`` straight from git's object store: infra_meta.toml and the
+config sources are exported into a throwaway directory, so the clone's worktree is never touched.
+By default that is the state of the last fetch, so a plan needs no network and is fast enough for a
+login banner. ``--fetch`` first updates ``origin/<branch>`` only (a fetch-only refspec). ``--json``
+prints the plan as data instead.
+"""
+
+from pathlib import Path
+
+
+def export_paths(commit, paths, dest_root):
+    """Write the blobs of `commit`'s tree at `paths` (relative to dest_root, or absolute under it) to
+    the same paths under dest_root. Paths outside dest_root or missing from the tree are skipped."""
+    for path in paths:
+        dest = Path(dest_root, path)
+        try:
+            blob = commit.tree / dest.relative_to(dest_root).as_posix()
+        except (ValueError, KeyError):
+            continue
+        if blob.type != "blob":
+            continue
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_bytes(blob.data_stream.read())
+
+
+def _short(sha):
+    return sha[:10] if sha else "nothing"
+
+
+def format_plan(groups):
+    """Render GitOpsAgent.plan's result for a terminal. Pure."""
+    lines = []
+    updates = total = 0
+    for group in groups:
+        header = group["group"]
+        if group.get("config_commit"):
+            header += f" (deployment config at {_short(group['config_commit'])} on origin/{group['branch']})"
+        lines.append(header)
+        if group.get("error"):
+            lines.append(f"  ! {group['error']}")
+            continue
+        for app_name, app in group["apps"].items():
+            total += 1
+            if "error" in app:
+                lines.append(f"  {app_name}: cannot plan: {app['error']}")
+                continue
+            if not app["update"]:
+                lines.append(f"  {app_name}: up to date at {_short(app['current'])}")
+                continue
+            updates += 1
+            if app["clone"]:
+                lines.append(f"  {app_name}: clone and check out {_short(app['desired'])}")
+            elif app["current"] != app["desired"]:
+                lines.append(f"  {app_name}: update {_short(app['current'])} -> {_short(app['desired'])}")
+            else:
+                lines.append(f"  {app_name}: re-apply {_short(app['desired'])}")
+            if app["interrupted"]:
+                lines.append("      the previous update of this app did not complete")
+            for dst in app["config_files"]:
+                lines.append(f"      config file differs: {dst}")
+            for phase, command in app["hooks"].items():
+                lines.append(f"      {phase}-update command: {command}")
+    lines.append(f"{updates} of {total} apps would be updated.")
+    return "\n".join(lines)
@@ -0,0 +1,198 @@
+"""Publishing the monitoring branches: coalesced pushes, and a policy for how often to push.
+
+Every (url, branch) group commits its status to its own ``{branch}-monitoring`` clone, and used to push
+it from inside flush_status -- one ``git push`` (and, over SSH, one full handshake) per group per pass.
+Instead, flush_status now queues the push on the pass's PushBatch, and as soon as every group of the
+pass that feeds a remote has finished (or was abandoned), reconcile_groups sends that remote's queued
+branches in ONE ``git push`` with one refspec per branch -- so a slow group only holds back the status
+of its own remote:
+
+  * the push runs from one of the clones (the "carrier") and straight to the remote's url, with the
+    other clones' object stores lent to it through GIT_ALTERNATE_OBJECT_DIRECTORIES -- nothing is
+    fetched or copied between clones, and no ref is created in the carrier,
+  * each clone's ``origin/<branch>`` and upstream are then set locally, exactly as the separate
+    ``git push --set-upstream`` used to leave them,
+  * if the combined push fails (e.g. one branch is rejected), every branch is retried on its own, so
+    one bad branch cannot hold back the others' status.
+
+Over SSH the pushes go through a ControlMaster socket under {GITOPS_AGENT_HOME}/<SSH_CONTROL_DIR>/, so
+one authenticated connection per host is reused across remotes and, for ``ssh_control_persist``
+seconds, across passes. It is left alone when the operator configured their own ssh command.
+
+Which changes get pushed at all is up to the PublishPolicy: with ``monitoring_min_push_interval`` set,
+a branch is pushed at most that often, except that a change in any app's health (healthy <-> not, or
+an app appearing) always goes out at once. Changes held back in between are not lost -- the next push
+publishes the latest state as one digest commit.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+from git import GitCommandError
+
+from gitops_agent import execution
+from gitops_agent import git_operations as gops
+
+# Seconds an idle SSH master connection is kept open for the next push. 0 disables the multiplexing.
+# Overridable via config.toml ("ssh_control_persist").
+SSH_CONTROL_PERSIST_SECONDS = 300
+
+# Directory (under GITOPS_AGENT_HOME) holding the ControlMaster sockets.
+SSH_CONTROL_DIR = "ssh-control"
+
+# Minimum seconds between two pushes of the same monitoring branch, unless an app's health changed.
+# 0 pushes every change. Overridable via config.toml ("monitoring_min_push_interval").
+MIN_PUSH_INTERVAL_SECONDS = 0
+
+
+class PublishPolicy:
+    """Decides whether a group's changed status is pushed now or held back for the next digest."""
+
+    def __init__(self, min_interval=MIN_PUSH_INTERVAL_SECONDS, push_on_health_change=True):
+        self.min_interval = float(min_interval)
+        if self.min_interval < 0:
+            raise ValueError("monitoring_min_push_interval must not be negative")
+        self.push_on_health_change = bool(push_on_health_change)
+
+    def should_hold(self, published, current, now, healthy):
+        """Return True if `current` (app_name -> body) should NOT be pushed yet.
+
+        `published` is what was last pushed: {"bodies": app_name -> body, "pushed_at": monotonic time
+        or None}. `healthy(body)` returns an app's health flag.
+        """
+        if not self.min_interval or published is None or published.get("pushed_at") is None:
+            return False
+        if now - published["pushed_at"] >= self.min_interval:
+            return False
+        return not (self.push_on_health_change and health_changed(published["bodies"], current, healthy))
+
+
+def health_changed(previous, current, healthy):
+    """True if any app in `current` is new, or its healthy(body) differs from that of `previous`."""
+    return any(
+        name not in previous or healthy(previous[name]) != healthy(body) for name, body in current.items()
+    )
+
+
+class PushBatch:
+    """Monitoring pushes queued by the groups of one pass, per remote. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # remote -> queued pushes
+        self._waiting = {}  # remote -> keys of the groups feeding it that have not settled yet
+        self._released = set()
+        self._closed = False
+
+    def expect(self, key):
+        """Register the (url, branch) group `key` as one whose push its remote's push waits for."""
+        with self._lock:
+            self._waiting.setdefault(_remote(key[0]), set()).add(key)
+
+    def add(self, push):
+        """Queue `push` (see pending_push). Returns False once its remote was released, e.g. for a group
+        that finishes after it was abandoned -- the caller must then push on its own."""
+        remote = _remote(push["url"])
+        with self._lock:
+            if self._closed or remote in self._released:
+                return False
+            self._pending.setdefault(remote, []).append(push)
+            return True
+
+    def settle(self, key):
+        """Mark group `key` as finished or abandoned. If it was the last group feeding its remote, release
+        that remote and return its queued pushes (in queue order) to be sent now; otherwise []."""
+        remote = _remote(key[0])
+        with self._lock:
+            waiting = self._waiting.get(remote, set())
+            waiting.discard(key)
+            if waiting:
+                return []
+            self._released.add(remote)
+            return self._pending.pop(remote, [])
+
+    def take(self):
+        """Close the batch and return everything still queued on it."""
+        with self._lock:
+            self._closed = True
+            pending = [push for pushes in self._pending.values() for push in pushes]
+            self._pending = {}
+        return pending
+
+
+def _remote(url):
+    return gops.normalize_url(url)
+
+
+def pending_push(key, url, local_path, branch, sha, force=False):
+    """Describe one monitoring branch to publish: clone `local_path` has `branch` at `sha`."""
+    return {"key": key, "url": url, "local_path": str(local_path), "branch": branch, "sha": sha, "force": force}
+
+
+def push_pending(pending, ssh_env=None):
+    """Push every pending branch, one ``git push`` per remote. Returns {key: None or the error}.
+
+    `ssh_env(local_path)`, if given, returns the extra environment for a push run from that clone.
+    """
+    by_remote = {}
+    for push in pending:
+        by_remote.setdefault(_remote(push["url"]), []).append(push)
+    engine = execution.engine()
+    results = {}
+    for pushes in by_remote.values():
+        results.update(engine.run_sync(_push_remote(engine, pushes, ssh_env)))
+    return results
+
+
+async def _push_remote(engine, pushes, ssh_env):
+    try:
+        await _push_together(engine, pushes, ssh_env)
+        return {push["key"]: None for push in pushes}
+    except GitCommandError as err:
+        if len(pushes) == 1:
+            return {pushes[0]["key"]: err}
+        print(f"Combined push of {len(pushes)} monitoring branches failed ({err}); pushing them one by one")
+    results = {}
+    for push in pushes:
+        try:
+            await _push_together(engine, [push], ssh_env)
+            results[push["key"]] = None
+        except GitCommandError as err:
+            results[push["key"]] = err
+    return results
+
+
+async def _push_together(engine, pushes, ssh_env):
+    carrier = pushes[0]["local_path"]
+    env = dict(ssh_env(carrier) if ssh_env else {})
+    borrowed = [str(Path(push["local_path"]) / ".git" / "objects") for push in pushes[1:]]
+    if borrowed:
+        env["GIT_ALTERNATE_OBJECT_DIRECTORIES"] = os.pathsep.join(borrowed)
+    # Push to the url rather than to "origin": the carrier must not get remote-tracking refs for the
+    # other clones' branches, whose objects it does not have.
+    remote_url = await engine.git(carrier, "config", "--get", "remote.origin.url")
+    refspecs = [f"{'+' if push['force'] else ''}{push['sha']}:refs/heads/{push['branch']}" for push in pushes]
+    await engine.push(carrier, remote_url, *refspecs, env=env)
+    for push in pushes:
+        branch = push["branch"]
+        await engine.git(push["local_path"], "update-ref", f"refs/remotes/origin/{branch}", push["sha"])
+        await engine.git(push["local_path"], "branch", f"--set-upstream-to=origin/{branch}", branch)
+
+
+def ssh_env(control_dir, persist, repo=None):
+    """Return the environment that makes git's ssh share one master connection per host.
+
+    Empty (no multiplexing) when `persist` is 0, or when GIT_SSH_COMMAND / GIT_SSH or the core.sshCommand
+    setting visible from `repo` already choose the ssh command -- the operator's choice wins.
+    """
+    if not persist or os.environ.get("GIT_SSH_COMMAND") or os.environ.get("GIT_SSH"):
+        return {}
+    if repo is not None and repo.config_reader().get_value("core", "sshCommand", ""):
+        return {}
+    Path(control_dir).mkdir(parents=True, exist_ok=True)
+    return {
+        "GIT_SSH_COMMAND": (
+            f"ssh -o ControlMaster=auto -o ControlPath={control_dir}/%C -o ControlPersist={int(persist)}"
+        )
+    }
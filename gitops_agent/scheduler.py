@@ -0,0 +1,72 @@
+"""Per-group adaptive polling schedule for the agent's run loop.
+
+A single global ``interval`` treats a deployment-config repo that changes several times a day the same
+as one that hasn't moved in months, and makes a broken remote cost a full attempt on every pass. The
+GroupScheduler gives every (url, branch) group its own next-due time instead:
+
+  * a pass that found a change resets the group to ``min_interval`` (follow-up pushes land fast),
+  * every idle pass multiplies its interval by ``growth``, up to ``max_interval``,
+  * a failed pass backs off exponentially from ``min_interval`` up to ``max_backoff``, without
+    touching the idle interval the group returns to once it recovers,
+  * every delay is jittered by +/- ``jitter`` (a fraction) so a fleet of agents started together
+    does not keep hitting the git host in lockstep.
+
+The scheduler is pure bookkeeping -- it never sleeps or runs git itself, and takes ``now`` from the
+caller (time.monotonic() in the agent), so it is deterministic under test.
+"""
+
+import random
+
+# Outcomes GitOpsAgent.reconcile_groups reports per group, and how record() treats them.
+CHANGED, IDLE, FAILED, SKIPPED = "changed", "idle", "failed", "skipped"
+
+
+class GroupScheduler:
+    def __init__(self, min_interval, max_interval, jitter=0.1, max_backoff=3600, growth=2.0, rand=random.random):
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.jitter = float(jitter)
+        self.max_backoff = max(float(max_backoff), self.min_interval)
+        self.growth = float(growth)
+        self._rand = rand
+        # key -> {"interval": current idle interval, "failures": consecutive failures, "next_due": time}
+        self._groups = {}
+
+    def sync(self, keys, now):
+        """Track exactly `keys` (in order): new groups are due immediately, removed ones are dropped."""
+        keys = list(keys)
+        self._groups = {
+            key: self._groups.get(key) or {"interval": self.min_interval, "failures": 0, "next_due": now}
+            for key in keys
+        }
+
+    def due(self, now):
+        """Return the keys whose next poll time has arrived, in tracking order."""
+        return [key for key, state in self._groups.items() if state["next_due"] <= now]
+
+    def record(self, key, outcome, now):
+        """Schedule `key`'s next poll from the outcome of the pass that just finished. Returns the delay."""
+        state = self._groups.get(key)
+        if state is None:
+            return None
+        if outcome == CHANGED:
+            state["interval"], state["failures"] = self.min_interval, 0
+            delay = state["interval"]
+        elif outcome == IDLE:
+            state["interval"] = min(self.max_interval, state["interval"] * self.growth)
+            state["failures"] = 0
+            delay = state["interval"]
+        elif outcome == FAILED:
+            state["failures"] += 1
+            delay = min(self.max_backoff, self.min_interval * 2 ** state["failures"])
+        else:  # SKIPPED: still running from an earlier pass; look again after the usual interval
+            delay = state["interval"]
+        delay *= 1 + self.jitter * (2 * self._rand() - 1)
+        state["next_due"] = now + delay
+        return delay
+
+    def next_wakeup(self, now):
+        """Seconds until the earliest tracked group is due (0 if one already is, max_interval if none)."""
+        if not self._groups:
+            return self.max_interval
+        return max(0.0, min(state["next_due"] for state in self._groups.values()) - now)
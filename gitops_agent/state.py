@@ -0,0 +1,105 @@
+"""Persistent agent state, so a restarted agent picks up where the previous process left off.
+
+Everything the agent learns during a pass used to live only in memory. After a restart, every group's
+deployment-config commit looked "moved" (so the scheduler polled it at the fast rate), the
+published-feedback cache was empty, and ``first_run`` forced a rewrite + push of every group's
+monitoring file even when nothing had changed. The AgentState keeps the small part of that knowledge
+needed for a warm restart in one JSON file under GITOPS_AGENT_HOME:
+
+  * per (url, branch) group: the deployment-config commit of its last pass, and the monitoring commit
+    last published with a digest of the app feedback bodies it holds (see feedback_digest),
+  * per app: the code commit its last completed update (or check) left deployed.
+
+On restart, a group's published feedback is only trusted again after the local monitoring clone
+proves it still holds exactly that commit, both checked out and as ``origin/<branch>``, and the
+digest of its feedback file matches (see GitOpsAgent._restore_published). Otherwise the group goes
+through the usual first-run rewrite. The config files' content digests already persist in their own
+manifest (see gitops_agent.drift).
+
+The file is written atomically (temp file + rename), only when something changed, and is ignored
+when it is unreadable, from another state version, or was written for another infra_name.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+STATE_VERSION = 1
+
+
+def feedback_digest(bodies):
+    """Return a stable SHA-256 of `bodies` (app_name -> feedback body), independent of key order."""
+    data = json.dumps(bodies, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _group_id(key):
+    url, branch = key
+    return f"{url}@{branch}"
+
+
+class AgentState:
+    """Persistent group/app state. Thread-safe; save() writes atomically."""
+
+    def __init__(self, state_path, infra_name):
+        self.state_path = Path(state_path)
+        self.infra_name = infra_name
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.state_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}  # first start, or an unreadable file -- start cold
+        if data.get("version") != STATE_VERSION or data.get("infra_name") != infra_name:
+            data = {}
+        self._groups = data.get("groups", {})
+        self._apps = data.get("apps", {})
+
+    def group(self, key):
+        """Return what is known about the (url, branch) group `key` (a copy; empty if nothing)."""
+        with self._lock:
+            return dict(self._groups.get(_group_id(key), {}))
+
+    def record_group(self, key, **fields):
+        """Merge `fields` into the group's entry."""
+        with self._lock:
+            entry = self._groups.setdefault(_group_id(key), {})
+            if any(entry.get(name) != value for name, value in fields.items()):
+                entry.update(fields)
+                self._dirty = True
+
+    def record_published(self, key, bodies, monitoring_commit):
+        """Remember that the group's monitoring branch is at `monitoring_commit`, holding `bodies`."""
+        self.record_group(
+            key, monitoring_commit=monitoring_commit, apps=sorted(bodies), feedback_digest=feedback_digest(bodies)
+        )
+
+    def applied_commit(self, app_name):
+        """Return the code commit `app_name` was last left at by a completed update, or None."""
+        with self._lock:
+            return self._apps.get(app_name, {}).get("applied_commit")
+
+    def record_applied(self, app_name, commit):
+        with self._lock:
+            if self._apps.get(app_name, {}).get("applied_commit") != commit:
+                self._apps[app_name] = {"applied_commit": commit}
+                self._dirty = True
+
+    def save(self):
+        """Persist the state if anything changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(
+                {"version": STATE_VERSION, "infra_name": self.infra_name, "groups": self._groups, "apps": self._apps},
+                sort_keys=True,
+            )
+            self._dirty = False
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.state_path)
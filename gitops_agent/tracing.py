@@ -0,0 +1,263 @@
+"""Per-phase tracing and on-demand profiling of reconcile passes.
+
+Nothing used to say where the time of a pass goes -- the deployment-config fetch, evaluate_app, the
+app fetches and checkouts, a pre/post command, the monitoring fetch, the trim or the push. With
+``trace_passes = true`` in config.toml, every pass records a span per phase, per group and per app:
+
+  * its wall-clock duration (inclusive of the spans nested in it),
+  * the child processes it spawned itself -- through the execution engine (git, hooks) or GitPython --
+    not counting those of nested spans,
+  * for fetching phases, how much the clone's object store grew (``bytes_fetched``, as reported by
+    ``git count-objects``, so it is what the fetch left behind rather than the wire size).
+
+After the pass, one JSON line with the spans and a per-phase summary (see summarize) is appended to
+``{GITOPS_AGENT_HOME}/traces.jsonl`` (``trace_file``), which is rotated to ``.1`` past
+TRACE_FILE_MAX_BYTES. Disabled, a span costs one attribute check.
+
+Profiling is requested per pass: creating ``{GITOPS_AGENT_HOME}/profile-next-pass`` makes the next
+pass run under cProfile -- in every group worker and every engine helper thread it uses -- and writes
+the merged statistics to ``{GITOPS_AGENT_HOME}/profiles/pass-<time>.pstats`` (view them with
+``python -m pstats`` or snakeviz). The request file is removed once consumed.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import subprocess as sp
+import threading
+import time
+from pathlib import Path
+
+TRACE_FILE = "traces.jsonl"
+TRACE_FILE_MAX_BYTES = 16 * 1024 * 1024
+
+PROFILE_REQUEST_FILE = "profile-next-pass"
+PROFILE_DIR = "profiles"
+
+_current = contextvars.ContextVar("gitops_agent_span", default=None)
+_count_lock = threading.Lock()
+_local = threading.local()
+# Traced passes currently counting GitPython's git invocations (see counting_git_calls).
+_git_counter_users = 0
+_git_execute = None
+
+
+class Span:
+    __slots__ = ("name", "attrs", "parent", "start", "seconds", "subprocesses", "bytes_fetched", "trace")
+
+    def __init__(self, name, attrs, parent, trace):
+        self.name = name
+        self.attrs = {**(parent.attrs if parent is not None else {}), **attrs}
+        self.parent = parent
+        self.start = time.monotonic()
+        self.seconds = None
+        self.subprocesses = 0
+        self.bytes_fetched = None
+        self.trace = trace
+
+    def record(self, origin):
+        return {
+            "name": self.name,
+            **self.attrs,
+            "parent": self.parent.name if self.parent is not None else None,
+            "offset": round(self.start - origin, 6),
+            "seconds": round(self.seconds, 6),
+            "subprocesses": self.subprocesses,
+            "bytes_fetched": self.bytes_fetched,
+        }
+
+
+class _PassTrace:
+    """The spans (and, if profiling, the profilers) of one pass."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.spans = []
+        self.profiles = []
+        self.lock = threading.Lock()
+
+
+class Tracer:
+    """Records the spans of each pass; a no-op unless tracing is on or the pass is profiled."""
+
+    def __init__(self, trace_file=None, home=None):
+        self.trace_file = Path(trace_file) if trace_file else None
+        self.home = Path(home) if home is not None else None
+
+    @contextlib.contextmanager
+    def traced_pass(self, **attrs):
+        """Trace (and, if requested, profile) one pass; it is the root span of everything inside."""
+        profile = self._profile_requested()
+        if self.trace_file is None and not profile:
+            yield None
+            return
+        trace = _PassTrace(profile)
+        started = time.time()
+        with counting_git_calls(), self.span("pass", _trace=trace, **attrs) as root, profiling():
+            yield root
+        record = {
+            "started": round(started, 3),
+            "seconds": round(root.seconds, 6),
+            "phases": summarize(trace.spans),
+            "spans": [span.record(root.start) for span in trace.spans],
+        }
+        if profile:
+            record["profile"] = str(self._dump_profile(trace, started))
+            print(f"Wrote the profile of this pass to {record['profile']}")
+        if self.trace_file is not None:
+            self._append(record)
+
+    @contextlib.contextmanager
+    def span(self, name, repo=None, _trace=None, **attrs):
+        """Time the phase `name` of the current pass. `repo` (a clone path, or a list of them) makes it
+        also measure how much their object stores grew."""
+        parent = _current.get()
+        trace = _trace or (parent.trace if parent is not None else None)
+        if trace is None:
+            yield None
+            return
+        span = Span(name, {key: value for key, value in attrs.items() if value is not None}, parent, trace)
+        repos = [] if repo is None else [repo] if isinstance(repo, (str, Path)) else list(repo)
+        before = sum(object_store_bytes(path) for path in repos)
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+            span.seconds = time.monotonic() - span.start
+            if repos:
+                span.bytes_fetched = max(0, sum(object_store_bytes(path) for path in repos) - before)
+            with trace.lock:
+                trace.spans.append(span)
+
+    def _profile_requested(self):
+        if self.home is None:
+            return False
+        request = self.home / PROFILE_REQUEST_FILE
+        try:
+            request.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _dump_profile(self, trace, started):
+        path = self.home / PROFILE_DIR / f"pass-{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}.pstats"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(trace.profiles[0])
+        for profile in trace.profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        return path
+
+    def _append(self, record):
+        self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.trace_file.stat().st_size > TRACE_FILE_MAX_BYTES:
+                os.replace(self.trace_file, self.trace_file.with_name(self.trace_file.name + ".1"))
+        except FileNotFoundError:
+            pass
+        with open(self.trace_file, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def profiling():
+    """Run cProfile on this thread if the current pass is being profiled (and it is not already)."""
+    span = _current.get()
+    if span is None or not span.trace.profile or getattr(_local, "profiling", False):
+        yield
+        return
+    profile = cProfile.Profile()
+    _local.profiling = True
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        _local.profiling = False
+        with span.trace.lock:
+            span.trace.profiles.append(profile)
+
+
+def in_current_span(fn):
+    """Wrap fn so that, run on another thread (an executor), it stays in the caller's span."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        def profiled():
+            with profiling():
+                return fn(*args, **kwargs)
+
+        return context.run(profiled)
+
+    return run
+
+
+def count_subprocess():
+    """Attribute one spawned child process to the current span, if any."""
+    span = _current.get()
+    if span is not None:
+        with _count_lock:
+            span.subprocesses += 1
+
+
+def summarize(spans):
+    """Per-phase totals of `spans`: name -> {count, seconds, max_seconds, subprocesses, bytes_fetched}. Pure."""
+    phases = {}
+    for span in spans:
+        phase = phases.setdefault(
+            span.name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "subprocesses": 0, "bytes_fetched": 0}
+        )
+        phase["count"] += 1
+        phase["seconds"] = round(phase["seconds"] + span.seconds, 6)
+        phase["max_seconds"] = round(max(phase["max_seconds"], span.seconds), 6)
+        phase["subprocesses"] += span.subprocesses
+        phase["bytes_fetched"] += span.bytes_fetched or 0
+    return phases
+
+
+def object_store_bytes(path):
+    """Size of the clone's object store -- loose objects and packs -- per ``git count-objects -v``
+    (0 if there is no clone). One cheap git call instead of a walk of .git/objects."""
+    try:
+        result = sp.run(
+            ["git", "count-objects", "-v"], cwd=str(path), capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return 0
+    if result.returncode != 0:
+        return 0
+    counts = dict(line.split(": ", 1) for line in result.stdout.splitlines() if ": " in line)
+    return (int(counts.get("size", 0)) + int(counts.get("size-pack", 0))) * 1024
+
+
+@contextlib.contextmanager
+def counting_git_calls():
+    """Count GitPython's git invocations towards the current span while any traced pass is running.
+
+    Git.execute is wrapped on entry of the first pass and restored on exit of the last, so outside a
+    traced pass GitPython runs unpatched."""
+    global _git_counter_users, _git_execute
+    from git.cmd import Git
+
+    with _count_lock:
+        if _git_counter_users == 0:
+            _git_execute = execute = Git.execute
+
+            def counted_execute(self, *args, **kwargs):
+                count_subprocess()
+                return execute(self, *args, **kwargs)
+
+            Git.execute = counted_execute
+        _git_counter_users += 1
+    try:
+        yield
+    finally:
+        with _count_lock:
+            _git_counter_users -= 1
+            if _git_counter_users == 0:
+                Git.execute = _git_execute
+                _git_execute = None
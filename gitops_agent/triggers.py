@@ -0,0 +1,107 @@
+"""Event-driven reconcile triggers.
+
+The agent's safety net is the periodic pass every ``interval`` seconds, but that makes a freshly
+pushed deploy wait up to a whole interval. This module lets a local caller (a CI job over ssh, a git
+hook, a cron script, or ``gitops-agent --trigger``) ask the running agent to reconcile NOW -- either
+everything, or just the group that holds a named app / ``<repo-slug>@<branch>``.
+
+The surface is a tiny HTTP receiver bound to localhost (disabled unless ``trigger_port`` is set in
+config.toml):
+
+    curl -X POST http://127.0.0.1:<trigger_port>/reconcile            # everything
+    curl -X POST http://127.0.0.1:<trigger_port>/reconcile/<name>     # one app or group
+
+Requests only ever land in a ReconcileTrigger mailbox; they never run git work on the HTTP thread.
+Requests that arrive while a pass is running are coalesced into ONE follow-up pass.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import quote, unquote
+from urllib.request import Request, urlopen
+
+RECONCILE_PATH = "/reconcile"
+
+
+class ReconcileTrigger:
+    """Thread-safe mailbox of pending reconcile requests, coalesced between passes.
+
+    request(name) records that the named app/group (or, with no name, everything) should be reconciled
+    as soon as possible. wait(timeout) blocks the agent loop until either a request arrives or the
+    timeout elapses, and hands back everything requested since the last wait -- so ten requests that
+    land during one long pass produce a single follow-up pass, not ten.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._names = set()
+        self._everything = False
+
+    def request(self, name=None):
+        with self._cond:
+            if name:
+                self._names.add(name)
+            else:
+                self._everything = True
+            self._cond.notify_all()
+
+    def pending(self):
+        """True if a request is waiting to be picked up by wait() (does not consume it)."""
+        with self._cond:
+            return self._everything or bool(self._names)
+
+    def wait(self, timeout):
+        """Block up to `timeout` seconds for a request. Returns what to reconcile.
+
+        Returns:
+            None if everything was requested; a non-empty set of app/group names for a targeted
+            request; or an empty set if the timeout elapsed with nothing requested.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not (self._everything or self._names):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                self._cond.wait(remaining)
+            names, everything = self._names, self._everything
+            self._names, self._everything = set(), False
+        return None if everything else names
+
+
+def start_trigger_server(trigger, port, host="127.0.0.1"):
+    """Serve ``POST /reconcile[/<name>]`` on host:port in a daemon thread, feeding `trigger`.
+
+    Returns the HTTPServer (call ``shutdown()`` to stop it). Binding to anything but localhost is
+    left to the operator: the endpoint is unauthenticated, and it can only ever make the agent
+    reconcile sooner, never change what it deploys.
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            path = self.path.rstrip("/")
+            if path != RECONCILE_PATH and not path.startswith(RECONCILE_PATH + "/"):
+                self.send_error(404, "Use POST /reconcile or /reconcile/<app-or-group>")
+                return
+            name = unquote(path[len(RECONCILE_PATH) + 1:]) or None
+            trigger.request(name)
+            self.send_response(202)
+            self.end_headers()
+            self.wfile.write(f"Reconcile of {name or 'everything'} queued\n".encode("utf-8"))
+
+        def log_message(self, format, *args):
+            print(f"Trigger from {self.client_address[0]}: {format % args}")
+
+    server = HTTPServer((host, port), _Handler)
+    thread = threading.Thread(target=server.serve_forever, name="gitops-agent-trigger", daemon=True)
+    thread.start()
+    print(f"Listening for reconcile triggers on http://{host}:{server.server_address[1]}{RECONCILE_PATH}")
+    return server
+
+
+def send_trigger(port, name=None, host="127.0.0.1", timeout=10):
+    """Ask a running agent to reconcile now. Returns the agent's reply text."""
+    url = f"http://{host}:{port}{RECONCILE_PATH}" + (f"/{quote(name, safe='')}" if name else "")
+    with urlopen(Request(url, data=b"", method="POST"), timeout=timeout) as response:
+        return response.read().decode("utf-8")
@@ -1,17 +1,35 @@
 """Shared pytest fixtures for the integration tests.
 
-Currently provides the `env` fixture, which points GITOPS_AGENT_HOME (and the resolved
+Provides the `env` fixture, which points GITOPS_AGENT_HOME (and the resolved
 git_operations.APP_CONFIGS_DIR) at a per-test tmp dir so the agent never touches /opt or the real
 filesystem. test_integration_monitoring.py and test_integration_dedup.py also define their own local
 `env` -- a local fixture overrides the conftest one (pytest picks the closest definition), so this
 file is non-breaking; it simply lets test files that don't redefine it (e.g. test_integration_health.py)
 discover the fixture by name without importing it (importing a fixture trips Ruff's F811/F401).
+
+`single_app` builds the one-app setup most feature tests start from: a code repo with two commits, a
+deployment-config repo "deploy" pinning the app to the first, and an agent over it.
+
+An autouse fixture also closes every git_operations repo session after each test, so the persistent
+git processes they hold don't pile up across the suite.
 """
 
+from types import SimpleNamespace
+
 import pytest
+from git import Repo
 
 from gitops_agent import git_operations as gops
 
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    commit_all,
+    make_app_code_repo_two_commits,
+    make_deploy_repo,
+    push,
+)
+
 
 @pytest.fixture
 def env(tmp_path, monkeypatch):
@@ -21,3 +39,41 @@ def env(tmp_path, monkeypatch):
     monkeypatch.setenv("GITOPS_AGENT_HOME", str(home))
     monkeypatch.setattr(gops, "APP_CONFIGS_DIR", app_configs)
     return {"home": home, "app_configs": app_configs, "tmp": tmp_path}
+
+
+@pytest.fixture
+def single_app(env, tmp_path):
+    """Factory: build_setup(files=None, **app_settings) -> SimpleNamespace(agent, apps_meta, first,
+    second, deploy_url, bare).
+
+    app1's infra_meta.toml entry gets app_settings on top of its code_url/hash/path; `files` maps paths
+    in the deployment-config repo (e.g. "testsite/app1.conf") to contents committed along with it.
+    """
+    def build_setup(files=None, **app_settings):
+        url, first, second = make_app_code_repo_two_commits(tmp_path, "app1")
+        apps_meta = {"app1": {**app_meta_entry(url, first, tmp_path / "deployed" / "app1"), **app_settings}}
+        deploy_url = make_deploy_repo(tmp_path, "deploy", apps_meta)
+        if files:
+            work = Repo(tmp_path / "work" / "deploy")
+            for rel_path, content in files.items():
+                (tmp_path / "work" / "deploy" / rel_path).parent.mkdir(parents=True, exist_ok=True)
+                (tmp_path / "work" / "deploy" / rel_path).write_text(content)
+            commit_all(work, "add files")
+            push(work, "main")
+        return SimpleNamespace(
+            agent=build_agent(tmp_path, {"app1": f"{deploy_url}@main"}),
+            apps_meta=apps_meta,
+            first=first,
+            second=second,
+            deploy_url=deploy_url,
+            bare=tmp_path / "remotes" / "deploy.git",
+        )
+
+    return build_setup
+
+
+@pytest.fixture(autouse=True)
+def _close_repo_sessions():
+    """Stop the persistent git processes of repo sessions opened by a test once it finishes."""
+    yield
+    gops.close_all_repo_sessions()
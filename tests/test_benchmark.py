@@ -0,0 +1,51 @@
+"""Smoke test for the reconcile benchmark (benchmarks/bench_reconcile.py) on a tiny synthetic fleet.
+
+Run with:  python -m pytest tests/test_benchmark.py -q
+"""
+
+import json
+import os
+
+from benchmarks import bench_reconcile
+from gitops_agent import git_operations as gops
+
+
+def test_benchmark_records_every_scenario(tmp_path, monkeypatch):
+    app_configs_dir = gops.APP_CONFIGS_DIR
+    monkeypatch.setenv("GITOPS_AGENT_HOME", str(tmp_path / "ours"))
+    monkeypatch.delenv("GITOPS_AGENT_CONFIG", raising=False)
+    output = tmp_path / "bench.json"
+
+    args = ["--groups", "1", "--apps", "2", "--config-files", "1", "--history", "40", "--repeat", "1"]
+    assert bench_reconcile.main(args + ["--output", str(output), "--workdir", str(tmp_path / "work")]) == 0
+
+    # The benchmark pointed the agent at its own scratch home and config, and put ours back.
+    assert gops.APP_CONFIGS_DIR == app_configs_dir
+    assert os.environ["GITOPS_AGENT_HOME"] == str(tmp_path / "ours")
+    assert "GITOPS_AGENT_CONFIG" not in os.environ
+
+    result = json.loads(output.read_text())
+    assert set(result["scenarios"]) == {"cold", "warm_noop", "single_change", "trim"}
+    assert {"config-fetch", "pull", "flush"} <= set(result["scenarios"]["cold"]["phases"])
+    assert "pull" in result["scenarios"]["single_change"]["phases"]
+    assert "pull" not in result["scenarios"]["warm_noop"]["phases"]
+
+
+def test_regressions_compare_medians():
+    baseline = {"scenarios": {"cold": {"median": 1.0}, "trim": {"median": 2.0}}}
+    result = {"scenarios": {"cold": {"median": 1.2}, "trim": {"median": 3.0}, "warm_noop": {"median": 9.0}}}
+    assert bench_reconcile.regressions(result, baseline, 0.25) == ["trim: 2.0s -> 3.0s"]
+
+
+def test_timed_passes_run_with_tracing_off(tmp_path, monkeypatch):
+    tracers = []
+    timed_pass = bench_reconcile._timed_pass
+    monkeypatch.setattr(bench_reconcile, "_timed_pass", lambda agent: tracers.append(agent.tracer) or timed_pass(agent))
+    monkeypatch.setenv("GITOPS_AGENT_HOME", str(tmp_path / "ours"))
+
+    args = ["--groups", "1", "--apps", "1", "--config-files", "1", "--history", "10", "--repeat", "2"]
+    args += ["--output", str(tmp_path / "bench.json"), "--workdir", str(tmp_path / "work")]
+    assert bench_reconcile.main(args) == 0
+
+    # Two timed runs of the three pass scenarios untraced, then one traced run for the phases.
+    assert [tracer.trace_file is None for tracer in tracers] == [True] * 6 + [False] * 3
@@ -0,0 +1,73 @@
+"""Tests for the in-process ownership repair in gitops_agent.git_operations.claim_ownership.
+
+Repairing a tree owned by someone else needs CAP_CHOWN, so those tests only run as root (as the
+agent itself does on prod-devices); the hot-path test runs anywhere.
+
+Run with:  python -m pytest tests/test_claim_ownership.py -q
+"""
+
+import os
+import subprocess
+
+import pytest
+
+from gitops_agent import git_operations as gops
+
+needs_root = pytest.mark.skipif(os.geteuid() != 0, reason="chown to another uid needs root")
+OTHER_UID = 54321
+
+
+def _no_subprocess(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError(f"unexpected subprocess: {args}")
+
+    monkeypatch.setattr(subprocess, "run", refuse)
+
+
+def test_owned_path_never_forks(tmp_path, monkeypatch):
+    _no_subprocess(monkeypatch)
+    (tmp_path / "repo").mkdir()
+    for _ in range(3):
+        gops.claim_ownership(tmp_path / "repo")
+    gops.claim_ownership(tmp_path / "missing")
+
+
+@needs_root
+def test_repairs_only_foreign_entries_and_not_symlink_targets(tmp_path, monkeypatch):
+    _no_subprocess(monkeypatch)
+    outside = tmp_path / "outside.txt"
+    outside.write_text("x")
+    os.chown(outside, OTHER_UID, -1)
+
+    root = tmp_path / "repo"
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "a" / "b" / "f.txt").write_text("f")
+    (root / "mine.txt").write_text("m")
+    (root / "link").symlink_to(outside)
+    for path in (root, root / "a", root / "a" / "b", root / "a" / "b" / "f.txt"):
+        os.chown(path, OTHER_UID, -1)
+    os.lchown(root / "link", OTHER_UID, -1)
+
+    gops.claim_ownership(root)
+
+    for path in (root, root / "a", root / "a" / "b", root / "a" / "b" / "f.txt", root / "mine.txt"):
+        assert path.stat().st_uid == 0, path
+    assert os.lstat(root / "link").st_uid == 0
+    assert outside.stat().st_uid == OTHER_UID, "symlink target outside the tree must not be touched"
+
+
+@needs_root
+def test_depth_limit_stops_the_walk(tmp_path, monkeypatch, capsys):
+    _no_subprocess(monkeypatch)
+    monkeypatch.setattr(gops, "OWNERSHIP_REPAIR_MAX_DEPTH", 1)
+
+    root = tmp_path / "repo"
+    (root / "a" / "b").mkdir(parents=True)
+    for path in (root, root / "a", root / "a" / "b"):
+        os.chown(path, OTHER_UID, -1)
+
+    gops.claim_ownership(root)
+
+    assert (root / "a").stat().st_uid == 0
+    assert (root / "a" / "b").stat().st_uid == OTHER_UID, "nothing below the depth limit is touched"
+    assert f"not repairing ownership below {root / 'a'}" in capsys.readouterr().out
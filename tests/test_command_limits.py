@@ -0,0 +1,109 @@
+"""Tests for pre/post-command timeouts and resource limits (run_command_with_tee + infra_meta keys).
+
+The end-to-end test runs a whole reconcile pass against REAL local bare repos from
+tests/test_integration_monitoring.py; the rest run commands directly.
+
+Run with:  python -m pytest tests/test_command_limits.py -q
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from gitops_agent import command_output as cmdout
+from gitops_agent.agent import compute_app_status, run_command_with_tee
+from gitops_agent.git_operations import parse_command_limits
+
+from tests.test_integration_monitoring import (
+    build_agent,
+    make_app_code_repo,
+    make_deploy_repo,
+    remote_branch_file,
+)
+
+
+def _alive(pid):
+    """True if pid is running (a zombie waiting for a non-reaping init counts as dead)."""
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except (FileNotFoundError, ProcessLookupError):
+        return False
+    return state != "Z"
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmdout, "KILL_GRACE_SECONDS", 1)
+    # A grandchild that ignores SIGTERM and outlives its shell unless the whole group gets SIGKILL.
+    command = "sh -c 'trap \"\" TERM; echo $$ > child.pid; sleep 60' & sleep 60"
+    started = time.monotonic()
+    ret, output = run_command_with_tee(command, tmp_path, timeout=1)
+    assert ret == cmdout.COMMAND_TIMED_OUT
+    assert time.monotonic() - started < 15
+    assert "timed out after 1s" in output
+    child = int((tmp_path / "child.pid").read_text())
+    deadline = time.monotonic() + 5
+    while _alive(child) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not _alive(child)
+
+
+def test_fast_command_keeps_its_exit_code_under_a_timeout(tmp_path):
+    assert run_command_with_tee("echo hi; exit 4", tmp_path, timeout=30) == (4, "hi\n")
+
+
+def test_nice_and_memory_limit_are_applied(tmp_path):
+    ret, output = run_command_with_tee("nice", tmp_path, limits={"nice": 7})
+    assert (ret, output) == (0, "7\n")
+
+    hog = f"{sys.executable} -c \"b = bytearray(400 * 1024 * 1024)\""
+    assert run_command_with_tee(hog, tmp_path)[0] == 0
+    assert run_command_with_tee(hog, tmp_path, limits={"memory_limit_mb": 200})[0] != 0
+
+
+def test_limits_are_validated():
+    assert parse_command_limits({}, "app")["timeout"] is None, "no timeout unless the app asks for one"
+    assert parse_command_limits({"command_timeout": 0}, "app")["timeout"] is None
+    assert parse_command_limits({"command_timeout": 60}, "app")["timeout"] == 60
+    for bad in ({"command_timeout": "soon"}, {"command_nice": 40}, {"command_nice": True},
+                {"command_ionice": "fast"}, {"command_memory_limit_mb": -1},
+                {"command_memory_limit_mb": True}):
+        with pytest.raises(ValueError):
+            parse_command_limits(bad, "app")
+
+
+def test_compute_app_status_reports_timeout_distinctly():
+    body = {
+        "config-updation": {"updation-return-value": True},
+        "app-updation": {"updation-return-value": True},
+        "extra-command-output": {"command-return-val": "{'pre': 0, 'post': 'timeout'}"},
+    }
+    assert compute_app_status(body) == (False, "❌ command timed out")
+
+
+def test_hung_post_command_is_reported_as_timed_out(env, tmp_path, monkeypatch):
+    monkeypatch.setattr(cmdout, "KILL_GRACE_SECONDS", 1)
+    url, commit = make_app_code_repo(tmp_path, "app1")
+    apps_meta = {
+        "app1": {
+            "code_url": url,
+            "code_commit_hash": commit,
+            "code_local_path": str(tmp_path / "deployed" / "app1"),
+            "post_updation_command": "sleep 60",
+            "command_timeout": 1,
+        }
+    }
+    deploy_url = make_deploy_repo(tmp_path, "deploy", apps_meta)
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main"})
+
+    started = time.monotonic()
+    agent.run_once()
+    assert time.monotonic() - started < 30
+
+    bare = tmp_path / "remotes" / "deploy.git"
+    feedback = remote_branch_file(bare, "main-monitoring", "testsite.toml", tmp_path, "t1")
+    assert feedback["app1"]["status"] == "❌ command timed out", feedback["app1"]
+    assert feedback["app1"]["extra-command-output"]["command-return-val"] == "{'post': 'timeout'}"
+    assert os.path.exists(env["home"] / "command-logs" / "app1-post.log")
@@ -0,0 +1,68 @@
+"""Tests for streaming, bounded command-output capture (gitops_agent.command_output + run_command_with_tee).
+
+Run with:  python -m pytest tests/test_command_output.py -q
+"""
+
+import sys
+
+from gitops_agent import command_output as cmdout
+from gitops_agent.agent import run_command_with_tee
+
+
+def test_line_splitter_handles_split_lines_and_multibyte_chars():
+    splitter = cmdout.LineSplitter(max_line=8)
+    data = "héllo\nwörld\n".encode("utf-8")
+    lines = []
+    for i in range(len(data)):  # worst case: one byte per chunk, splitting the UTF-8 sequences
+        lines += splitter.feed(data[i:i + 1])
+    assert lines + splitter.close() == ["héllo\n", "wörld\n"]
+
+    assert splitter.feed(b"x" * 20) == ["x" * 8, "x" * 8]
+    assert splitter.close() == ["xxxx"]
+
+
+def test_line_splitter_joins_a_crlf_split_across_chunks():
+    splitter = cmdout.LineSplitter()
+    lines = splitter.feed(b"abc\r") + splitter.feed(b"\ndef\r\n") + splitter.feed(b"progress\r")
+    assert lines + splitter.close() == ["abc\n", "def\n", "progress\n"]
+
+
+def test_bounded_capture_keeps_head_and_tail():
+    capture = cmdout.BoundedCapture(32)
+    for i in range(100):
+        capture.append(f"line{i:03}\n")
+    value = capture.getvalue("/logs/app-post.log")
+    assert value.startswith("line000\nline001\n")
+    assert value.endswith("line098\nline099\n")
+    assert "characters omitted; full log: /logs/app-post.log" in value
+
+    small = cmdout.BoundedCapture(100)
+    small.append("short\n")
+    assert small.getvalue("/unused") == "short\n"
+
+
+def test_run_command_streams_large_output_into_bounded_capture_and_spool(env, tmp_path):
+    script = "import sys\nfor i in range(50000): sys.stdout.write('\\x1b[31mline %d\\x1b[0m\\n' % i)\n"
+    (tmp_path / "chatty.py").write_text(script)
+    command = f"{sys.executable} chatty.py"
+
+    ret, captured = run_command_with_tee(command, tmp_path, log_name="app-post", max_chars=1000)
+
+    assert ret == 0
+    assert len(captured) < 1200
+    assert captured.startswith("line 0\n") and captured.endswith("line 49999\n")
+    assert "\x1b" not in captured
+    spool = env["home"] / "command-logs" / "app-post.log"
+    assert str(spool) in captured
+    spooled = spool.read_text().splitlines()
+    assert len(spooled) == 50000 and spooled[-1] == "line 49999"
+
+
+def test_spool_is_rotated_per_run(env, tmp_path):
+    for run in range(5):
+        run_command_with_tee(f"echo run{run}", tmp_path, log_name="app-pre")
+    log_dir = env["home"] / "command-logs"
+    assert (log_dir / "app-pre.log").read_text() == "run4\n"
+    assert (log_dir / "app-pre.log.1").read_text() == "run3\n"
+    assert (log_dir / "app-pre.log.3").read_text() == "run1\n"
+    assert not (log_dir / "app-pre.log.4").exists()
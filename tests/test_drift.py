@@ -0,0 +1,117 @@
+"""Content-digest drift detection tests (gitops_agent.drift + compare_file_contents + evaluate_app).
+
+Unit tests exercise the digest manifest directly; the end-to-end tests drive run_once against LOCAL
+bare repos built with the helpers from tests/test_integration_multifile.py.
+
+Run with:  python -m pytest tests/test_drift.py -q
+"""
+
+import os
+
+from gitops_agent import drift
+from gitops_agent.agent import compare_file_contents
+from gitops_agent.git_operations import resolve_config_file_pairs
+
+from tests.test_integration_multifile import (
+    INFRA,
+    _drift_verdict,
+    make_agent,
+    make_code_repo,
+    make_deploy_repo,
+)
+
+
+def test_binary_and_whitespace_modes(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.write_bytes(b"\x00\x01key = 1\n")
+    b.write_bytes(b"\x00\x01key=1")
+    assert not compare_file_contents(a, b)
+    assert compare_file_contents(a, b, ignore_whitespace=True)
+    b.write_bytes(b"\x00\x01key = 1\n")
+    assert compare_file_contents(a, b)
+
+
+def test_chunked_digest_matches_whole_file(tmp_path, monkeypatch):
+    f = tmp_path / "big"
+    f.write_bytes(b"a b\n" * 1000)
+    whole = drift.file_digest(f, drift.IGNORE_WHITESPACE)
+    monkeypatch.setattr(drift, "CHUNK_SIZE", 7)  # chunk boundaries fall mid-token
+    assert drift.file_digest(f, drift.IGNORE_WHITESPACE) == whole
+    assert drift.file_digest(f) != whole
+
+
+def test_manifest_rehashes_only_on_stat_change_and_persists(tmp_path, monkeypatch):
+    f = tmp_path / "cfg"
+    f.write_text("v1\n")
+    manifest_path = tmp_path / "home" / "digests.json"
+    manifest = drift.FileDigestManifest(manifest_path)
+
+    hashed = []
+    real_digest = drift.file_digest
+    monkeypatch.setattr(drift, "file_digest", lambda p, mode=drift.EXACT: hashed.append(p) or real_digest(p, mode))
+
+    first = manifest.digest(f)
+    assert manifest.digest(f) == first
+    assert len(hashed) == 1, "unchanged stat must not re-hash"
+
+    manifest.save()
+    reloaded = drift.FileDigestManifest(manifest_path)
+    assert reloaded.digest(f) == first
+    assert len(hashed) == 1, "a restarted agent reuses the persisted digest"
+
+    f.write_text("v2 changed\n")
+    os.utime(f, ns=(0, 123456789))
+    assert reloaded.digest(f) != first
+    assert len(hashed) == 2
+
+
+def test_ignore_whitespace_is_opt_in_per_pair(tmp_path):
+    app_meta = {
+        "config_files": [
+            {"src": "a.toml", "dst": "/opt/a.toml", "ignore_whitespace": True},
+            {"src": "b.toml", "dst": "/opt/b.toml"},
+        ]
+    }
+    pairs = resolve_config_file_pairs(app_meta, tmp_path)
+    assert pairs[0]["ignore_whitespace"] is True
+    assert "ignore_whitespace" not in pairs[1]
+
+
+def _whitespace_setup(tmp_path, monkeypatch, ignore_whitespace):
+    code_url, first_hash, _ = make_code_repo(tmp_path / "code.git", tmp_path / "code-work")
+    dst = tmp_path / "out" / "config.toml"
+    entry = {"src": f"{INFRA}/config.toml", "dst": str(dst)}
+    if ignore_whitespace:
+        entry["ignore_whitespace"] = True
+    infra_meta = {
+        "myapp": {
+            "code_url": code_url,
+            "code_commit_hash": first_hash,
+            "code_local_path": str(tmp_path / "deployed-code"),
+            "config_files": [entry],
+        }
+    }
+    deploy_url = make_deploy_repo(
+        tmp_path / "deploy.git", tmp_path / "deploy-work", infra_meta, {f"{INFRA}/config.toml": "key = 1\n"}
+    )
+    agent = make_agent(tmp_path, monkeypatch, {"myapp": f"{deploy_url}@main"})
+    agent.run_once()
+    assert dst.read_text() == "key = 1\n"
+    dst.write_text("key=1")  # reformatted on the box, same meaning
+    return agent, deploy_url, dst
+
+
+def test_whitespace_only_edit_is_drift_by_default(tmp_path, monkeypatch):
+    agent, deploy_url, dst = _whitespace_setup(tmp_path, monkeypatch, ignore_whitespace=False)
+    assert _drift_verdict(agent, deploy_url)
+    agent.run_once()
+    assert dst.read_text() == "key = 1\n", "drifted dst is restored byte-for-byte"
+    assert not _drift_verdict(agent, deploy_url)
+    assert (tmp_path / "config-file-digests.json").exists()
+
+
+def test_whitespace_only_edit_ignored_when_opted_in(tmp_path, monkeypatch):
+    agent, deploy_url, dst = _whitespace_setup(tmp_path, monkeypatch, ignore_whitespace=True)
+    assert not _drift_verdict(agent, deploy_url)
+    agent.run_once()
+    assert dst.read_text() == "key=1"
@@ -0,0 +1,99 @@
+"""Tests for the asyncio execution layer (gitops_agent.execution).
+
+Run with:  python -m pytest tests/test_execution.py -q
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+from git import GitCommandError, Repo
+
+from gitops_agent import execution
+from gitops_agent import git_operations as gops
+from gitops_agent.agent import _ThreadLocalStdout, run_command_with_tee
+
+
+@pytest.fixture
+def engine():
+    eng = execution.ExecutionEngine(max_child_processes=2)
+    yield eng
+    eng.close()
+
+
+def test_semaphore_caps_concurrent_children(engine, tmp_path):
+    lines = []
+
+    async def many():
+        return await asyncio.gather(*(engine.run_command("sleep 0.4", tmp_path, lines.append) for _ in range(4)))
+
+    started = time.monotonic()
+    assert engine.run_sync(many()) == [0, 0, 0, 0]
+    assert time.monotonic() - started >= 0.8, "4 commands through 2 slots take two rounds"
+
+    engine.configure(4)
+    started = time.monotonic()
+    engine.run_sync(many())
+    assert time.monotonic() - started < 0.8
+
+
+def test_git_and_check_git_status(engine, tmp_path):
+    repo = Repo.init(tmp_path, initial_branch="main")
+    repo.git.config("user.name", "tester")
+    repo.git.config("user.email", "tester@example.com")
+    (tmp_path / "f").write_text("x\n")
+    repo.git.add(all=True)
+    repo.git.commit("-m", "one")
+
+    assert engine.run_sync(engine.check_git_status(tmp_path)) == gops.check_git_status(tmp_path)
+    with pytest.raises(GitCommandError):
+        engine.run_sync(engine.git(tmp_path, "rev-parse", "--verify", "nope"))
+
+
+def test_check_git_status_reads_head_off_the_loop_thread(engine, tmp_path, monkeypatch):
+    repo = Repo.init(tmp_path, initial_branch="main")
+    repo.git.config("user.name", "tester")
+    repo.git.config("user.email", "tester@example.com")
+    repo.git.commit("--allow-empty", "-m", "one")
+    threads = []
+    real_describe = gops.describe_commit
+    monkeypatch.setattr(
+        gops, "describe_commit", lambda commit: threads.append(threading.current_thread().name) or real_describe(commit)
+    )
+    engine.run_sync(engine.check_git_status(tmp_path))
+    assert threads and threads[0].startswith("gitops-agent-blocking")
+
+
+def test_executor_is_replaced_and_shut_down_when_resized(engine):
+    first = engine._get_executor()
+    assert engine._get_executor() is first
+    engine.configure(3)
+    second = engine._get_executor()
+    assert second is not first and engine._executor_size == 3
+    with pytest.raises(RuntimeError):
+        first.submit(lambda: None)  # the old pool was shut down
+
+
+def test_command_output_lands_in_the_calling_threads_buffer(tmp_path):
+    router = _ThreadLocalStdout(open(tmp_path / "real-stdout", "w"))
+    result = {}
+
+    def worker():
+        buffer = router.capture()
+        result["ret"] = run_command_with_tee("echo from-hook", tmp_path)
+        result["log"] = buffer.getvalue()
+        router.release()
+
+    original, sys.stdout = sys.stdout, router
+    try:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+    finally:
+        sys.stdout = original
+        router.stream.close()
+    assert result["ret"] == (0, "from-hook\n")
+    assert result["log"] == "\tfrom-hook\n"
+    assert (tmp_path / "real-stdout").read_text() == ""
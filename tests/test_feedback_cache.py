@@ -0,0 +1,70 @@
+"""Tests for flush_status's published-feedback cache (unchanged passes skip all monitoring git work).
+
+Runs whole reconcile passes against REAL local bare repos from tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_feedback_cache.py -q
+"""
+
+import toml
+
+from gitops_agent import git_operations as gops
+
+from tests.test_integration_monitoring import rewrite_deploy_meta, status_commits
+
+
+def _record_monitoring_work(monkeypatch):
+    work = []
+    real_update, real_load = gops.update_git_repo, toml.load
+
+    def update(app_name, *args, **kwargs):
+        if app_name.endswith("-monitoring"):
+            work.append("fetch")
+        return real_update(app_name, *args, **kwargs)
+
+    def load(f, *args, **kwargs):
+        if str(getattr(f, "name", f)).endswith("testsite.toml"):
+            work.append("load")
+        return real_load(f, *args, **kwargs)
+
+    monkeypatch.setattr(gops, "update_git_repo", update)
+    monkeypatch.setattr(toml, "load", load)
+    return work
+
+
+def test_unchanged_pass_skips_monitoring_fetch_and_load(single_app, monkeypatch):
+    setup = single_app()
+    agent, bare = setup.agent, setup.bare
+    agent.run_once()
+    assert status_commits(bare) == 1
+
+    work = _record_monitoring_work(monkeypatch)
+    agent.run_once()
+    agent.run_once()
+    assert work == []
+    assert status_commits(bare) == 1
+
+
+def test_changed_body_is_still_published(single_app, tmp_path, monkeypatch):
+    setup = single_app()
+    agent, apps_meta, bare = setup.agent, setup.apps_meta, setup.bare
+    agent.run_once()
+    agent.run_once()
+
+    work = _record_monitoring_work(monkeypatch)
+    apps_meta["app1"]["code_commit_hash"] = setup.second
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    agent.run_once()
+    assert work == ["fetch", "load"]
+    assert status_commits(bare) == 2
+
+
+def test_cache_is_revalidated_against_the_branch(single_app, monkeypatch):
+    setup = single_app()
+    agent, bare = setup.agent, setup.bare
+    agent.config["monitoring_revalidate_seconds"] = 0
+    agent.run_once()
+
+    work = _record_monitoring_work(monkeypatch)
+    agent.run_once()
+    assert work == ["fetch", "load"], "an expired cache re-reads the published file"
+    assert status_commits(bare) == 1, "...and still makes no commit when nothing changed"
@@ -0,0 +1,139 @@
+"""Count-, size- and downsampling-based retention of the monitoring branch (history_retention_limits).
+
+Pure boundary/downsampling logic is unit tested; the rewrites run trim_monitoring_history against REAL
+local repos with backdated commits, reusing the helpers of tests/test_integration_trim.py.
+
+Run with:  python -m pytest tests/test_history_retention.py -q
+"""
+
+import os
+import time
+
+import pytest
+import toml
+from git import Repo
+
+from gitops_agent.agent import (
+    GitOpsAgent,
+    _commits_to_trim,
+    _downsample,
+    history_retention_limits,
+    trim_monitoring_history,
+)
+
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    make_app_code_repo,
+    make_deploy_repo,
+    remote_branch_commits,
+)
+from tests.test_integration_trim import (
+    DAY,
+    _head_file,
+    _make_monitoring_clone_with_history,
+    _subjects,
+)
+
+
+def test_count_cap_keeps_the_newest_and_waits_for_the_slack():
+    recent = list(range(100, 110))  # 10 commits, none older than the cutoff
+    assert _commits_to_trim(recent, 0, max_commits=5, slack=0.1) == (True, 5)
+    assert _commits_to_trim(recent[:5], 0, max_commits=5, slack=0.1) == (False, None)
+    assert _commits_to_trim(recent[:6], 0, max_commits=5, slack=0.25) == (False, None)
+    # An age boundary newer than the count boundary wins.
+    assert _commits_to_trim([1, 2, 3, 100, 101], 50, max_commits=4) == (True, 2)
+
+
+def test_size_cap_keeps_what_fits():
+    dates = [100, 101, 102, 103, 104]
+    assert _commits_to_trim(dates, 0, commit_sizes=[10] * 5, max_bytes=25) == (True, 2)
+    assert _commits_to_trim(dates, 0, commit_sizes=[10] * 5, max_bytes=50) == (False, None)
+
+
+def test_downsample_keeps_newest_per_bucket():
+    now = 100_000
+    rules = [(1_000, 100), (10_000, 1_000)]
+    dates = [80_000, 80_300, 80_999, 98_010, 98_050, 98_150, 99_500, 99_900]
+    # 80_* are >10_000 old -> one per 1_000 bucket; 98_* are >1_000 old -> one per 100; the rest young.
+    assert _downsample(dates, now, rules) == [2, 4, 5, 6, 7]
+    assert _downsample(dates, now, []) == list(range(len(dates)))
+
+
+def test_limits_are_validated():
+    assert history_retention_limits({}) == {"max_commits": None, "max_size_mb": None, "downsample": []}
+    for bad in (
+        {"monitoring_history_max_commits": 0},
+        {"monitoring_history_max_size_mb": "big"},
+        {"monitoring_history_downsample": [[1]]},
+        {"monitoring_history_downsample": [[1, -3600]]},
+    ):
+        with pytest.raises(ValueError):
+            history_retention_limits(bad)
+
+
+@pytest.mark.parametrize("bad", [
+    {"monitoring_history_retention_days": -1},
+    {"monitoring_history_retention_days": "30"},
+    {"monitoring_history_max_size_mb": 0},
+    {"monitoring_history_downsample": [[7]]},
+])
+def test_a_malformed_retention_setting_fails_at_startup(env, tmp_path, bad):
+    cfg_path = tmp_path / "config.toml"
+    cfg_path.write_text(toml.dumps({"applications": {}, "infra_name": "testsite", **bad}))
+    os.environ["GITOPS_AGENT_CONFIG"] = str(cfg_path)
+    try:
+        with pytest.raises(ValueError, match="monitoring_history_"):
+            GitOpsAgent(config_mode=False)
+    finally:
+        os.environ.pop("GITOPS_AGENT_CONFIG", None)
+
+
+def test_max_commits_caps_the_branch(env, tmp_path):
+    dated = [(f"s{i}", 8 - i) for i in range(8)]  # 8 commits, all inside a 30-day window
+    _bare, clone, branch = _make_monitoring_clone_with_history(tmp_path, "deploy", dated)
+    repo = Repo(str(clone))
+
+    assert trim_monitoring_history(repo, branch, 30, max_commits=4) is True
+    subjects = _subjects(clone)
+    assert subjects[:3] == ["status s7", "status s6", "status s5"]
+    assert len(subjects) == 4 and subjects[3].startswith("📉 History trimmed:")
+    assert _head_file(clone) == b"s7"
+    assert trim_monitoring_history(repo, branch, 30, max_commits=4) is False
+
+
+def test_max_size_caps_the_branch(env, tmp_path):
+    dated = [(f"{i}" * 1000, 5 - i) for i in range(5)]  # five distinct 1000-byte snapshots
+    _bare, clone, branch = _make_monitoring_clone_with_history(tmp_path, "deploy", dated)
+    repo = Repo(str(clone))
+
+    assert trim_monitoring_history(repo, branch, 30, max_size_mb=2500 / (1024 * 1024)) is True
+    subjects = _subjects(clone)
+    assert subjects[:2] == [f"status {'4' * 1000}", f"status {'3' * 1000}"]
+    assert len(subjects) == 3
+
+
+def test_downsampling_thins_old_snapshots_without_a_base(env, tmp_path):
+    now = time.time()
+    day_start = (now - 10 * DAY) // DAY * DAY + 3600  # three snapshots inside one calendar day
+    dated = [(name, (now - epoch) / DAY) for name, epoch in
+             (("d1", day_start), ("d2", day_start + 600), ("d3", day_start + 1200))]
+    dated += [("r1", 0.5), ("r2", 0.1)]
+    _bare, clone, branch = _make_monitoring_clone_with_history(tmp_path, "deploy", dated)
+    repo = Repo(str(clone))
+
+    assert trim_monitoring_history(repo, branch, 1000, downsample=[[7, 86400]]) is True
+    assert _subjects(clone) == ["status r2", "status r1", "status d3"]
+    assert _head_file(clone) == b"r2"
+    assert trim_monitoring_history(repo, branch, 1000, downsample=[[7, 86400]]) is False
+
+
+def test_max_commits_through_run_once(env, tmp_path):
+    url, commit = make_app_code_repo(tmp_path, "app1")
+    deploy_url = make_deploy_repo(tmp_path, "deploy", {"app1": app_meta_entry(url, commit, tmp_path / "d1")})
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main"})
+    agent.history_retention["max_commits"] = 1
+
+    agent.run_once()  # "Initial commit" + the status commit -> squashed into one base
+
+    assert len(remote_branch_commits(tmp_path / "remotes" / "deploy.git", "main-monitoring")) == 1
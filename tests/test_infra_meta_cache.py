@@ -0,0 +1,65 @@
+"""Tests for the parsed-infra_meta.toml cache (git_operations.load_infra_meta).
+
+check_deployment_config is called once per app before the config fetch and again per app in
+evaluate_app; these check that one unchanged file is parsed once no matter how many apps read it, and
+that an edit (as a config fetch would make) is picked up on the very next read. Plain files under
+tmp_path -- no repos.
+"""
+
+import os
+
+import toml
+
+from gitops_agent import git_operations as gops
+
+
+def _write_meta(tmp_path, apps):
+    meta = tmp_path / "deploy" / "site" / "infra_meta.toml"
+    meta.parent.mkdir(parents=True, exist_ok=True)
+    meta.write_text(toml.dumps(apps))
+    return meta
+
+
+def _entry(commit):
+    return {"code_url": "file:///x.git", "code_commit_hash": commit, "code_local_path": "/srv/x"}
+
+
+def _count_parses(monkeypatch):
+    calls = []
+    real = gops.toml.load
+
+    def counting(f):
+        calls.append(getattr(f, "name", f))
+        return real(f)
+
+    monkeypatch.setattr(gops.toml, "load", counting)
+    return calls
+
+
+def test_unchanged_file_parsed_once_for_many_apps(tmp_path, monkeypatch):
+    apps = {f"app{i}": _entry(f"{i:040d}") for i in range(20)}
+    meta = _write_meta(tmp_path, apps)
+    calls = _count_parses(monkeypatch)
+
+    for _phase in range(2):
+        for name in apps:
+            cfg = gops.check_deployment_config(meta.parent.parent, name, "site")
+            assert cfg["code_commit_hash"] == apps[name]["code_commit_hash"]
+    assert len(calls) == 1, calls
+
+
+def test_edited_file_is_reparsed(tmp_path, monkeypatch):
+    meta = _write_meta(tmp_path, {"app1": _entry("a" * 40)})
+    calls = _count_parses(monkeypatch)
+    assert gops.check_deployment_config(meta.parent.parent, "app1", "site")["code_commit_hash"] == "a" * 40
+
+    # Same size, and the mtime forced back to the old value: the new inode from the rewrite (which
+    # is how git checks files out) is still enough to invalidate the entry.
+    old = os.stat(meta)
+    replacement = meta.with_suffix(".new")
+    replacement.write_text(toml.dumps({"app1": _entry("b" * 40)}))
+    os.replace(replacement, meta)
+    os.utime(meta, ns=(old.st_atime_ns, old.st_mtime_ns))
+
+    assert gops.check_deployment_config(meta.parent.parent, "app1", "site")["code_commit_hash"] == "b" * 40
+    assert len(calls) == 2
@@ -0,0 +1,224 @@
+"""Concurrent-reconcile tests: independent (url, branch) groups run on a bounded worker pool.
+
+These drive the WHOLE reconcile pass (GitOpsAgent.run_once) against REAL local bare git repos -- no
+network, no /opt, no root -- reusing the harness from tests/test_integration_monitoring.py. Overlap is
+observed through the post_updation_command itself (each one appends start/end markers to a shared
+file) instead of wall-clock thresholds, so the assertions are not timing-flaky.
+
+Run with:  python -m pytest tests/test_integration_parallel.py -q
+"""
+
+import sys
+import time
+
+import pytest
+
+# Reuse the integration harness verbatim. The `env` fixture is provided by tests/conftest.py and
+# discovered by name (no import needed). These are plain helper functions, imported normally.
+from tests.test_integration_monitoring import (
+    build_agent,
+    make_app_code_repo,
+    make_deploy_repo,
+    status_commits,
+)
+
+
+def _two_groups_with_command(tmp_path, command_for):
+    """Build two deploy repos (one app each) whose post-command is command_for(app_name)."""
+    applications = {}
+    for org, app in (("orgA", "appA"), ("orgB", "appB")):
+        url, commit = make_app_code_repo(tmp_path, app)
+        meta = {
+            app: {
+                "code_url": url,
+                "code_commit_hash": commit,
+                "code_local_path": str(tmp_path / "deployed" / app),
+                "post_updation_command": command_for(app),
+            }
+        }
+        deploy_url = make_deploy_repo(tmp_path, f"{org}/deploy", meta)
+        applications[app] = f"{deploy_url}@main"
+    return applications
+
+
+def test_groups_reconcile_concurrently(env, tmp_path):
+    markers = tmp_path / "markers.log"
+    applications = _two_groups_with_command(
+        tmp_path, lambda app: f"echo start-{app} >> {markers}; sleep 1; echo end-{app} >> {markers}"
+    )
+    agent = build_agent(tmp_path, applications)
+    agent.config["max_concurrent_groups"] = 2
+    agent.run_once()
+
+    lines = markers.read_text().split()
+    # Both groups' commands were in flight at the same time: both starts precede either end.
+    assert [line.split("-")[0] for line in lines] == ["start", "start", "end", "end"], lines
+    for org in ("orgA", "orgB"):
+        assert status_commits(tmp_path / "remotes" / f"{org}/deploy.git") == 1
+
+
+def test_single_worker_is_sequential(env, tmp_path):
+    markers = tmp_path / "markers.log"
+    applications = _two_groups_with_command(
+        tmp_path, lambda app: f"echo start-{app} >> {markers}; echo end-{app} >> {markers}"
+    )
+    agent = build_agent(tmp_path, applications)
+    agent.config["max_concurrent_groups"] = 1
+    agent.run_once()
+
+    assert markers.read_text().split() == ["start-appA", "end-appA", "start-appB", "end-appB"]
+
+
+def test_logs_are_emitted_per_group_in_config_order(env, tmp_path, capsys):
+    applications = _two_groups_with_command(
+        tmp_path, lambda app: f"sleep {1 if app == 'appA' else 0}; echo LOG-{app}"
+    )
+    agent = build_agent(tmp_path, applications)
+    agent.config["max_concurrent_groups"] = 2
+    agent.run_once()
+
+    out = capsys.readouterr().out
+    # appB finishes first, but appA's group is configured first -> its whole block is printed first,
+    # and nothing from appB's group lands in the middle of it.
+    a_first, a_last = out.index("Updating repository deploy@main-config"), out.index("LOG-appA")
+    assert a_first < a_last < out.index("LOG-appB")
+    assert "appB" not in out[a_first:a_last]
+
+
+def test_group_timeout_abandons_only_the_slow_group(env, tmp_path, capsys):
+    applications = _two_groups_with_command(
+        tmp_path, lambda app: "sleep 3" if app == "appA" else "true"
+    )
+    agent = build_agent(tmp_path, applications)
+    agent.config["max_concurrent_groups"] = 2
+    agent.config["group_timeout_seconds"] = 0.5
+
+    started = time.monotonic()
+    agent.run_once()
+    assert time.monotonic() - started < 3, "the pass must not wait on the abandoned group"
+    assert "was abandoned for this pass" in capsys.readouterr().out
+    # The fast group was still reconciled and reported.
+    assert status_commits(tmp_path / "remotes" / "orgB/deploy.git") == 1
+
+    # While the stuck worker is still running, the next pass skips that group instead of doubling up.
+    agent.run_once()
+    assert "its previous reconcile is still running" in capsys.readouterr().out
+
+    deadline = time.monotonic() + 30
+    while agent._inflight_groups and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not agent._inflight_groups
+
+
+def test_one_failing_group_does_not_block_the_others(env, tmp_path):
+    applications = _two_groups_with_command(tmp_path, lambda app: "true")
+    # Point appA at a deploy repo that does not exist: its group fails, appB's still reconciles.
+    applications["appA"] = f"file://{tmp_path / 'remotes' / 'missing.git'}@main"
+    agent = build_agent(tmp_path, applications)
+    agent.config["max_concurrent_groups"] = 2
+
+    with pytest.raises(Exception):  # noqa: B017 -- the clone failure itself is surfaced unchanged
+        agent.run_once()
+    assert status_commits(tmp_path / "remotes" / "orgB/deploy.git") == 1
+
+
+# --------------------------------------------------------------------------------------
+# Per-app prefetch inside one group + depends_on ordering
+# --------------------------------------------------------------------------------------
+
+def _one_group(tmp_path, apps):
+    """Build one deploy repo holding every app in `apps` (name -> extra infra_meta keys)."""
+    meta = {}
+    for name, extra in apps.items():
+        url, commit = make_app_code_repo(tmp_path, name)
+        meta[name] = dict(
+            {"code_url": url, "code_commit_hash": commit, "code_local_path": str(tmp_path / "deployed" / name)},
+            **extra,
+        )
+    deploy_url = make_deploy_repo(tmp_path, "deploy", meta)
+    return {name: f"{deploy_url}@main" for name in apps}
+
+
+def test_app_fetches_overlap_within_a_group(env, tmp_path, monkeypatch):
+    import threading
+
+    import gitops_agent.git_operations as gops
+
+    barrier = threading.Barrier(3, timeout=10)
+    real_fetch = gops.fetch_git_repo
+
+    passed = []
+
+    def fetch_after_barrier(*args, **kwargs):
+        barrier.wait()  # only passes once all three fetches are in flight together
+        passed.append(args[0])
+        return real_fetch(*args, **kwargs)
+
+    monkeypatch.setattr(gops, "fetch_git_repo", fetch_after_barrier)
+    applications = _one_group(tmp_path, {"app1": {}, "app2": {}, "app3": {}})
+    agent = build_agent(tmp_path, applications)
+    agent.run_once()
+
+    assert not barrier.broken, "the three app fetches did not run concurrently"
+    assert sorted(passed) == ["app1", "app2", "app3"]
+    assert status_commits(tmp_path / "remotes" / "deploy.git") == 1
+
+
+def test_depends_on_orders_commands(env, tmp_path):
+    markers = tmp_path / "markers.log"
+    applications = _one_group(
+        tmp_path,
+        {
+            "web": {"depends_on": ["db"], "post_updation_command": f"echo web >> {markers}"},
+            "db": {"post_updation_command": f"echo db >> {markers}"},
+            "cache": {"post_updation_command": f"echo cache >> {markers}"},
+        },
+    )
+    agent = build_agent(tmp_path, applications)
+    agent.run_once()
+
+    # web is listed first but waits for db; cache (no deps) keeps its config position after db.
+    assert markers.read_text().split() == ["db", "web", "cache"]
+
+
+def test_prefetched_first_clone_skips_pre_command(env, tmp_path):
+    markers = tmp_path / "markers.log"
+    applications = _one_group(
+        tmp_path,
+        {name: {"pre_updation_command": f"echo pre-{name} >> {markers}"} for name in ("app1", "app2")},
+    )
+    agent = build_agent(tmp_path, applications)
+    agent.run_once()
+
+    # The code dirs did not exist before this pass, so (as before the prefetch) no pre-command ran.
+    assert not markers.exists()
+
+
+def test_order_apps_by_dependencies_stable_and_cycle():
+    from gitops_agent.agent import order_apps_by_dependencies
+
+    configs = {"a": {}, "b": {"depends_on": ["c"]}, "c": {}, "d": {"depends_on": ["elsewhere"]}}
+    assert order_apps_by_dependencies(configs) == ["a", "c", "b", "d"]
+
+    with pytest.raises(ValueError, match="cycle"):
+        order_apps_by_dependencies({"a": {"depends_on": ["b"]}, "b": {"depends_on": ["a"]}})
+
+
+def test_depends_on_must_be_a_list(env, tmp_path):
+    applications = _one_group(tmp_path, {"web": {"depends_on": "db"}, "db": {}})
+    agent = build_agent(tmp_path, applications)
+    with pytest.raises(ValueError, match="depends_on for web must be a list"):
+        agent.run_once()
+
+
+def test_stdout_is_restored_when_a_pass_raises(env, tmp_path, monkeypatch):
+    agent = build_agent(tmp_path, _one_group(tmp_path, {"app1": {}}))
+
+    def broken_push(batch):
+        raise RuntimeError("push exploded")
+
+    monkeypatch.setattr(agent, "push_batch", broken_push)
+    stdout = sys.stdout
+    with pytest.raises(RuntimeError, match="push exploded"):
+        agent.run_once()
+    assert sys.stdout is stdout
@@ -0,0 +1,98 @@
+"""Remote-change probe tests: update_git_repo skips fetch/reset when origin's tip is unchanged.
+
+Every pass used to run ``fetch --all --prune`` + ``reset --hard`` on the shared deployment-config
+clone and the monitoring clone even when nothing moved upstream. update_git_repo now asks the remote
+for just the tracked branch's tip first (remote_unchanged) and skips the whole sequence when it
+matches the local clone. These tests record which git subcommands GitPython runs, against REAL local
+bare repos -- no network, no /opt, no root.
+
+Run with:  python -m pytest tests/test_integration_remote_probe.py -q
+"""
+
+from pathlib import Path
+
+import pytest
+from git import Repo
+from git.cmd import Git
+
+from gitops_agent import git_operations as gops
+from gitops_agent.agent import shared_clone_path
+
+# Reuse the integration harness verbatim. The `env` fixture is provided by tests/conftest.py and
+# discovered by name (no import needed). These are plain helper functions, imported normally.
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    make_app_code_repo_two_commits,
+    make_deploy_repo,
+    rewrite_deploy_meta,
+)
+
+
+@pytest.fixture
+def git_calls(monkeypatch):
+    """Record (working_dir, subcommand) for every GitPython-dispatched git call."""
+    calls = []
+    real = Git._call_process
+
+    def recording(self, method, *args, **kwargs):
+        calls.append((str(self._working_dir), method))
+        return real(self, method, *args, **kwargs)
+
+    monkeypatch.setattr(Git, "_call_process", recording)
+    return calls
+
+
+def _setup(tmp_path):
+    url1, first1, second1 = make_app_code_repo_two_commits(tmp_path, "app1")
+    apps_meta = {"app1": app_meta_entry(url1, first1, tmp_path / "deployed" / "app1")}
+    deploy_url = make_deploy_repo(tmp_path, "deploy", apps_meta)
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main"})
+    return agent, deploy_url, apps_meta, second1
+
+
+def test_unchanged_remote_skips_fetch_and_reset(env, tmp_path, git_calls):
+    agent, deploy_url, _, _ = _setup(tmp_path)
+    agent.run_once()
+
+    git_calls.clear()
+    agent.run_once()
+    cfg = shared_clone_path(deploy_url, "main")
+    touched = [method for wd, method in git_calls if wd in (cfg, cfg + "-monitoring")]
+    assert "ls_remote" in touched
+    assert "fetch" not in touched and "reset" not in touched, touched
+
+
+def test_changed_remote_still_fetches(env, tmp_path, git_calls):
+    agent, deploy_url, apps_meta, second1 = _setup(tmp_path)
+    agent.run_once()
+
+    apps_meta["app1"]["code_commit_hash"] = second1
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    git_calls.clear()
+    agent.run_once()
+
+    cfg = shared_clone_path(deploy_url, "main")
+    assert (cfg, "fetch") in git_calls
+    assert str(Repo(str(tmp_path / "deployed" / "app1")).head.commit) == second1
+
+
+def test_dirty_clone_is_not_skipped(env, tmp_path):
+    agent, deploy_url, _, _ = _setup(tmp_path)
+    agent.run_once()
+
+    # A hand-edit in the shared clone must still be reverted by the reset --hard, probe or not.
+    meta = Path(shared_clone_path(deploy_url, "main")) / "testsite" / "infra_meta.toml"
+    original = meta.read_text()
+    meta.write_text(original + "\n# local edit\n")
+    assert gops.remote_unchanged(Repo(str(meta.parent.parent)), "main") is False
+    agent.run_once()
+    assert meta.read_text() == original
+
+
+def test_missing_remote_branch_is_not_unchanged(env, tmp_path):
+    agent, deploy_url, _, _ = _setup(tmp_path)
+    agent.run_once()
+    repo = Repo(shared_clone_path(deploy_url, "main"))
+    assert gops.remote_unchanged(repo, "main") is True
+    assert gops.remote_unchanged(repo, "no-such-branch") is False
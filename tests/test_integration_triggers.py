@@ -0,0 +1,161 @@
+"""Event-driven reconcile trigger tests (gitops_agent.triggers + GitOpsAgent.run).
+
+The end-to-end test runs the real agent loop (GitOpsAgent.run) in a background thread with a long
+interval, then fires `gitops-agent --trigger <app>` as a separate process -- the local stand-in for a
+CI job or git hook -- and checks the pushed change is applied well before the interval elapses. Repos
+are REAL local bare repos -- no network, no /opt, no root -- from tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_integration_triggers.py -q
+"""
+
+import os
+import socket
+import subprocess as sp
+import sys
+import threading
+import time
+
+import toml
+from git import Repo
+
+from gitops_agent.agent import group_apps_by_repo, select_groups
+from gitops_agent.triggers import ReconcileTrigger
+
+# Reuse the integration harness verbatim. The `env` fixture is provided by tests/conftest.py and
+# discovered by name (no import needed). These are plain helper functions, imported normally.
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    make_app_code_repo_two_commits,
+    make_deploy_repo,
+    rewrite_deploy_meta,
+    status_commits,
+)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until(predicate, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+# --------------------------------------------------------------------------------------
+# Pure mailbox / selection logic
+# --------------------------------------------------------------------------------------
+
+def test_trigger_wait_times_out_with_nothing_requested():
+    assert ReconcileTrigger().wait(0.05) == set()
+
+
+def test_trigger_coalesces_requests_between_waits():
+    trigger = ReconcileTrigger()
+    for name in ("app1", "app2", "app1"):
+        trigger.request(name)
+    assert trigger.wait(1) == {"app1", "app2"}
+    assert trigger.wait(0.05) == set(), "requests are consumed by the wait that returned them"
+
+
+def test_trigger_everything_wins_over_names():
+    trigger = ReconcileTrigger()
+    trigger.request("app1")
+    trigger.request()
+    assert trigger.wait(1) is None
+
+
+def test_trigger_wakes_a_blocked_wait():
+    trigger = ReconcileTrigger()
+    threading.Timer(0.1, trigger.request, args=("app1",)).start()
+    started = time.monotonic()
+    assert trigger.wait(10) == {"app1"}
+    assert time.monotonic() - started < 5
+
+
+def test_select_groups_by_app_or_label():
+    grouped = group_apps_by_repo(
+        {
+            "a1": "git@host:org/deployA.git@main",
+            "a2": "git@host:org/deployA.git@main",
+            "b1": "git@host:org/deployB.git@prod",
+        }
+    )
+    assert list(select_groups(grouped, {"a2"})) == [("git@host:org/deployA.git", "main")]
+    assert list(select_groups(grouped, {"deployB@prod"})) == [("git@host:org/deployB.git", "prod")]
+    assert select_groups(grouped, {"nope"}) == {}
+
+
+# --------------------------------------------------------------------------------------
+# End to end: a trigger fired from another process applies a pushed change immediately
+# --------------------------------------------------------------------------------------
+
+def test_cli_trigger_reconciles_before_interval(env, tmp_path):
+    url1, first1, second1 = make_app_code_repo_two_commits(tmp_path, "app1")
+    cp1 = tmp_path / "deployed" / "app1"
+    apps_meta = {"app1": app_meta_entry(url1, first1, cp1)}
+    deploy_url = make_deploy_repo(tmp_path, "deploy", apps_meta)
+    bare = tmp_path / "remotes" / "deploy.git"
+
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main"})
+    port = _free_port()
+    agent.config["trigger_port"] = port
+    agent.interval = 3600
+    cfg_path = tmp_path / "config.toml"
+    cfg_path.write_text(toml.dumps(dict(toml.loads(cfg_path.read_text()), trigger_port=port)))
+
+    loop = threading.Thread(target=agent.run, daemon=True)
+    loop.start()
+    try:
+        assert _wait_until(lambda: status_commits(bare) == 1), "initial full pass never completed"
+
+        apps_meta["app1"]["code_commit_hash"] = second1
+        rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+        fired = sp.run(
+            [sys.executable, "-m", "gitops_agent.agent", "--trigger", "app1"],
+            env=dict(os.environ, GITOPS_AGENT_CONFIG=str(cfg_path)),
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        assert fired.returncode == 0, fired.stderr
+        assert "queued" in fired.stdout
+
+        assert _wait_until(lambda: str(Repo(str(cp1)).head.commit) == second1), "trigger did not reconcile"
+        assert _wait_until(lambda: status_commits(bare) == 2)
+    finally:
+        agent.stop()
+        loop.join(timeout=30)
+    assert not loop.is_alive()
+
+
+def test_run_loop_survives_a_failing_group_and_backs_it_off(env, tmp_path, capsys):
+    url1, first1, _ = make_app_code_repo_two_commits(tmp_path, "app1")
+    deploy_url = make_deploy_repo(tmp_path, "deploy", {"app1": app_meta_entry(url1, first1, tmp_path / "d1")})
+    bare = tmp_path / "remotes" / "deploy.git"
+    applications = {"app1": f"{deploy_url}@main", "broken": f"file://{tmp_path / 'missing.git'}@main"}
+    agent = build_agent(tmp_path, applications)
+    # Tiny schedule: healthy groups re-polled every 0.2s, the broken one backs off 0.4s, 0.8s, 1.6s...
+    agent.config.update(min_poll_interval=0.2, max_poll_interval=0.2, poll_jitter=0, max_failure_backoff=60)
+
+    loop = threading.Thread(target=agent.run, daemon=True)
+    loop.start()
+    try:
+        assert _wait_until(lambda: status_commits(bare) == 1)
+        time.sleep(2)
+    finally:
+        agent.stop()
+        loop.join(timeout=30)
+    assert not loop.is_alive()
+
+    out = capsys.readouterr().out
+    healthy_passes = out.count("Updating repository deploy@main-config")
+    broken_passes = out.count("Error while reconciling missing@main")
+    assert broken_passes >= 1
+    assert healthy_passes > broken_passes + 2, (healthy_passes, broken_passes)
@@ -21,6 +21,9 @@ Invariants covered (see roadmap):
                             test_edge_brand_new_branch_first_push
   + retention override   -> test_retention_override_via_config_respected
   + pure boundary logic  -> test_commits_to_trim_* unit tests
+  + streamed walk        -> test_walk_history_matches_git_log_and_trim_stops_early
+  + plumbing-only rewrite -> test_trim_preserves_kept_metadata_without_touching_the_worktree
+  + trim hysteresis      -> test_commits_to_trim_waits_for_trigger / test_trim_waits_for_the_slack
 
 Run with:  python -m pytest tests/test_integration_trim.py -q
 """
@@ -34,6 +37,7 @@ from git import Repo
 
 from gitops_agent.agent import (
     _commits_to_trim,
+    _walk_history,
     shared_clone_path,
     trim_monitoring_history,
 )
@@ -78,7 +82,7 @@ def _commit_dated(repo_dir, filename, content, message, epoch):
     (Path(repo_dir) / filename).write_text(content)
     sp.run(["git", "add", "-A"], cwd=str(repo_dir), check=True, capture_output=True)
     # --allow-empty so a deliberately-repeated snapshot (no-op diff) still creates a distinct commit;
-    # this lets tests exercise the rebase's --empty=keep behaviour.
+    # this lets tests check that the trim's replay never drops an empty-diff commit.
     sp.run(
         ["git", "commit", "--allow-empty", "-m", message],
         cwd=str(repo_dir), env=_git_env_dated(epoch), check=True, capture_output=True,
@@ -190,7 +194,7 @@ def test_trim_keeps_window_squashes_old(env, tmp_path):
 
 # --------------------------------------------------------------------------------------
 # Kept-window integrity: a kept-window commit whose snapshot is a NO-OP diff vs its parent must NOT
-# be silently dropped by the rebase (--empty=keep). Status snapshots can legitimately repeat content,
+# be silently dropped by the replay. Status snapshots can legitimately repeat content,
 # so dropping an "empty" replayed commit would shorten the remote history before a force-push.
 # --------------------------------------------------------------------------------------
 
@@ -328,7 +332,7 @@ def test_edge_brand_new_branch_first_push(env, tmp_path):
     applications = {name: f"{deploy_url}@main" for name in apps_meta}
     # Tiny retention so the trim logic is definitely exercised on the very first push.
     agent = build_agent(tmp_path, applications)
-    agent.config["monitoring_history_retention_days"] = 0.0001
+    agent.retention_days = 0.0001
 
     bare = tmp_path / "remotes" / "deploy.git"
     assert remote_branch_commits(bare, "main-monitoring") == []  # branch doesn't exist yet
@@ -376,7 +380,7 @@ def test_continuity_next_run_appends_normally(env, tmp_path):
     apps_meta["app1"]["code_commit_hash"] = second1
     rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
     agent2 = build_agent(tmp_path, applications)
-    agent2.config["monitoring_history_retention_days"] = 30
+    agent2.retention_days = 30
     agent2.run_once()
 
     # The old marker is gone, replaced by a synthetic base; a fresh status commit sits on top.
@@ -392,7 +396,7 @@ def test_continuity_next_run_appends_normally(env, tmp_path):
     apps_meta["app1"]["code_commit_hash"] = first1
     rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
     agent3 = build_agent(tmp_path, applications)
-    agent3.config["monitoring_history_retention_days"] = 30
+    agent3.retention_days = 30
     before_count = len(remote_branch_commits(bare, "main-monitoring"))
     agent3.run_once()  # must not raise
     after_count = len(remote_branch_commits(bare, "main-monitoring"))
@@ -464,7 +468,7 @@ def test_retention_override_loaded_from_disk_config(env, tmp_path):
 
 def test_retention_override_through_run_once(env, tmp_path):
     # End-to-end: a tiny config retention makes even a just-made commit "old" on the SECOND status,
-    # so the second pass trims. Confirms self.config.get(...) wiring in flush_status.
+    # so the second pass trims. Confirms the agent's retention_days wiring in flush_status.
     url1, first1, second1 = make_app_code_repo_two_commits(tmp_path, "app1")
     cp1 = tmp_path / "deployed" / "app1"
     apps_meta = {"app1": app_meta_entry(url1, first1, cp1)}
@@ -476,7 +480,7 @@ def test_retention_override_through_run_once(env, tmp_path):
     # 0.0001 days ~= 8.6s; the first status commit will be older than that by the time the second
     # status is produced after we sleep briefly -- but to avoid sleeping, set retention to 0 so ANY
     # pre-existing commit counts as old.
-    agent.config["monitoring_history_retention_days"] = 0
+    agent.retention_days = 0
     agent.run_once()  # first status commit
     apps_meta["app1"]["code_commit_hash"] = second1
     rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
@@ -484,3 +488,96 @@ def test_retention_override_through_run_once(env, tmp_path):
 
     subjects = _subjects(bare)
     assert any(s.startswith("📉 History trimmed:") for s in subjects), subjects
+
+
+# --------------------------------------------------------------------------------------
+# The streamed walk (_walk_history) yields what git log has, and a trim only reads back from HEAD as far
+# as the boundary -- the history older than it is never walked.
+# --------------------------------------------------------------------------------------
+
+def test_walk_history_matches_git_log_and_trim_stops_early(env, tmp_path, monkeypatch):
+    dated = [("old1", 50), ("old2", 45), ("old3", 40), ("recent1", 5), ("recent2", 1)]
+    bare, clone, branch = _make_monitoring_clone_with_history(tmp_path, "deploy", dated)
+    repo = Repo(str(clone))
+    oldest_first = list(repo.iter_commits(branch))[::-1]
+    cutoff = time.time() - 30 * DAY
+
+    walked = list(_walk_history(repo, branch))
+    assert walked == [(c.hexsha, c.committed_date, 0) for c in oldest_first[::-1]]
+    assert _commits_to_trim([ts for _sha, ts, _size in walked[::-1]], cutoff) == (True, 2)
+
+    lines_read = []
+
+    class CountingLines:
+        def __init__(self, stream):
+            self.stream = stream
+
+        def __iter__(self):
+            for line in self.stream:
+                lines_read.append(line)
+                yield line
+
+        def close(self):
+            self.stream.close()
+
+    def counting_rev_list(git, *args, **kwargs):
+        process = git._call_process("rev_list", *args, **kwargs)
+        process.proc.stdout = CountingLines(process.proc.stdout)
+        return process
+
+    monkeypatch.setattr(type(repo.git), "rev_list", counting_rev_list, raising=False)
+    assert trim_monitoring_history(repo, branch, retention_days=30) is True
+    assert len(lines_read) == 3, "the two kept commits and the boundary, nothing older"
+
+
+# --------------------------------------------------------------------------------------
+# The rewrite is plumbing only: kept commits keep their authors/committers/dates/messages, the branch
+# moves in one reflog entry, and the working tree (even an uncommitted file in it) is left alone.
+# --------------------------------------------------------------------------------------
+
+def _metadata(repo_dir, rev_range):
+    out = sp.run(
+        ["git", "log", "--pretty=%T %an %ae %at %cn %ce %ct %B", rev_range],
+        cwd=str(repo_dir), capture_output=True, text=True, check=True,
+    )
+    return out.stdout
+
+
+def test_trim_preserves_kept_metadata_without_touching_the_worktree(env, tmp_path):
+    dated = [("old", 50), ("recentA", 5), ("recentA", 3), ("recentB", 1)]
+    bare, clone, branch = _make_monitoring_clone_with_history(tmp_path, "deploy", dated)
+    repo = Repo(str(clone))
+    kept_before = _metadata(clone, f"{branch}~3..{branch}")
+    (Path(clone) / "scratch.txt").write_text("untracked\n")
+    reflog_before = len(repo.git.reflog(branch).splitlines())
+
+    assert trim_monitoring_history(repo, branch, retention_days=30) is True
+
+    assert _metadata(clone, f"{branch}~3..{branch}") == kept_before
+    assert len(repo.git.reflog(branch).splitlines()) == reflog_before + 1
+    assert (Path(clone) / "scratch.txt").read_text() == "untracked\n"
+    assert repo.git.status("--porcelain") == "?? scratch.txt"
+    assert not (Path(clone) / ".git" / "rebase-merge").exists()
+
+
+# --------------------------------------------------------------------------------------
+# Hysteresis: a commit that has only just aged out of the window does not trigger a rewrite; one older
+# than the window plus MONITORING_HISTORY_TRIM_SLACK of it does, and then trims back to the window.
+# --------------------------------------------------------------------------------------
+
+def test_commits_to_trim_waits_for_trigger():
+    assert _commits_to_trim([40, 60, 70], cutoff_ts=50, trigger_ts=30) == (False, None)
+    assert _commits_to_trim([20, 40, 60, 70], cutoff_ts=50, trigger_ts=30) == (True, 1)
+
+
+def test_trim_waits_for_the_slack(env, tmp_path):
+    dated = [("aged", 31), ("recent", 1)]  # 1 day past a 30-day window, inside the 3-day slack
+    bare, clone, branch = _make_monitoring_clone_with_history(tmp_path, "deploy", dated)
+    repo = Repo(str(clone))
+    assert trim_monitoring_history(repo, branch, retention_days=30) is False
+
+    dated = [("older", 34), ("aged", 31), ("recent", 1)]
+    bare, clone, branch = _make_monitoring_clone_with_history(tmp_path / "second", "deploy", dated)
+    repo = Repo(str(clone))
+    assert trim_monitoring_history(repo, branch, retention_days=30) is True
+    assert len(_subjects(clone)) == 2, "trimmed back to the window: recent + base"
@@ -0,0 +1,87 @@
+"""Idle-time git maintenance of the agent's clones (gitops_agent.maintenance).
+
+Runs the real maintenance steps against REAL local repos under tmp_path, reusing the helpers of
+tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_maintenance.py -q
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+
+from gitops_agent import maintenance
+
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    commit_all,
+    make_app_code_repo,
+    make_bare_repo,
+    make_deploy_repo,
+    working_clone,
+)
+
+
+def _loose_objects(path):
+    objects = Path(path) / ".git" / "objects"
+    return sum(1 for d in objects.iterdir() if len(d.name) == 2 for _ in d.iterdir())
+
+
+def test_due_orders_never_maintained_first_and_honours_the_interval():
+    scheduler = maintenance.MaintenanceScheduler(interval=100, budget=10)
+    scheduler.last_run = {"/a": 1_000, "/b": 950}
+    assert scheduler.due(["/a", "/b", "/c"], 1_060) == [Path("/c"), Path("/b")]
+    assert scheduler.due(["/a", "/b"], 1_100) == [Path("/b"), Path("/a")]
+    with pytest.raises(ValueError):
+        maintenance.MaintenanceScheduler(interval=-1)
+
+
+def test_maintenance_repacks_and_writes_the_commit_graph(tmp_path):
+    clone = working_clone(make_bare_repo(tmp_path / "remotes" / "r.git"), tmp_path / "clone")
+    for i in range(5):
+        (Path(clone.working_tree_dir) / f"f{i}").write_text(str(i))
+        commit_all(clone, f"c{i}")
+    before = _loose_objects(clone.working_tree_dir)
+
+    scheduler = maintenance.MaintenanceScheduler(interval=3600, budget=60)
+    assert scheduler.run([clone.working_tree_dir], window=120) == [Path(clone.working_tree_dir)]
+
+    info = Path(clone.git_dir) / "objects" / "info"
+    assert (info / "commit-graph").exists() or (info / "commit-graphs").exists()
+    assert _loose_objects(clone.working_tree_dir) < before
+    # Maintained clones are not due again within the interval.
+    assert scheduler.run([clone.working_tree_dir], window=120) == []
+
+
+def test_a_reconcile_request_interrupts_a_running_step(tmp_path, monkeypatch):
+    clone = working_clone(make_bare_repo(tmp_path / "remotes" / "r.git"), tmp_path / "clone")
+    monkeypatch.setattr(maintenance, "MAINTENANCE_STEPS", (("-c", "alias.slow=!sleep 30", "slow"),))
+    monkeypatch.setattr(maintenance, "STOP_POLL_SECONDS", 0.05)
+    asked = time.monotonic() + 0.3
+
+    scheduler = maintenance.MaintenanceScheduler(interval=3600, budget=60)
+    started = time.monotonic()
+    assert scheduler.run([clone.working_tree_dir], 120, lambda: time.monotonic() >= asked) == []
+    assert time.monotonic() - started < 5
+    # Not recorded: the clone is retried in the next idle window.
+    assert scheduler.due([clone.working_tree_dir], time.time()) == [Path(clone.working_tree_dir)]
+
+
+def test_agent_maintains_its_clones(env, tmp_path):
+    url, commit = make_app_code_repo(tmp_path, "app1")
+    deployed = tmp_path / "deployed" / "app1"
+    deploy_url = make_deploy_repo(tmp_path, "deploy", {"app1": app_meta_entry(url, commit, deployed)})
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main"})
+    agent.run_once()
+
+    clones = agent.managed_clones()
+    assert deployed in clones
+    assert len(clones) == 3  # deployment-config clone, its -monitoring clone, and app1's code
+
+    assert set(agent.maintain(600)) == set(clones)
+    assert agent.maintain(600) == []
+    agent.trigger.request()
+    agent.maintenance.last_run.clear()
+    assert agent.maintain(600) == []
@@ -0,0 +1,70 @@
+"""Tests for the Prometheus metrics registry and exporters (gitops_agent.metrics).
+
+The registry is unit tested; the agent-side series come from whole reconcile passes against REAL local
+bare repos from tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_metrics.py -q
+"""
+
+from urllib.request import urlopen
+
+import pytest
+
+from gitops_agent import metrics
+
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    make_app_code_repo,
+    make_deploy_repo,
+)
+
+
+def test_registry_renders_the_exposition_format():
+    registry = metrics.Metrics(buckets=(1, 10))
+    registry.observe("gitops_agent_pass_duration_seconds", 0.5)
+    registry.observe("gitops_agent_pass_duration_seconds", 5)
+    registry.inc("gitops_agent_monitoring_pushes_total", group="deploy@main", result="ok")
+    registry.inc("gitops_agent_monitoring_pushes_total", group="deploy@main", result="ok")
+    registry.set("gitops_agent_app_healthy", 1, replace=("group", "app"), group="g", app="a", status='✅ "ok"')
+    registry.set("gitops_agent_app_healthy", 0, replace=("group", "app"), group="g", app="a", status="❌ failed")
+
+    text = registry.render()
+    assert "# TYPE gitops_agent_pass_duration_seconds histogram" in text
+    assert 'gitops_agent_pass_duration_seconds_bucket{le="1"} 1' in text
+    assert 'gitops_agent_pass_duration_seconds_bucket{le="10"} 2' in text
+    assert 'gitops_agent_pass_duration_seconds_bucket{le="+Inf"} 2' in text
+    assert "gitops_agent_pass_duration_seconds_sum 5.5" in text
+    assert 'gitops_agent_monitoring_pushes_total{group="deploy@main",result="ok"} 2' in text
+    # A status change replaces the app's series instead of leaving the old one behind.
+    assert 'gitops_agent_app_healthy{app="a",group="g",status="❌ failed"} 0' in text
+    assert text.count("gitops_agent_app_healthy{") == 1
+    with pytest.raises(ValueError):
+        registry.inc("no_such_metric")
+
+
+def test_agent_exports_health_and_latency(env, tmp_path):
+    url, commit = make_app_code_repo(tmp_path, "app1")
+    apps_meta = {"app1": app_meta_entry(url, commit, tmp_path / "deployed" / "app1")}
+    deploy_url = make_deploy_repo(tmp_path, "deploy", apps_meta)
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main"})
+    textfile = tmp_path / "textfile" / "gitops_agent.prom"
+    agent.config["metrics_textfile"] = str(textfile)
+    agent.run_once()
+    agent.run_once()
+
+    text = textfile.read_text()
+    assert 'gitops_agent_app_healthy{app="app1",group="deploy@main",status="✅ healthy"} 1' in text
+    assert "gitops_agent_pass_duration_seconds_count 2" in text
+    assert 'gitops_agent_config_fetch_seconds_count{group="deploy@main"} 2' in text
+    assert 'gitops_agent_group_passes_total{group="deploy@main",outcome="changed"} 1' in text
+    assert 'gitops_agent_group_passes_total{group="deploy@main",outcome="idle"} 1' in text
+    assert 'gitops_agent_monitoring_pushes_total{group="deploy@main",result="ok"} 1' in text
+    assert 'gitops_agent_last_success_timestamp_seconds{group="deploy@main"}' in text
+
+    server = metrics.start_metrics_server(agent.metrics, 0)
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=10) as response:
+            assert response.read().decode("utf-8") == agent.metrics.render()
+    finally:
+        server.shutdown()
@@ -0,0 +1,96 @@
+"""Tests for the --plan dry run (GitOpsAgent.plan, gitops_agent.plan).
+
+Runs against REAL local bare repos from tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_plan.py -q
+"""
+
+import shutil
+
+import git
+
+from gitops_agent import git_operations as gops
+from gitops_agent import plan as planning
+from gitops_agent.agent import shared_clone_path
+
+from tests.test_integration_monitoring import remote_branch_commits, rewrite_deploy_meta
+
+
+def _app_with_hooks(single_app, tmp_path):
+    setup = single_app(
+        files={"testsite/app1.conf": "port = 80\n"},
+        config_files=[{"src": "testsite/app1.conf", "dst": str(tmp_path / "deployed" / "app1.conf")}],
+        pre_updation_command="true",
+        post_updation_command="echo restarted",
+    )
+    return setup.agent, setup.apps_meta, setup.first, setup.second
+
+
+def test_nothing_to_do_after_a_pass(single_app, tmp_path):
+    agent, _apps_meta, first, _second = _app_with_hooks(single_app, tmp_path)
+    agent.run_once()
+
+    (group,) = agent.plan()
+    assert group["group"] == "deploy@main" and "error" not in group
+    assert group["apps"]["app1"]["update"] is False
+    assert group["apps"]["app1"]["current"] == first
+    assert planning.format_plan([group]).endswith("0 of 1 apps would be updated.")
+
+
+def test_a_new_commit_is_planned_without_being_applied(single_app, tmp_path):
+    agent, apps_meta, first, second = _app_with_hooks(single_app, tmp_path)
+    agent.run_once()
+    monitoring_before = remote_branch_commits(tmp_path / "remotes" / "deploy.git", "main-monitoring")
+    config_clone = git.Repo(shared_clone_path(f"file://{tmp_path / 'remotes' / 'deploy.git'}", "main"))
+    config_head = config_clone.head.commit.hexsha
+
+    apps_meta["app1"]["code_commit_hash"] = second
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+
+    # Without --fetch the plan reads the state of the last pass's fetch.
+    assert agent.plan()[0]["apps"]["app1"]["update"] is False
+
+    (group,) = agent.plan(["app1"], fetch=True)
+    app = group["apps"]["app1"]
+    assert app["update"] is True and app["clone"] is False
+    assert (app["current"], app["desired"]) == (first, second)
+    assert app["hooks"] == {"pre": "true", "post": "echo restarted"}
+    text = planning.format_plan([group])
+    assert f"app1: update {first[:10]} -> {second[:10]}" in text
+    assert "1 of 1 apps would be updated." in text
+
+    # Nothing was applied: not the checkout, not the config clone's worktree, not the monitoring branch.
+    assert git.Repo(tmp_path / "deployed" / "app1").head.commit.hexsha == first
+    assert config_clone.head.commit.hexsha == config_head
+    assert remote_branch_commits(tmp_path / "remotes" / "deploy.git", "main-monitoring") == monitoring_before
+
+
+def test_config_file_drift_is_listed(single_app, tmp_path):
+    agent, _apps_meta, _first, _second = _app_with_hooks(single_app, tmp_path)
+    agent.run_once()
+    dst = tmp_path / "deployed" / "app1.conf"
+    dst.write_text("port = 8080\n")
+
+    app = agent.plan()[0]["apps"]["app1"]
+    assert app["update"] is True and app["config_files"] == [str(dst)]
+    assert f"config file differs: {dst}" in planning.format_plan(agent.plan())
+    assert dst.read_text() == "port = 8080\n"
+
+
+def test_a_group_never_cloned_is_reported(single_app, tmp_path):
+    agent, _apps_meta, _first, _second = _app_with_hooks(single_app, tmp_path)
+    (group,) = agent.plan()
+    assert "not cloned yet" in group["error"]
+    assert not (tmp_path / "deployed" / "app1").exists()
+
+
+def test_an_app_whose_checkout_is_no_longer_a_repository_is_reported(single_app, tmp_path):
+    agent, _apps_meta, _first, _second = _app_with_hooks(single_app, tmp_path)
+    agent.run_once()
+    gops.close_all_repo_sessions()
+    shutil.rmtree(tmp_path / "deployed" / "app1" / ".git")
+
+    (group,) = agent.plan()
+    assert "error" not in group
+    assert "InvalidGitRepositoryError" in group["apps"]["app1"]["error"]
+    assert "app1: cannot plan: InvalidGitRepositoryError" in planning.format_plan([group])
@@ -0,0 +1,109 @@
+"""Tests for rate-limited monitoring pushes (gitops_agent.publishing.PublishPolicy in flush_status).
+
+The end-to-end tests run whole reconcile passes against REAL local bare repos from
+tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_publish_policy.py -q
+"""
+
+import shutil
+import subprocess as sp
+
+import pytest
+
+from gitops_agent.publishing import PublishPolicy
+
+from tests.test_integration_monitoring import (
+    remote_branch_commits,
+    rewrite_deploy_meta,
+    status_commits,
+)
+
+
+def _healthy(body):
+    return body == "ok"
+
+
+def test_policy_holds_only_health_neutral_changes_inside_the_interval():
+    policy = PublishPolicy(min_interval=60)
+    published = {"bodies": {"a": "ok", "b": "bad"}, "pushed_at": 100}
+
+    assert policy.should_hold(published, {"a": "ok", "b": "bad"}, 130, _healthy)
+    assert not policy.should_hold(published, {"a": "ok", "b": "bad"}, 160, _healthy), "interval elapsed"
+    assert not policy.should_hold(published, {"a": "bad", "b": "bad"}, 130, _healthy), "a became unhealthy"
+    assert not policy.should_hold(published, {"a": "ok", "b": "bad", "c": "ok"}, 130, _healthy), "new app"
+    assert not policy.should_hold({**published, "pushed_at": None}, {"a": "ok"}, 130, _healthy)
+
+    assert PublishPolicy(60, push_on_health_change=False).should_hold(published, {"a": "bad"}, 130, _healthy)
+    assert not PublishPolicy(0).should_hold(published, {"a": "ok"}, 130, _healthy)
+    with pytest.raises(ValueError):
+        PublishPolicy(-1)
+
+
+def _rate_limited(single_app):
+    setup = single_app()
+    setup.agent.publish_policy = PublishPolicy(3600)
+    return setup.agent, setup.apps_meta, setup.first, setup.second, setup.bare
+
+
+def _subject(bare, branch="main-monitoring"):
+    head = remote_branch_commits(bare, branch)[0]
+    return sp.run(["git", "log", "-1", "--pretty=%s", head], cwd=str(bare), capture_output=True, text=True).stdout
+
+
+def test_flapping_change_is_held_and_health_change_is_pushed_as_a_digest(single_app, tmp_path):
+    agent, apps_meta, first, second, bare = _rate_limited(single_app)
+
+    agent.run_once()
+    assert status_commits(bare) == 1
+
+    # Still healthy, just at another commit: held back.
+    apps_meta["app1"]["code_commit_hash"] = second
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    agent.run_once()
+    assert status_commits(bare) == 1
+
+    # The post-command now fails: pushed at once, carrying the held change with it.
+    apps_meta["app1"]["code_commit_hash"] = first
+    apps_meta["app1"]["post_updation_command"] = "exit 3"
+    shutil.rmtree(tmp_path / "rewrite")
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    agent.run_once()
+    assert status_commits(bare) == 2
+    assert _subject(bare).startswith("⚠️ Status:")
+    assert "(digest of 2 updates)" in _subject(bare)
+
+
+def test_held_change_goes_out_once_the_interval_has_passed(single_app, tmp_path):
+    agent, apps_meta, first, second, bare = _rate_limited(single_app)
+
+    agent.run_once()
+    apps_meta["app1"]["code_commit_hash"] = second
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    agent.run_once()
+    assert status_commits(bare) == 1
+
+    for published in agent._published_feedback.values():
+        published["pushed_at"] -= 3600
+    agent.run_once()
+    assert status_commits(bare) == 2
+
+
+def test_a_change_held_for_several_passes_counts_once(single_app, tmp_path):
+    agent, apps_meta, first, second, bare = _rate_limited(single_app)
+    agent.run_once()
+
+    # One healthy change, still pending after several passes.
+    apps_meta["app1"]["code_commit_hash"] = second
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    for _ in range(4):
+        agent.run_once()
+    assert status_commits(bare) == 1
+
+    apps_meta["app1"]["code_commit_hash"] = first
+    apps_meta["app1"]["post_updation_command"] = "exit 3"
+    shutil.rmtree(tmp_path / "rewrite")
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    agent.run_once()
+    assert status_commits(bare) == 2
+    assert "(digest of 2 updates)" in _subject(bare)
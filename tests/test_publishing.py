@@ -0,0 +1,147 @@
+"""Tests for coalesced monitoring pushes (gitops_agent.publishing + GitOpsAgent.push_batch).
+
+Runs whole reconcile passes against REAL local bare repos from tests/test_integration_monitoring.py,
+with two groups that share one deployment-config remote (branches main and staging).
+
+Run with:  python -m pytest tests/test_publishing.py -q
+"""
+
+import pytest
+from git import Repo
+
+from gitops_agent import execution
+from gitops_agent import publishing
+from gitops_agent.agent import shared_clone_path
+
+from tests.test_integration_monitoring import (
+    app_meta_entry,
+    build_agent,
+    make_app_code_repo,
+    make_deploy_repo,
+    push,
+    rewrite_deploy_meta,
+    status_commits,
+)
+
+
+def _two_branch_setup(tmp_path):
+    url, commit = make_app_code_repo(tmp_path, "app1")
+    apps_meta = {
+        "app1": app_meta_entry(url, commit, tmp_path / "deployed" / "app1"),
+        "app2": app_meta_entry(url, commit, tmp_path / "deployed" / "app2"),
+    }
+    deploy_url = make_deploy_repo(tmp_path, "deploy", apps_meta)
+    push(Repo(tmp_path / "work" / "deploy"), "staging")
+    agent = build_agent(tmp_path, {"app1": f"{deploy_url}@main", "app2": f"{deploy_url}@staging"})
+    return agent, deploy_url, tmp_path / "remotes" / "deploy.git", apps_meta
+
+
+def _record_pushes(monkeypatch):
+    pushes = []
+    real = execution.ExecutionEngine.push
+
+    async def recording(self, local_path, *args, env=None):
+        pushes.append(args)
+        return await real(self, local_path, *args, env=env)
+
+    monkeypatch.setattr(execution.ExecutionEngine, "push", recording)
+    return pushes
+
+
+def test_branches_of_one_remote_go_out_in_a_single_push(env, tmp_path, monkeypatch):
+    agent, deploy_url, bare, _apps_meta = _two_branch_setup(tmp_path)
+    pushes = _record_pushes(monkeypatch)
+
+    agent.run_once()
+
+    assert len(pushes) == 1, pushes
+    assert sorted(spec.rsplit("/", 1)[1] for spec in pushes[0][1:]) == ["main-monitoring", "staging-monitoring"]
+    assert status_commits(bare, "main-monitoring") == 1
+    assert status_commits(bare, "staging-monitoring") == 1
+    # Each clone tracks what was pushed for it, so the next pass sees nothing left to push.
+    for branch in ("main", "staging"):
+        clone = Repo(shared_clone_path(deploy_url, branch) + "-monitoring")
+        assert clone.commit(f"origin/{branch}-monitoring") == clone.commit(f"{branch}-monitoring")
+        assert clone.branches[f"{branch}-monitoring"].tracking_branch().name == f"origin/{branch}-monitoring"
+
+
+def test_rejected_branch_does_not_block_the_others(env, tmp_path, monkeypatch):
+    agent, _deploy_url, bare, _apps_meta = _two_branch_setup(tmp_path)
+    hook = bare / "hooks" / "update"
+    hook.write_text('#!/bin/sh\n[ "$1" = refs/heads/staging-monitoring ] && exit 1\nexit 0\n')
+    hook.chmod(0o755)
+    pushes = _record_pushes(monkeypatch)
+
+    with pytest.raises(Exception):
+        agent.run_once()
+
+    assert len(pushes) == 3, "one combined push, then one per branch"
+    assert status_commits(bare, "main-monitoring") == 1
+    assert status_commits(bare, "staging-monitoring") == 0
+
+    hook.unlink()
+    agent.run_once()
+    assert status_commits(bare, "staging-monitoring") == 1, "the failed group is republished next pass"
+
+
+def test_a_slow_group_does_not_hold_back_another_remotes_push(env, tmp_path, monkeypatch):
+    marker = tmp_path / "slow-done"
+    url, commit = make_app_code_repo(tmp_path, "app1")
+    applications = {}
+    for slug, command in (("fast", "true"), ("slow", f"sleep 2; touch {marker}")):
+        meta = {f"{slug}app": app_meta_entry(url, commit, tmp_path / "deployed" / slug)}
+        meta[f"{slug}app"]["post_updation_command"] = command
+        applications[f"{slug}app"] = f"{make_deploy_repo(tmp_path, slug, meta)}@main"
+    agent = build_agent(tmp_path, applications)
+    pushed_before_slow_finished = []
+    real = execution.ExecutionEngine.push
+
+    async def recording(self, local_path, *args, env=None):
+        pushed_before_slow_finished.append((args[0].rsplit("/", 1)[1], not marker.exists()))
+        return await real(self, local_path, *args, env=env)
+
+    monkeypatch.setattr(execution.ExecutionEngine, "push", recording)
+    ssh_env_clones = []
+    monkeypatch.setattr(agent, "ssh_env", lambda local_path: ssh_env_clones.append(local_path) or {})
+
+    agent.run_once()
+
+    assert sorted(pushed_before_slow_finished) == [("fast.git", True), ("slow.git", False)]
+    # The environment of each remote's push is built from that remote's own clone.
+    assert sorted(ssh_env_clones) == sorted(
+        shared_clone_path(applications[f"{slug}app"][: -len("@main")], "main") + "-monitoring"
+        for slug in ("fast", "slow")
+    )
+
+
+def test_a_failed_push_is_rebuilt_and_pushed_next_pass(env, tmp_path):
+    agent, _deploy_url, bare, apps_meta = _two_branch_setup(tmp_path)
+    agent.run_once()
+    assert status_commits(bare, "main-monitoring") == 1
+
+    hook = bare / "hooks" / "update"
+    hook.write_text('#!/bin/sh\n[ "$1" = refs/heads/main-monitoring ] && exit 1\nexit 0\n')
+    hook.chmod(0o755)
+    apps_meta["app1"]["post_updation_command"] = "exit 3"
+    rewrite_deploy_meta(tmp_path, "deploy", apps_meta)
+    with pytest.raises(Exception):
+        agent.run_once()
+    assert status_commits(bare, "main-monitoring") == 1
+
+    hook.unlink()
+    agent.run_once()
+    assert status_commits(bare, "main-monitoring") == 2
+
+
+def test_ssh_multiplexing_defers_to_the_operators_ssh_command(tmp_path, monkeypatch):
+    monkeypatch.delenv("GIT_SSH_COMMAND", raising=False)
+    monkeypatch.delenv("GIT_SSH", raising=False)
+    env = publishing.ssh_env(tmp_path / "ctl", 60)
+    assert "ControlPath=" in env["GIT_SSH_COMMAND"] and (tmp_path / "ctl").is_dir()
+    assert publishing.ssh_env(tmp_path / "ctl", 0) == {}
+
+    repo = Repo.init(tmp_path / "repo")
+    repo.git.config("core.sshCommand", "ssh -i /deploy/key")
+    assert publishing.ssh_env(tmp_path / "ctl", 60, repo=repo) == {}
+    monkeypatch.setenv("GIT_SSH_COMMAND", "ssh -v")
+    assert publishing.ssh_env(tmp_path / "ctl", 60) == {}
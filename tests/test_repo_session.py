@@ -0,0 +1,79 @@
+"""Tests for the per-path repo sessions in gitops_agent.git_operations (repo_session & friends).
+
+Uses a throwaway local repo; git subprocesses are counted by wrapping GitPython's process launcher.
+
+Run with:  python -m pytest tests/test_repo_session.py -q
+"""
+
+import shutil
+import subprocess as sp
+
+import git.cmd
+import pytest
+from git import Repo
+
+from gitops_agent import git_operations as gops
+from gitops_agent.agent import compare_git_hashes
+
+
+@pytest.fixture
+def clone(tmp_path):
+    path = tmp_path / "repo"
+    repo = Repo.init(path, initial_branch="main")
+    repo.git.config("user.name", "tester")
+    repo.git.config("user.email", "tester@example.com")
+    (path / "a.txt").write_text("a\n")
+    repo.git.add(all=True)
+    repo.git.commit("-m", "first line\n\nbody text")
+    yield path
+    gops.close_repo_session(path)
+
+
+def _count_spawns(monkeypatch):
+    spawned = []
+    real = git.cmd.safer_popen
+    monkeypatch.setattr(git.cmd, "safer_popen", lambda cmd, **kw: spawned.append(cmd) or real(cmd, **kw))
+    return spawned
+
+
+def test_session_is_reused_and_replaced_when_clone_is_recreated(clone):
+    first = gops.repo_session(clone)
+    assert gops.repo_session(clone) is first
+    assert gops.repo_session(clone / "a.txt" / "..") is first, "keyed on the resolved path"
+
+    shutil.rmtree(clone)
+    Repo.init(clone)
+    assert gops.repo_session(clone) is not first
+
+
+def test_check_git_status_matches_git_log_and_is_porcelain(clone):
+    status, latest = gops.check_git_status(clone)
+    expected = sp.run(
+        ["git", "log", "-1", "--pretty=format:'%h - %s (%an, %ad)'"],
+        cwd=clone, capture_output=True, text=True, check=True,
+    ).stdout
+    assert latest == expected
+    assert status.startswith("## main")
+
+    (clone / "b.txt").write_text("new\n")
+    status, _ = gops.check_git_status(clone)
+    assert "?? b.txt" in status.splitlines()
+
+
+def test_steady_state_costs_at_most_one_spawn(clone, monkeypatch):
+    head = Repo(clone).head.commit.hexsha
+    gops.check_git_status(clone)  # warm the session and its persistent cat-file process
+    spawned = _count_spawns(monkeypatch)
+
+    assert compare_git_hashes(clone, head)
+    gops.check_git_status(clone)
+
+    assert len(spawned) == 1, spawned
+    assert "status" in spawned[0]
+
+
+def test_rebase_in_progress_is_detected_on_disk(clone):
+    repo = gops.repo_session(clone)
+    assert not gops.rebase_in_progress(repo)
+    (clone / ".git" / "rebase-merge").mkdir()
+    assert gops.rebase_in_progress(repo)
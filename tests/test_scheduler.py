@@ -0,0 +1,65 @@
+"""Tests for the per-group adaptive polling schedule (gitops_agent.scheduler.GroupScheduler).
+
+Pure bookkeeping tests: the scheduler takes `now` from the caller and a pluggable random source, so
+every delay here is exact -- no sleeping, no repos.
+"""
+
+import pytest
+
+from gitops_agent.scheduler import CHANGED, FAILED, IDLE, SKIPPED, GroupScheduler
+
+
+def _sched(**kwargs):
+    # rand=0.5 -> jitter factor exactly 1.0, so delays are deterministic
+    params = dict(min_interval=60, max_interval=300, jitter=0.1, max_backoff=1000, rand=lambda: 0.5)
+    params.update(kwargs)
+    return GroupScheduler(**params)
+
+
+def test_new_groups_are_due_immediately_and_removed_ones_dropped():
+    s = _sched()
+    s.sync(["a", "b"], now=0)
+    assert s.due(0) == ["a", "b"]
+    s.record("a", IDLE, now=0)
+    s.sync(["a", "c"], now=10)
+    assert s.due(10) == ["c"]
+    assert s.record("b", IDLE, now=10) is None, "a group no longer configured is not tracked"
+
+
+def test_idle_grows_toward_max_and_change_resets_to_min():
+    s = _sched()
+    s.sync(["a"], now=0)
+    assert [s.record("a", IDLE, now=0) for _ in range(4)] == [120, 240, 300, 300]
+    assert s.record("a", CHANGED, now=0) == 60
+
+
+def test_failures_back_off_exponentially_then_recover_to_idle_interval():
+    s = _sched()
+    s.sync(["a"], now=0)
+    s.record("a", IDLE, now=0)  # idle interval now 120
+    assert [s.record("a", FAILED, now=0) for _ in range(5)] == [120, 240, 480, 960, 1000]
+    # Recovery resumes the idle schedule rather than staying backed off.
+    assert s.record("a", IDLE, now=0) == 240
+
+
+def test_skipped_keeps_current_interval():
+    s = _sched()
+    s.sync(["a"], now=0)
+    assert s.record("a", SKIPPED, now=0) == 60
+
+
+@pytest.mark.parametrize(("rand", "expected"), [(0.0, 54.0), (1.0, 66.0)])
+def test_jitter_bounds(rand, expected):
+    s = _sched(rand=lambda: rand)
+    s.sync(["a"], now=0)
+    assert s.record("a", CHANGED, now=0) == pytest.approx(expected)
+
+
+def test_next_wakeup_is_earliest_due_group():
+    s = _sched()
+    s.sync(["a", "b"], now=0)
+    assert s.next_wakeup(0) == 0
+    s.record("a", CHANGED, now=0)  # due at 60
+    s.record("b", IDLE, now=0)  # due at 120
+    assert s.next_wakeup(10) == 50
+    assert s.due(61) == ["a"]
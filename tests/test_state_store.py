@@ -0,0 +1,96 @@
+"""Tests for the persistent agent state (gitops_agent.state) and the warm restart it enables.
+
+Restarts are simulated by building a second GitOpsAgent over the same GITOPS_AGENT_HOME, against REAL
+local bare repos from tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_state_store.py -q
+"""
+
+import subprocess as sp
+from pathlib import Path
+
+from gitops_agent import scheduler as sched
+from gitops_agent import state
+from gitops_agent.agent import group_apps_by_repo, shared_clone_path
+
+from tests.test_feedback_cache import _record_monitoring_work
+from tests.test_integration_monitoring import build_agent, rewrite_deploy_meta, status_commits
+
+KEY = ("file:///repo", "main")
+
+
+def test_state_round_trips_and_is_scoped_to_the_infra(tmp_path):
+    path = tmp_path / "agent-state.json"
+    saved = state.AgentState(path, "site")
+    saved.record_group(KEY, config_commit="abc")
+    saved.record_published(KEY, {"app1": {"status": "ok"}}, "f00")
+    saved.record_applied("app1", "c0ffee")
+    saved.save()
+    assert not path.with_name(path.name + ".tmp").exists()
+
+    loaded = state.AgentState(path, "site")
+    assert loaded.group(KEY)["config_commit"] == "abc"
+    assert loaded.group(KEY)["feedback_digest"] == state.feedback_digest({"app1": {"status": "ok"}})
+    assert loaded.applied_commit("app1") == "c0ffee"
+
+    assert state.AgentState(path, "other-site").group(KEY) == {}
+    path.write_text("{not json")
+    assert state.AgentState(path, "site").applied_commit("app1") is None
+
+
+def test_restart_with_nothing_changed_publishes_nothing(single_app, tmp_path, monkeypatch):
+    setup = single_app()
+    agent, bare = setup.agent, setup.bare
+    agent.run_once()
+    assert status_commits(bare) == 1
+
+    restarted = _setup_restart(tmp_path)
+    work = _record_monitoring_work(monkeypatch)
+    outcomes, errors = restarted.reconcile_groups(group_apps_by_repo(restarted.apps))
+    assert errors == []
+    assert list(outcomes.values()) == [sched.IDLE]  # the config repo did not "move" across the restart
+    assert work == ["load"]  # the feedback file is read once from disk; no monitoring fetch
+    assert status_commits(bare) == 1
+
+
+def test_restart_after_a_change_still_publishes(single_app, tmp_path):
+    setup = single_app()
+    setup.agent.run_once()
+
+    setup.apps_meta["app1"]["code_commit_hash"] = setup.second
+    rewrite_deploy_meta(tmp_path, "deploy", setup.apps_meta)
+    _setup_restart(tmp_path).run_once()
+    assert status_commits(setup.bare) == 2
+
+
+def test_restart_does_not_trust_a_moved_monitoring_clone(single_app, tmp_path):
+    setup = single_app()
+    setup.agent.run_once()
+    deploy_url = setup.deploy_url
+    mon = Path(shared_clone_path(deploy_url, "main") + "-monitoring")
+    (mon / "note.txt").write_text("hand edit")
+    sp.run(["git", "add", "note.txt"], cwd=mon, check=True)
+    sp.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "edit"], cwd=mon, check=True)
+
+    restarted = _setup_restart(tmp_path)
+    assert restarted._restore_published((deploy_url, "main"), str(mon), "main-monitoring") is None
+
+
+def test_an_interrupted_update_is_rerun_after_a_restart(single_app, tmp_path):
+    agent = single_app().agent
+    agent.run_once()
+    # As if the agent had died after checking out a new commit, before the update completed.
+    agent.state.record_applied("app1", "0" * 40)
+    agent.state.save()
+
+    restarted = _setup_restart(tmp_path)
+    deploy_url = restarted.apps["app1"].rsplit("@", 1)[0]
+    to_update, cfg = restarted.evaluate_app("app1", shared_clone_path(deploy_url, "main"), {})
+    assert to_update is True
+    restarted.run_once()
+    assert restarted.state.applied_commit("app1") == cfg["code_commit_hash"]
+
+
+def _setup_restart(tmp_path):
+    """A new agent process over the same GITOPS_AGENT_HOME and config as the single_app fixture's."""
+    return build_agent(tmp_path, {"app1": f"file://{tmp_path / 'remotes' / 'deploy.git'}@main"})
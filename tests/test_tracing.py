@@ -0,0 +1,93 @@
+"""Tests for per-phase pass tracing and on-demand profiling (gitops_agent.tracing).
+
+Runs whole reconcile passes against REAL local bare repos from tests/test_integration_monitoring.py.
+
+Run with:  python -m pytest tests/test_tracing.py -q
+"""
+
+import json
+import os
+import pstats
+
+import git
+
+from gitops_agent import tracing
+
+
+def _traced_agent(single_app, tmp_path, trace=True):
+    agent = single_app(post_updation_command="true").agent
+    if trace:
+        agent.tracer = tracing.Tracer(tmp_path / "traces.jsonl", home=agent.tracer.home)
+    return agent
+
+
+def _passes(tmp_path):
+    return [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+
+
+def test_every_phase_of_a_pass_is_traced(single_app, tmp_path):
+    agent = _traced_agent(single_app, tmp_path)
+    agent.run_once()
+    agent.run_once()
+
+    cold, warm = _passes(tmp_path)
+    assert {"pass", "group", "config-fetch", "evaluate", "pull", "post-command", "flush",
+            "monitoring-fetch", "trim", "push"} <= set(cold["phases"])
+    assert "check" in warm["phases"] and "pull" not in warm["phases"]
+
+    spans = {span["name"]: span for span in cold["spans"]}
+    assert spans["group"]["group"] == "deploy@main"
+    assert spans["pull"]["app"] == "app1" and spans["pull"]["group"] == "deploy@main"
+    assert spans["prefetch"]["bytes_fetched"] > 0  # the app was cloned by the group's prefetch
+    assert spans["post-command"]["subprocesses"] == 1
+    assert cold["phases"]["config-fetch"]["subprocesses"] > 0
+    assert cold["seconds"] >= spans["group"]["seconds"]
+
+
+def test_nothing_is_recorded_unless_enabled(single_app, tmp_path):
+    agent = _traced_agent(single_app, tmp_path, trace=False)
+    agent.run_once()
+    assert not (tmp_path / "traces.jsonl").exists()
+    assert not (agent.tracer.home / tracing.PROFILE_DIR).exists()
+
+
+def test_a_pass_is_profiled_on_request(single_app, tmp_path):
+    agent = _traced_agent(single_app, tmp_path, trace=False)
+    request = agent.tracer.home / tracing.PROFILE_REQUEST_FILE
+    request.touch()
+    agent.run_once()
+
+    assert not request.exists()
+    (profile,) = (agent.tracer.home / tracing.PROFILE_DIR).iterdir()
+    functions = {name for _file, _line, name in pstats.Stats(str(profile)).stats}
+    # Both the group worker and the engine's helper threads were profiled.
+    assert {"reconcile_group", "update_git_repo"} <= functions
+
+    agent.run_once()
+    assert len(list((agent.tracer.home / tracing.PROFILE_DIR).iterdir())) == 1
+
+
+def test_the_git_counter_is_only_installed_during_a_traced_pass(single_app, tmp_path):
+    from git.cmd import Git
+
+    execute = Git.execute
+    agent = _traced_agent(single_app, tmp_path)
+    with agent.tracer.traced_pass() as root:
+        assert Git.execute is not execute
+        with agent.tracer.span("look"):
+            git.Repo(tmp_path / "remotes" / "deploy.git").git.rev_parse("HEAD")
+    assert Git.execute is execute
+    assert root is not None and _passes(tmp_path)[0]["phases"]["look"]["subprocesses"] == 1
+
+
+def test_object_store_bytes_counts_loose_objects_and_packs(tmp_path):
+    assert tracing.object_store_bytes(tmp_path / "missing") == 0
+    repo = git.Repo.init(tmp_path / "clone")
+    empty = tracing.object_store_bytes(tmp_path / "clone")
+    (tmp_path / "clone" / "blob").write_bytes(os.urandom(64 * 1024))
+    repo.index.add(["blob"])
+    repo.index.commit("blob")
+    loose = tracing.object_store_bytes(tmp_path / "clone")
+    assert loose >= empty + 64 * 1024
+    repo.git.gc("--quiet")
+    assert tracing.object_store_bytes(tmp_path / "clone") >= 64 * 1024